@@ -0,0 +1,141 @@
+#!/usr/bin/python
+"""Benchmark checkvotes against a local stand-in of the tool.
+
+Synthetic vote pages are checked by :class:`checkvotes.CheckBot`. The
+eligibility is retrieved from a local stand-in server of the
+stimmberechtigung tool; the site is a local stand-in too and user
+properties and redirects are answered by synthetic data. Nothing is
+read from or saved on the wiki.
+
+Run it from the repository folder::
+
+    python -m benchmarks.checkvotes_benchmark [options]
+
+The following parameters are supported:
+
+-pages:N          Number of vote pages (default: 10)
+
+-votes:N          Number of signatures per page (default: 100)
+
+-ineligible:N     Every Nth voter is not eligible (default: 10)
+
+-latency:S        Seconds the stand-in waits before each response
+                  (default: 0.05)
+
+-errors:R         Fraction of tool requests which fail (default: 0)
+
+-parallel:N       Number of concurrently checked pages
+
+-workers:N        Number of worker threads of the bot
+"""
+#
+# (C) xqt, 2025
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import annotations
+
+import time
+from datetime import timedelta
+from unittest import mock
+
+import pywikibot
+from pywikibot.page import BasePage
+
+import checkvotes
+from checkvotes import VoteContext
+from standins import (REGISTRATION, DryCheckBot, DrySite,
+                      StimmberechtigungServer)
+
+
+def vote_page(site, number: int, votes: int):
+    """Create a synthetic vote page with the given number of votes.
+
+    Every page has its own cutoff time, i.e. eligibility results are
+    not reused by other pages.
+    """
+    cutoff = pywikibot.Timestamp(2024, 1, 1) + timedelta(minutes=number)
+    query = (f'user=&day={cutoff.day}&mon={cutoff.month}&year={cutoff.year}'
+             f'&hour={cutoff.hour}&min={cutoff.minute}')
+    lines = ['== Abstimmung ==', '=== Pro ===']
+    lines += [f'# --[[Benutzer:Voter {i}|Voter {i}]] 12:00, 5. Nov. 2024 '
+              '(CET)' for i in range(votes)]
+    page = pywikibot.Page(site, f'Wikipedia:Adminkandidaturen/Bench {number}')
+    page.text = '\n'.join(lines) + '\n'
+    page._revid = number + 1
+    page.vote_context = VoteContext(url=(checkvotes.SB_TOOL, query))
+    return page
+
+
+def main(*args: str) -> None:
+    """Process command line arguments and run the benchmark.
+
+    If args is an empty list, sys.argv is used.
+
+    :param args: command line arguments
+    """
+    options = {'pages': 10, 'votes': 100, 'ineligible': 10,
+               'latency': 0.05, 'errors': 0.0}
+    bot_options = {}
+    unknown = []
+    site = DrySite()
+    with mock.patch.object(pywikibot, 'Site', return_value=site):
+        local_args = pywikibot.handle_args(args)
+    for arg in local_args:
+        opt, _, value = arg.partition(':')
+        if opt in ('-pages', '-votes', '-ineligible'):
+            options[opt[1:]] = int(value)
+        elif opt in ('-latency', '-errors'):
+            options[opt[1:]] = float(value)
+        elif opt in ('-parallel', '-workers'):
+            bot_options[opt[1:]] = int(value)
+        else:
+            unknown.append(arg)
+
+    if pywikibot.bot.suggest_help(unknown_parameters=unknown):
+        return
+
+    ineligible = {f'Voter {i}' for i in range(options['votes'])
+                  if i % options['ineligible'] == 0}
+    api_requests = 0
+
+    def users(names):
+        nonlocal api_requests
+        api_requests += 1
+        return [{'name': name, 'registration': REGISTRATION,
+                 'editcount': 1000, 'groups': ['*', 'user']}
+                for name in names]
+
+    def simple_request(**kwargs):
+        nonlocal api_requests
+        api_requests += 1
+        return mock.Mock(**{'submit.return_value': {'query': {}}})
+
+    server = StimmberechtigungServer(ineligible, options['latency'],
+                                     options['errors'], seed=0)
+    with server, \
+         mock.patch.object(checkvotes, 'DOMAIN', server.url), \
+         mock.patch.object(site, 'users', users), \
+         mock.patch.object(site, 'simple_request', simple_request), \
+         mock.patch.object(BasePage, 'botMayEdit', return_value=True):
+        pages = [vote_page(site, i, options['votes'])
+                 for i in range(options['pages'])]
+        bot = DryCheckBot(False, False, site=site, full=True, always=True,
+                          **bot_options)
+        bot.setup()
+        start = time.perf_counter()
+        for page in pages:
+            bot.treat(page)
+        bot.teardown()  # wait for pages checked in parallel
+        elapsed = time.perf_counter() - start
+
+    voters = options['pages'] * options['votes']
+    pywikibot.info(f"\n{options['pages']} pages with {voters} votes "
+                   f'checked in {elapsed:.2f} s')
+    pywikibot.info(f"{options['pages'] / elapsed:.2f} pages/s")
+    pywikibot.info(f'{server.total / voters:.2f} tool requests per voter')
+    pywikibot.info(f'{api_requests / voters:.3f} api requests per voter')
+
+
+if __name__ == '__main__':
+    main()
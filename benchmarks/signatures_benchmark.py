@@ -0,0 +1,141 @@
+#!/usr/bin/python
+"""Compare the signature tokenizer with the former signature regexes.
+
+The vote lines are parsed as by checkvotes and the first accuser of
+every section is searched as by vandalism; each with the former
+regular expressions and with the signature tokenizer. The results are
+compared and the times are reported.
+
+Run it from the repository folder::
+
+    python -m benchmarks.signatures_benchmark [options] [file ...]
+
+Every file is read as a page snapshot. The following parameters are
+supported:
+
+-page:TITLE       Use the current text of the page as snapshot; may be
+                  given several times
+
+-repeat:N         Number of runs of every parser (default: 10)
+
+If neither files nor pages are given, a synthetic page is used. The
+wiki is only accessed for the -page option.
+"""
+#
+# (C) xqt, 2025
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import annotations
+
+import re
+import time
+from pathlib import Path
+from unittest import mock
+
+import pywikibot
+
+from checkvotes import TIMESTAMP_GAP_LIMIT, VotePage
+from standins import DrySite
+from vandalism import getAccuser
+
+LEGACY_SIGNATURE_R = re.compile(
+    r'#(?!:).*?(?:\[http:.+?\])?[^#:]*?(?:<.+?>)?'
+    r'\[\[(?:[bB]enutzer(?:in)?|[uU]ser|BD|Spezial)'
+    r'(?P<talk>[_ ]Diskussion|[_ ]talk)?:(?:Beiträge/)?'
+    r'(?P<user>[^/#]+?) *'
+    fr'(?:/[^\\\]])?[\||\]].{{0,{TIMESTAMP_GAP_LIMIT}}}?'
+    r'(?P<hour>\d\d):(?P<min>\d\d), (?P<day>\d\d?)\. '
+    r'(?P<month>\w+\.?) (?P<year>\d\d\d\d) \(CES?T\)')
+
+
+def legacy_votes(text: str) -> list[str]:
+    """Return the voters of a page by the former regex."""
+    return [match['user'] for match in map(LEGACY_SIGNATURE_R.match,
+                                           text.split('\n'))
+            if match]
+
+
+def legacy_accuser(text: str) -> tuple[str, str]:
+    """Return the accuser of a section by the former regex."""
+    sig_regex = (
+        r'\[\[(?:[Bb]enutzer(?:in)?(?:[ _]Diskussion)?\:|'
+        r'[Uu]ser(?:[ _]talk)?\:|Spezial\:Beiträge\/|'
+        r'Special:Contributions\/)(?P<username>[^|\]]+)\|.*?\]\].{1,30}'
+        r'(?P<hh>[0-9]{2})\:(?P<mm>[0-9]{2}),\ (?P<dd>[0-9]{1,2})\.?\ '
+        r'(?P<MM>[a-zA-Zä]{3,10})\.?\ '
+        r'(?P<yyyy>[0-9]{4})\ \((?:CE[S]?T|ME[S]?Z|UTC)\)')
+    match = re.compile(sig_regex).search(text)
+    if match is None:
+        return '', ''
+    return match['username'], ' '.join(
+        (match['yyyy'], match['MM'], match['dd'],
+         f"{match['hh']}:{match['mm']}"))
+
+
+def synthetic_page(votes: int = 2000) -> str:
+    """Return a vote page with long comment lines and unsigned votes."""
+    lines = ['== Abstimmung ==', '=== Pro ===']
+    for i in range(votes):
+        lines.append(f'# [[Benutzer:Voter {i}|Voter {i}]] '
+                     f'([[BD:Voter {i}|D]]) 12:{i % 60:02}, 5. Nov. 2024 '
+                     '(CET)')
+        lines.append('#: ' + '[[Artikel]] und [[Benutzer:Foo]] ' * 40
+                     + '--[[Benutzer:Bar|Bar]]')
+        if i % 10 == 0:  # unsigned vote
+            lines.append('# ' + '[[Benutzer:Foo|Foo]] meint: ' * 20)
+    return '\n'.join(lines) + '\n'
+
+
+def measure(func, texts, repeat: int):
+    """Return the results and the best time of parsing all texts."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [func(text) for text in texts]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return results, best
+
+
+def main(*args: str) -> None:
+    """Process command line arguments and run the benchmark.
+
+    If args is an empty list, sys.argv is used.
+
+    :param args: command line arguments
+    """
+    repeat = 10
+    texts = []
+    # the site is only connected if pages are given
+    with mock.patch.object(pywikibot, 'Site', return_value=DrySite()):
+        local_args = pywikibot.handle_args(args)
+    for arg in local_args:
+        opt, _, value = arg.partition(':')
+        if opt == '-repeat':
+            repeat = int(value)
+        elif opt == '-page':
+            texts.append(pywikibot.Page(pywikibot.Site(), value).text)
+        else:
+            texts.append(Path(arg).read_text(encoding='utf-8'))
+    if not texts:
+        texts.append(synthetic_page())
+
+    sections = [section for text in texts
+                for section in re.split(r'\n(?===)', text)]
+    for name, legacy, tokenizer, items in (
+        ('votes', legacy_votes,
+         lambda text: [vote.user for vote in VotePage(text).votes], texts),
+        ('accusers', legacy_accuser, getAccuser, sections),
+    ):
+        old, old_time = measure(legacy, items, repeat)
+        new, new_time = measure(tokenizer, items, repeat)
+        differences = sum(a != b for a, b in zip(old, new))
+        pywikibot.info(f'{name}: regex {old_time:.4f} s, tokenizer '
+                       f'{new_time:.4f} s, speedup '
+                       f'{old_time / new_time:.1f}x, {differences} of '
+                       f'{len(items)} results differ')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/python
+"""Replay a recorded event stream to the VM bots offline.
+
+The events of a recorded recent changes stream are fed to
+:class:`vandalism.vmBot` or :class:`vandalism_articles.vmBot` in the
+order of their timestamps. The bots work on a stand-in site with
+preset site info which answers the API requests from the recorded data
+and keeps all edits locally; nothing is read from or saved on the wiki.
+
+Time is virtual: it jumps to the timestamp of each event and every API
+request takes a fixed number of seconds. For every relevant event the
+latency until the VM page was saved, the API requests and the edits
+are reported.
+
+Run it from the repository folder::
+
+    python -m benchmarks.vandalism_replay [options] EVENTS REVISIONS
+
+EVENTS is a JSON lines file with the entries of the recent changes
+stream like ``https://stream.wikimedia.org/v2/stream/recentchange``.
+REVISIONS is a JSON lines file with the revisions of the VM page, each
+with ``revid``, ``timestamp`` and ``text``. The following parameters are
+supported:
+
+-articles         Replay to vandalism_articles (protections) instead of
+                  vandalism (blocks)
+
+-latency:S        Virtual seconds of every API request (default: 0.2)
+
+-sweep:N          Seconds between full checks of the VM page
+
+-window:N         Seconds to collect further events after an event
+"""
+#
+# (C) xqt, 2025
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import annotations
+
+import json
+import statistics
+import tempfile
+from functools import partial
+from pathlib import Path
+from unittest import mock
+
+import pywikibot
+from pywikibot import config
+from pywikibot.exceptions import EditConflictError
+
+import vandalism
+import vandalism_articles
+from standins import DrySite, ReplaySite, VirtualClock, epoch, isoformat
+
+
+def read_lines(filename: str) -> list[dict]:
+    """Read a JSON lines file.
+
+    Lines of a server-sent events capture are accepted too.
+    """
+    entries = []
+    with open(filename, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith('data:'):
+                line = line[5:]
+            elif not line.startswith('{'):
+                continue
+            entries.append(json.loads(line))
+    return entries
+
+
+class Replay:
+
+    """Feed recorded events to a VM bot and measure its work."""
+
+    def __init__(self, bot, stand_in: ReplaySite, clock: VirtualClock):
+        """Initializer."""
+        self.bot = bot
+        self.stand_in = stand_in
+        self.clock = clock
+        self.latencies = []
+        self.unsaved = 0
+        self.passes = 0
+
+    def process(self, events: list[tuple[float, str, str]]) -> None:
+        """Process events by one pass of the bot and measure it.
+
+        The events are handled and the pass is run by the methods the
+        bot uses itself. A pass is repeated after an edit conflict like
+        the bots do.
+        """
+        saves = len(self.stand_in.edits)
+        if isinstance(self.bot, vandalism_articles.vmBot):
+            run_pass = self.bot.update
+        else:
+            titles = self.bot.handle_events(
+                [(kind, title) for _, kind, title in events])
+            run_pass = partial(self.bot.update, titles)
+        for _ in range(3):
+            try:
+                run_pass()
+            except (EditConflictError,
+                    pywikibot.exceptions.PageSaveRelatedError):
+                continue
+            break
+        self.passes += 1
+        saved = [moment for moment, title, _ in self.stand_in.edits[saves:]
+                 if title == self.stand_in.vm_title]
+        for moment, _, _ in events:
+            if saved:
+                self.latencies.append(saved[0] - moment)
+            else:
+                self.unsaved += 1
+
+    def replay(self, entries: list[dict]) -> None:
+        """Replay stream entries in the order of their timestamps."""
+        entries = sorted(entries, key=lambda entry: epoch(entry['timestamp']))
+        for entry in entries:
+            self.stand_in.add_event(entry)
+
+        relevant = []
+        for entry in entries:
+            event = self.bot.classify_event(entry)
+            if event:
+                kind, title = (event if isinstance(event, tuple)
+                               else (event, entry['title']))
+                relevant.append((epoch(entry['timestamp']), kind, title))
+
+        if isinstance(self.bot, vandalism_articles.vmBot):
+            for event in relevant:
+                self.clock.set(event[0])
+                self.process([event])
+            return
+
+        # the window starts with the first event; events which arrived
+        # during the previous pass are processed together
+        while relevant:
+            self.clock.set(relevant[0][0])
+            deadline = self.clock.now + self.bot.opt.window
+            batch = [event for event in relevant if event[0] <= deadline]
+            relevant = relevant[len(batch):]
+            self.clock.set(deadline)
+            self.process(batch)
+
+    def report(self) -> None:
+        """Print the results."""
+        events = len(self.latencies) + self.unsaved
+        if not events:
+            pywikibot.info('No relevant events found')
+            return
+        requests = self.stand_in.requests
+        vm_edits = sum(title == self.stand_in.vm_title
+                       for _, title, _ in self.stand_in.edits)
+        pywikibot.info(f'\n{events} relevant events processed by '
+                       f'{self.passes} passes')
+        if self.latencies:
+            pywikibot.info(
+                'latency to VM save: median '
+                f'{statistics.median(self.latencies):.1f} s, max '
+                f'{max(self.latencies):.1f} s; {self.unsaved} events '
+                'without VM save')
+        pywikibot.info(f'{sum(requests.values()) / events:.2f} API requests '
+                       'per event: ' + ', '.join(
+                           f'{name} {number}'
+                           for name, number in requests.most_common()))
+        pywikibot.info(f'{vm_edits} VM edits, '
+                       f'{len(self.stand_in.edits) - vm_edits} other edits, '
+                       f'{self.stand_in.conflicts} edit conflicts')
+
+
+def main(*args: str) -> None:
+    """Process command line arguments and run the replay.
+
+    If args is an empty list, sys.argv is used.
+
+    :param args: command line arguments
+    """
+    latency = 0.2
+    articles = False
+    bot_options = {}
+    files = []
+    site = DrySite()
+    with mock.patch.object(pywikibot, 'Site', return_value=site):
+        local_args = pywikibot.handle_args(args)
+    for arg in local_args:
+        opt, _, value = arg.partition(':')
+        if opt == '-articles':
+            articles = True
+        elif opt == '-latency':
+            latency = float(value)
+        elif opt in ('-sweep', '-window'):
+            bot_options[opt[1:]] = int(value)
+        else:
+            files.append(arg)
+
+    if len(files) != 2:
+        pywikibot.bot.suggest_help(
+            missing_parameters=['EVENTS', 'REVISIONS'][len(files):],
+            unknown_parameters=files[2:])
+        return
+
+    entries = [entry for entry in read_lines(files[0])
+               if entry.get('server_name', site.hostname())
+               == site.hostname()]
+    revisions = read_lines(files[1])
+    clock = VirtualClock(min(epoch(rev['timestamp']) for rev in revisions))
+    module = vandalism_articles if articles else vandalism
+    vm_title = module.VM_PAGES[site.sitename]['VM'][0]
+    optout = tuple('Benutzer:Xqbot/' + name
+                   for name in (vandalism.optOutListReceiverName,
+                                vandalism.optOutListAccuserName))
+    stand_in = ReplaySite(clock, latency, vm_title, revisions, optout)
+
+    with tempfile.TemporaryDirectory() as folder, stand_in.attach(site), \
+         mock.patch.object(config, 'datafilepath',
+                           lambda *path: str(Path(folder, path[-1]))), \
+         mock.patch.object(vandalism, 'time', clock.time):
+        if articles:
+            bot = vandalism_articles.vmBot(site=site)
+            bot.nexttimestamp = pywikibot.Timestamp.fromISOformat(
+                isoformat(clock.now)).totimestampformat()
+        else:
+            bot = vandalism.vmBot(site=site, **bot_options)
+            bot.read_lists()
+            bot.load_range_blocks()
+            bot.update(set())  # the startup pass
+        replay = Replay(bot, stand_in, clock)
+        stand_in.requests.clear()
+        stand_in.edits.clear()
+        replay.replay(entries)
+    replay.report()
+
+
+if __name__ == '__main__':
+    main()
@@ -7,11 +7,40 @@ The following parameters are supported:
 
 -admin            Check admin votings
 
+-all              Check all open votes; every index page is read once
+
+-prewarm:N        Retrieve the voting rights of likely voters before a vote
+                  starts; these are the voters of the votes of the last
+                  year and the authors of the last N article edits
+                  (default: 500). Arbcom elections and community votings
+                  are used unless another vote generator is given.
+
+-watch            Check all open votes and keep running: every vote page
+                  is checked again when it was edited. Only the votes
+                  added since the last check are verified.
+
 -sg               Check arbcom election
 
 -voting           Check community votings
 
 -ww               Check re-election
+
+-parallel:N       Check N vote pages concurrently
+
+-workers:N        Retrieve the eligibility of all voters of a page
+                  concurrently with N worker threads
+
+-full             Check all votes of a page, not only those added since
+                  the last check
+
+-nocache          Do not use eligibility results cached by previous runs
+                  but retrieve all of them again
+
+-eligibility:X    Source of the voting rights; X is one of
+                  tool      the stimmberechtigung tool (default)
+                  local     the user contributions
+                  fallback  the tool; the user contributions if the
+                            tool fails (default if X is omitted)
 """
 #
 # (C) xqt, 2010-2025
@@ -21,14 +50,26 @@ The following parameters are supported:
 from __future__ import annotations
 
 import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import suppress
+from datetime import datetime, timedelta
+from functools import partial
+from itertools import chain
+from urllib.parse import parse_qs
 
 import pywikibot
 from pywikibot import config, i18n, pagegenerators
+from pywikibot.backports import batched
 from pywikibot.bot import ExistingPageBot, SingleSiteBot
 from pywikibot.comms import http
-from pywikibot.exceptions import Error
-from pywikibot.textlib import replaceExcept
+from pywikibot.comms.eventstreams import site_rc_listener
+from pywikibot.exceptions import Error, NoPageError
+
+from eligibility import TIMEZONE, Eligibility
+from signatures import tokenize
 
 # This is required for the text that is shown when you run this script
 # with the parameter -help.
@@ -40,51 +81,89 @@ TIMESTAMP_GAP_LIMIT = 155  # default from textlib does not fit
 DOMAIN = 'https://stimmberechtigung.toolforge.org'
 SB_TOOL_NEW = ''
 SB_TOOL = '~?stimmberechtigung(?:/|/index.php)?'
+USERS_LIMIT = 50  # maximum number of users per list=users query
+DATABASE = 'checkvotes.sqlite'  # file name in the pywikibot data folder
+INDEX_PAGES = (  # pages listing the open votes
+    'Vorlage:Beteiligen',
+    'Wikipedia:Adminwiederwahl',
+    'Wikipedia:Kandidaturen',
+    'Wikipedia:Oversightkandidaturen',
+)
+
+
+class VoteContext:
+
+    """The mode in which a vote page is checked."""
+
+    def __init__(self, template: bool = False, sg: bool = False,
+                 ww: bool = False, url=None):
+        """Initializer.
+
+        :param template: read the cutoff time from the vote template
+        :param sg: check the arbcom voting rights
+        :param ww: check an admin re-election with expiring votes
+        :param url: the tool url found on the election page
+        """
+        self.template = template
+        self.sg = sg
+        self.ww = ww
+        self.url = url
 
 
-def VotingPageGenerator():
+def VotingPageGenerator(text=None):
     site = pywikibot.Site()
-    page = pywikibot.Page(site, 'Vorlage:Beteiligen')
-    text = page.get()
+    if text is None:
+        text = pywikibot.Page(site, 'Vorlage:Beteiligen').get()
     folder = 'Wikipedia:Meinungsbild'
+    context = VoteContext(template=True)
     R = re.compile(r'\[\[%s(er)*/(.+?)\|' % folder)
     for pre, pagename in R.findall(text):
-        yield pywikibot.Page(site, f'{folder}{pre}/{pagename}')
+        page = pywikibot.Page(site, f'{folder}{pre}/{pagename}')
+        page.vote_context = context
+        yield page
 
 
-def BlockUserPageGenerator():
+def BlockUserPageGenerator(text=None):
     site = pywikibot.Site()
-    page = pywikibot.Page(site, 'Vorlage:Beteiligen')
-    text = page.get()
+    if text is None:
+        text = pywikibot.Page(site, 'Vorlage:Beteiligen').get()
     folder = 'Wikipedia:Benutzersperrung/'
+    context = VoteContext(template=True)
     R = re.compile(rf'\[\[{folder}(.+?)\|')
     for pagename in R.findall(text):
-        yield pywikibot.Page(site, folder + pagename)
+        page = pywikibot.Page(site, folder + pagename)
+        page.vote_context = context
+        yield page
 
 
-def AdminPageGenerator():
-    global votepage
+def AdminPageGenerator(text=None, votepage=''):
     site = pywikibot.Site()
-    page = pywikibot.Page(site, 'Wikipedia:Kandidaturen')
-    text = page.get()
+    if text is None:
+        text = pywikibot.Page(site, 'Wikipedia:Kandidaturen').get()
     folder = 'Wikipedia:Adminkandidaturen/'
+    context = VoteContext()
     R = re.compile(r'\{\{:?%s(.+?)[\||\}]' % folder)
     for pagename in R.findall(text):
         if pagename.lower() != 'intro':
             if not votepage or votepage == pagename:
-                yield pywikibot.Page(site, folder + pagename)
+                page = pywikibot.Page(site, folder + pagename)
+                page.vote_context = context
+                yield page
 
 
-def CratsPageGenerator():
+def CratsPageGenerator(text=None, votepage=''):
     site = pywikibot.Site()
-    page = pywikibot.Page(site, 'Wikipedia:Kandidaturen')
-    text = page.get()
+    if text is None:
+        text = pywikibot.Page(site, 'Wikipedia:Kandidaturen').get()
     folder = 'Wikipedia:Bürokratenkandidaturen/'
+    context = VoteContext()
     R = re.compile(r'\{\{%s(.+?)[\||\}]' % folder)
     for pagename in R.findall(text):
         if pagename.lower() != 'intro':
             if not votepage or votepage == pagename:
-                yield pywikibot.Page(site, folder + pagename)
+                page = pywikibot.Page(site, folder + pagename)
+                page.vote_context = context
+                yield page
 
 
 def OversightPageGenerator():
@@ -92,14 +171,16 @@ def OversightPageGenerator():
     site = pywikibot.Site()
     page = pywikibot.Page(site, folder)
     text = page.get()
+    context = VoteContext()
     R = re.compile(rf'\[\[(?:{folder})?/([^/]+?)(?:/|\|[^/]+?)\]\]')
     for pagename in R.findall(text):
         if pagename.lower() not in ('intro', 'archiv'):
-            yield pywikibot.Page(site, f'{folder}/{pagename}')
+            page = pywikibot.Page(site, f'{folder}/{pagename}')
+            page.vote_context = context
+            yield page
 
 
 def CheckuserPageGenerator():
-    global url
     site = pywikibot.Site()
     ts = pywikibot.Timestamp.now()
     page = pywikibot.Page(
@@ -107,30 +188,35 @@ def CheckuserPageGenerator():
     text = page.get()
     urlRegex = re.compile(
         rf'\[(?:http:)?//tools.wmflabs.org/({SB_TOOL})\?([^ ]*?) +.*?\]')
-    url = urlRegex.findall(text)[1]
+    context = VoteContext(url=urlRegex.findall(text)[1])
     R = re.compile(r'[#\*] *(?:Kandidatur +)?\[\[/(.+?)/(?:\|.+)?\]\]')
     for pagename in R.findall(text):
-        yield pywikibot.Page(site, f'{page.title()}/{pagename}')
+        subpage = pywikibot.Page(site, f'{page.title()}/{pagename}')
+        subpage.vote_context = context
+        yield subpage
 
 
 def WwPageGenerator(admin=''):
-    global votepage
     site = pywikibot.Site()
     page = pywikibot.Page(site, 'Wikipedia:Adminwiederwahl')
+    context = VoteContext(ww=True)
     R = re.compile(r'\{\{(?:WP:)?Adminwiederwahl(?:/\*)?\|(.+?)\}\}')
     if admin:
         if '/' not in admin:  # subpage name is given
             admin = f'{page.title()}/{admin}'
-        yield pywikibot.Page(site, admin)
+        subpage = pywikibot.Page(site, admin)
+        subpage.vote_context = context
+        yield subpage
+        return
     text = page.get()
     for pagename in R.findall(text):
-        if votepage == '' or votepage == pagename:
-            yield pywikibot.Page(site, f'{page.title()}/{pagename}')
+        subpage = pywikibot.Page(site, f'{page.title()}/{pagename}')
+        subpage.vote_context = context
+        yield subpage
 
 
-def SgPageGenerator():
+def SgPageGenerator(votepage=''):
     """Generator for arbcom election."""
-    global url, votepage
     site = pywikibot.Site()
     ts = pywikibot.Timestamp.now()
     if ts.month not in (5, 11):
@@ -142,14 +228,44 @@ def SgPageGenerator():
     urlRegex = re.compile(
         rf'\[(?:http:)?//tools.wmflabs.org/({SB_TOOL})\?([^ ]*?) +.*?\]')
     url = urlRegex.findall(text)[1]  # zweites Auftreten nehmen
+    context = VoteContext(sg=True, url=url)
     R = re.compile(r'[#\*] *\[\[/(.+?)/\]\]')
     for pagename in R.findall(text):
         if votepage == '' or votepage == pagename:
-            yield pywikibot.Page(site, f'{page.title()}/{pagename}')
+            subpage = pywikibot.Page(site, f'{page.title()}/{pagename}')
+            subpage.vote_context = context
+            yield subpage
+
+
+def AllPageGenerator():
+    """Generator for all open votes.
+
+    Every index page is downloaded once and shared by the generators
+    of the votes listed there. Each page carries its own vote context.
+    A generator whose index page is missing or has no tool url is
+    skipped.
+    """
+    site = pywikibot.Site()
+    participate = pywikibot.Page(site, 'Vorlage:Beteiligen').get()
+    candidacies = pywikibot.Page(site, 'Wikipedia:Kandidaturen').get()
+    for gen in (VotingPageGenerator(participate),
+                BlockUserPageGenerator(participate),
+                AdminPageGenerator(candidacies),
+                CratsPageGenerator(candidacies),
+                OversightPageGenerator(),
+                CheckuserPageGenerator(),
+                SgPageGenerator(),
+                WwPageGenerator()):
+        try:
+            yield from gen
+        except NoPageError as e:
+            pywikibot.info(f'{e}; skipping.')
+        except IndexError:
+            pywikibot.error(f'No tool url found by {gen.__name__}; '
+                            'skipping.')
 
 
-def getDateString(page, template=False):
-    global url
+def getDateString(page, template=False, url=None):
     if template:
         templates = page.templatesWithParams()
         for tmpl in templates:
@@ -196,13 +312,462 @@ def getDateString(page, template=False):
         return result
 
 
+NOTICE_R = re.compile(r'\r?\n== *Stimmberechtigung *==\r?\n')
+STRIKE = '#:<s>{}</s> <small>nicht stimmberechtigt --~~~~</small>'
+
+
+def is_vote_signature(signature) -> bool:
+    """Return whether a signature is valid for a vote.
+
+    :param signature: a signature found by the tokenizer
+    :type signature: signatures.Signature
+    """
+    return (signature.namespace != 'Special'
+            and signature.special != 'Contributions/'
+            and signature.daydot
+            and signature.zone in ('CET', 'CEST'))
+
+
+class Vote:
+
+    """A signed vote line of a vote page."""
+
+    def __init__(self, index: int, offset: int, line: str, signature,
+                 section: str):
+        """Initializer.
+
+        :param index: line number within the vote part of the page
+        :param offset: position of the line within the page text
+        :param line: the vote line
+        :param signature: the first signature of the line
+        :type signature: signatures.Signature
+        :param section: the heading of the section of the vote
+        """
+        self.index = index
+        self.offset = offset
+        self.line = line
+        self.section = section
+        self.user = signature.user
+        self.talk = signature.talk
+        self.hour = signature.hour
+        self.minute = signature.minute
+        self.day = signature.day
+        self.month = signature.month
+        self.year = signature.year
+
+    def timestamp(self, months: dict[str, str]) -> pywikibot.Timestamp:
+        """Return the time of the signature.
+
+        :param months: month numbers by month names and abbreviations
+        """
+        return pywikibot.Timestamp.fromtimestampformat(
+            f'{self.year}{months[self.month]}{int(self.day):02}'
+            f'{self.hour}{self.minute}00')
+
+    def __repr__(self) -> str:
+        """Return a representation of the vote."""
+        return f'{type(self).__name__}({self.user!r}, line {self.index})'
+
+
+class VotePage:
+
+    """Structured model of a vote page.
+
+    The page text is split into the head before ``== Abstimmung ==``
+    and the lines of the vote part which are tokenized once. Votes to
+    be struck through or removed are collected and applied in a single
+    pass when :attr:`text` is rebuilt.
+    """
+
+    def __init__(self, text: str):
+        """Initializer.
+
+        :param text: the page text
+        """
+        pos = text.find('== Abstimmung ==')
+        self.head = text[:pos] if pos > 0 else ''
+        self.lines = text[len(self.head):].split('\n')
+        self.sections = []
+        self.votes = []
+        self._struck = set()
+        self._removed = set()
+        section = ''
+        offset = 0
+        for index, line in enumerate(self.lines):
+            if line.startswith('='):
+                section = line.strip('= \r')
+                self.sections.append((index, section))
+            elif line.startswith('#') and not line.startswith('#:'):
+                signature = next(tokenize(line, TIMESTAMP_GAP_LIMIT,
+                                          accept=is_vote_signature), None)
+                if signature:
+                    self.votes.append(Vote(index, len(self.head) + offset,
+                                           line, signature, section))
+            offset += len(line) + 1
+
+    def strike(self, vote: Vote) -> None:
+        """Strike through a vote as not eligible."""
+        self._struck.add(vote.index)
+
+    def remove(self, vote: Vote) -> None:
+        """Remove a vote together with its follow-up lines."""
+        self._removed.add(vote.index)
+
+    @property
+    def text(self) -> str:
+        """Return the page text with all annotations applied."""
+        lines = []
+        removing = False
+        for index, line in enumerate(self.lines):
+            if index in self._removed:
+                removing = True
+                continue
+            if removing and line.startswith(('#:', '##')):
+                continue
+            removing = False
+            if index in self._struck:
+                line = STRIKE.format(line[1:].rstrip('\r'))
+            lines.append(line)
+        return self.head + '\n'.join(lines)
+
+
+def expiry_limit(now: pywikibot.Timestamp) -> pywikibot.Timestamp:
+    """Return the time before which re-election votes are expired.
+
+    Votes for an admin re-election expire after six months.
+
+    >>> expiry_limit(pywikibot.Timestamp(2024, 8, 31, 12, 0))
+    Timestamp(2024, 2, 28, 12, 0)
+
+    :param now: the current time
+    """
+    # Problem: was ist 31. August + 6 Monate? 28. Februar oder Anfang März
+    day = min(now.day, 28 if now.month in (2, 8) else 30)  # Jan/Feb 1-3 Tage zu spät
+    if now.month > 6:
+        return now.replace(month=now.month - 6, day=day)
+    return now.replace(month=now.month + 6, year=now.year - 1, day=day)
+
+
+def cutoff_key(query: str) -> str | None:
+    """Return the cutoff time of a tool query as timestamp string.
+
+    >>> cutoff_key('day=5&mon=3&year=2024&hour=12&min=0')
+    '202403051200'
+    >>> cutoff_key('id=4711') is None
+    True
+
+    :param query: the query part of a stimmberechtigung tool url
+    :return: a ``YYYYMMDDHHMM`` string or None if no cutoff was found
+    """
+    params = parse_qs(query)
+    try:
+        return '{:04}{:02}{:02}{:02}{:02}'.format(
+            *(int(params[key][0])
+              for key in ('year', 'mon', 'day', 'hour', 'min')))
+    except (KeyError, ValueError):
+        return None
+
+
+def cutoff_time(cutoff: str) -> datetime:
+    """Return the aware cutoff time of a cutoff key.
+
+    >>> cutoff_time('202403051200').isoformat()
+    '2024-03-05T12:00:00+01:00'
+    """
+    return datetime.strptime(cutoff, '%Y%m%d%H%M').replace(tzinfo=TIMEZONE)
+
+
+class EligibilityCache:
+
+    """Persistent cache of voting rights at a given cutoff time.
+
+    Whether a user was eligible at a cutoff time never changes once
+    that time has passed; a user who is already eligible at a future
+    cutoff time stays eligible. Only these results are stored, keyed
+    by user name, cutoff and kind of the vote ('general' or 'sg').
+    Entries not used for :attr:`max_age` days are evicted, as are the
+    least recently used entries beyond :attr:`max_entries`.
+
+    The source of every result is kept: 'tool' for the answers of the
+    stimmberechtigung tool and 'local' for the approximate results of
+    the local engine. A tool result replaces a local one, but never the
+    other way round. The cache may be shared by several threads.
+    """
+
+    max_age = 180  # days
+    max_entries = 100000
+
+    def __init__(self, filename: str | None = None):
+        """Initializer.
+
+        :param filename: the database file; use the pywikibot data
+            folder by default
+        """
+        if filename is None:
+            filename = config.datafilepath('data', DATABASE)
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS eligibility ('
+            'user TEXT, cutoff TEXT, kind TEXT, result INTEGER, used REAL, '
+            "source TEXT NOT NULL DEFAULT 'tool', "
+            'PRIMARY KEY (user, cutoff, kind))')
+        columns = {row[1] for row in self.connection.execute(
+            'PRAGMA table_info(eligibility)')}
+        if 'source' not in columns:
+            # results of older versions may stem from the local engine
+            with self.connection:
+                self.connection.execute(
+                    'ALTER TABLE eligibility ADD COLUMN '
+                    "source TEXT NOT NULL DEFAULT 'local'")
+        self.evict()
+
+    def evict(self):
+        """Remove outdated and least recently used entries."""
+        with self.lock, self.connection:
+            self.connection.execute(
+                'DELETE FROM eligibility WHERE used < ?',
+                (time.time() - self.max_age * 86400, ))
+            self.connection.execute(
+                'DELETE FROM eligibility WHERE rowid NOT IN ('
+                'SELECT rowid FROM eligibility ORDER BY used DESC LIMIT ?)',
+                (self.max_entries, ))
+
+    def get(self, username: str, cutoff: str | None, kind: str,
+            local: bool = False) -> bool | None:
+        """Return the cached eligibility or None if it is unknown.
+
+        :param local: also return results of the local engine
+        """
+        with self.lock:
+            row = None
+            if cutoff:
+                row = self.connection.execute(
+                    'SELECT result FROM eligibility '
+                    'WHERE user = ? AND cutoff = ? AND kind = ? '
+                    "AND (source = 'tool' OR ?)",
+                    (username, cutoff, kind, local)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            with self.connection:
+                self.connection.execute(
+                    'UPDATE eligibility SET used = ? '
+                    'WHERE user = ? AND cutoff = ? AND kind = ?',
+                    (time.time(), username, cutoff, kind))
+            return bool(row[0])
+
+    def set(self, username: str, cutoff: str | None, kind: str,
+            result: bool, source: str = 'tool') -> None:
+        """Store the eligibility if it cannot change anymore.
+
+        This is the case if the cutoff time has passed or if the user
+        is already eligible at a future cutoff time.
+
+        :param source: 'tool' or 'local' for the local engine
+        """
+        if not cutoff or not isinstance(result, bool):
+            return
+        now = datetime.now(TIMEZONE).strftime('%Y%m%d%H%M')
+        if cutoff >= now and not result:
+            return
+        conflict = 'REPLACE' if source == 'tool' else 'IGNORE'
+        with self.lock, self.connection:
+            self.connection.execute(
+                f'INSERT OR {conflict} INTO eligibility '
+                '(user, cutoff, kind, result, used, source) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (username, cutoff, kind, result, time.time(), source))
+
+    def close(self):
+        """Close the database."""
+        self.connection.close()
+
+
+class CheckedRevisions:
+
+    """Persistent store of the last fully checked revision of vote pages.
+
+    Together with the revision id the query of the cutoff time is kept;
+    a page has to be checked completely again if it was changed. The
+    store may be shared by several threads.
+    """
+
+    def __init__(self, filename: str | None = None):
+        """Initializer.
+
+        :param filename: the database file; use the pywikibot data
+            folder by default
+        """
+        if filename is None:
+            filename = config.datafilepath('data', DATABASE)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS revisions ('
+            'title TEXT PRIMARY KEY, revid INTEGER, query TEXT)')
+
+    def titles(self, since: str) -> list[str]:
+        """Return the titles of pages with a cutoff time after *since*.
+
+        :param since: a cutoff key
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT title, query FROM revisions').fetchall()
+        return [title for title, query in rows
+                if query and (cutoff_key(query) or '') >= since]
+
+    def get(self, title: str) -> tuple[int, str | None] | None:
+        """Return revision id and cutoff query of the last check."""
+        with self.lock:
+            return self.connection.execute(
+                'SELECT revid, query FROM revisions WHERE title = ?',
+                (title, )).fetchone()
+
+    def set(self, title: str, revid: int, query: str | None) -> None:
+        """Store the revision id which was checked completely."""
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO revisions VALUES (?, ?, ?)',
+                (title, revid, query))
+
+    def close(self):
+        """Close the database."""
+        self.connection.close()
+
+
+def UncheckedPageGenerator(generator):
+    """Skip pages which were not changed since their last check.
+
+    The latest revision ids of all pages are retrieved in batches by
+    a ``prop=info`` query without loading the page contents.
+    Re-election pages are never skipped.
+
+    :param generator: the pages to check
+    """
+    checked = CheckedRevisions()
+    pages = list(generator)
+    if pages:
+        for page in pages[0].site.preloadpages(pages, content=False):
+            context = getattr(page, 'vote_context', None)
+            if page.exists() and not (context and context.ww):
+                last = checked.get(page.title())
+                if last and last[0] == page.latest_revision_id:
+                    pywikibot.info(f'Page {page} is unchanged since the last '
+                                   f'check; skipping.')
+                    continue
+            yield page
+    checked.close()
+
+
+def WatchPageGenerator(full=False):
+    """Generator for all open votes which follows their edits.
+
+    All open votes are yielded first; unchanged pages are skipped unless
+    *full* is set. Afterwards the recent changes stream is watched: a
+    vote page is yielded again whenever it was edited, and the watched
+    pages are read again if an index page was changed. Votes which are
+    new in the index are yielded at once; votes which were removed from
+    the index are no longer watched.
+
+    :param full: yield all open votes first, even unchanged ones
+    """
+    site = pywikibot.Site()
+    pages = list(AllPageGenerator())
+    yield from pagegenerators.PreloadingGenerator(
+        pages if full else UncheckedPageGenerator(pages))
+    watched = {page.title(): page.vote_context for page in pages}
+
+    rc_listener = site_rc_listener(site)
+    rc_listener.register_filter(type='edit')
+    for entry in rc_listener:
+        if entry['bot'] or entry['user'] == site.username():
+            continue
+
+        title = entry['title']
+        if title in INDEX_PAGES:
+            pywikibot.info(f'\n{title} was changed; refreshing watched '
+                           'pages')
+            pages = list(AllPageGenerator())
+            new = [page for page in pages if page.title() not in watched]
+            watched = {page.title(): page.vote_context for page in pages}
+            yield from new
+        elif title in watched:
+            pywikibot.info(f'\nFound a new edit by user "{entry["user"]}"'
+                           f' on {title}')
+            page = pywikibot.Page(site, title)
+            page.vote_context = watched[title]
+            yield page
+
+
+def parse_rights(text: str) -> dict[str, bool | str]:
+    r"""Parse the ``mode=bot`` response of the stimmberechtigung tool.
+
+    >>> parse_rights('Allgemeine Stimmberechtigung: Ja\n'
+    ...              'Schiedsgericht Stimmberechtigung: Nein')
+    {'Allgemeine': True, 'Schiedsgericht': False}
+
+    :param text: the response text with one ``key: value`` per line
+    :return: a dict mapping the kind of vote to the result or to the
+        message of an error
+    """
+    rights = {}
+    values = {'Ja': True, 'Nein': False}
+    for line in text.strip().splitlines():
+        key, _, value = line.partition(': ')
+        key = key.replace('Stimmberechtigung', '').strip()
+        key = key.replace('Abstimmung', '').strip()
+        rights[key] = values.get(value, value)
+    return rights
+
+
+def add_notice(talk: str, votepage: str, title: str, path: str) -> str:
+    """Add the notice about a struck vote to the text of a talk page.
+
+    :param talk: the text of the talk page
+    :param votepage: the title of the vote page
+    :param title: the title of the vote used as link label
+    :param path: the tool url of the eligibility check
+    """
+    if '== Stimmberechtigung ==' not in talk:
+        return talk + ('\n\n== Stimmberechtigung ==\n\nDeine '
+                       'Abstimmung bei [[%s|%s]] wurde gestrichen. '
+                       'Du warst [%s nicht stimmberechtigt]. --~~~~'
+                       % (votepage, title, path))
+
+    match = NOTICE_R.search(talk)
+    if match:
+        talk = (talk[:match.end()]
+                + '\nDeine Abstimmung bei [[%s|%s]] wurde '
+                  'gestrichen. Du warst [%s nicht '
+                  'stimmberechtigt]. --~~~~\n'
+                % (votepage, title, path)
+                + talk[match.end():])
+    return talk
+
+
 class CheckBot(ExistingPageBot, SingleSiteBot):
 
     """CheckBot to check votings."""
 
     use_redirects = False
+    database = None  # database file name; use the data folder by default
     ignore_server_errors = True
     ignore_save_related_errors = True
+    update_options = {
+        'full': False,  # check all votes of changed pages
+        'nocache': False,  # do not read cached eligibility results
+        'eligibility': 'tool',  # source of voting rights: tool|local|fallback
+        'parallel': 0,  # concurrently checked vote pages
+        'watch': False,  # keep running after errors of single pages
+        'prewarm': 0,  # recent changes scanned for likely voters
+        'workers': 0,  # concurrent eligibility lookups
+    }
 
     # Edit summary message that should be used.
     msg = {
@@ -210,22 +775,28 @@ class CheckBot(ExistingPageBot, SingleSiteBot):
         'en': 'Robot: Votings checked',
     }
 
-    def __init__(self, template, blockinfo, **kwargs):
+    users_expiry = 600  # seconds user properties are kept in watch mode
+
+    def __init__(self, template, blockinfo, context=None, **kwargs):
         """
         Initializer.
 
         Parameters:
             * generator - The page generator that determines on which pages
                           to work on.
+            * context - The vote context of pages which do not carry
+                        their own one.
         """
         super().__init__(**kwargs)
         self.blockinfo = blockinfo
         self.template = template
-        # Set the edit summary message
-        self.summary = i18n.translate(self.site, self.msg)
-        self.url = None
-        self.parts = None
-        self.info = None
+        self.context = context or VoteContext(template=template)
+        self.executor = None
+        self.pool = None
+        self.pending = []
+        self.lock = threading.Lock()
+        self.voters = None
+        self.reset_users()
         config.cosmetic_changes = False
 
     def setup(self):
@@ -235,40 +806,305 @@ class CheckBot(ExistingPageBot, SingleSiteBot):
             number = f'{i:02}'
             self.months[name] = number
             self.months[abbr] = number
+        self.executor = (ThreadPoolExecutor(max_workers=self.opt.workers)
+                         if self.opt.workers > 1 else None)
+        self.pool = (ThreadPoolExecutor(max_workers=self.opt.parallel)
+                     if self.opt.parallel > 1 else None)
+        self.cache = EligibilityCache(self.database)
+        self.engine = (Eligibility(self.site, self.database)
+                       if self.opt.eligibility != 'tool' else None)
+        self.checked = CheckedRevisions(self.database)
+
+    def teardown(self):
+        """Wait for pending pages, shut down the pools and close the cache.
+
+        :raise Exception: the first exception of a page checked in the
+            parallel page mode
+        """
+        errors = []
+        for future in self.pending:
+            try:
+                future.result()
+            except Exception as e:
+                pywikibot.error(f'{e} while checking a page')
+                errors.append(e)
+        if self.pool:
+            self.pool.shutdown(cancel_futures=True)
+        if self.executor:
+            self.executor.shutdown(cancel_futures=True)
+        pywikibot.info(f'\nEligibility cache: {self.cache.hits} hits, '
+                       f'{self.cache.misses} misses')
+        self.cache.close()
+        self.checked.close()
+        if self.engine:
+            self.engine.close()
+        if errors:
+            raise errors[0]
+
+    def fetch_rights(self, paths):
+        """Return callables which retrieve the voting rights.
+
+        With the ``-workers`` option all requests are submitted to the
+        worker pool at once; otherwise every request is made when its
+        callable is called. Either way the callables are returned in the
+        order of *paths* and raise the exception of a failed request.
+
+        :param paths: iterable of stimmberechtigung tool urls
+        :rtype: list
+        """
+        if not self.executor:
+            return [partial(http.fetch, uri=path) for path in paths]
+        return [self.executor.submit(http.fetch, uri=path).result
+                for path in paths]
+
+    def reset_users(self):
+        """Forget the user properties and redirects loaded so far."""
+        self.userprops = {}
+        self.user_redirects = {}
+        self.redirect_chains = {}
+        self.users_loaded = time.monotonic()
+
+    def prefetch_users(self, usernames):
+        """Load the properties of all given users in batches.
+
+        Registration, edit count, groups and block info of all users
+        not loaded yet are retrieved by ``list=users`` queries with
+        50 users each.
+
+        :param usernames: iterable of user names
+        """
+        users = {pywikibot.User(self.site, name).username
+                 for name in usernames}
+        users.difference_update(self.userprops)
+        for batch in batched(sorted(users), USERS_LIMIT):
+            for props in self.site.users(batch):
+                self.userprops[props['name']] = props
+
+    def prefetch_redirects(self, usernames):
+        """Resolve redirected user pages of all given users in batches.
+
+        The user pages are queried with ``redirects=1`` for 50 users at
+        once; the API resolves the full redirect chains. The redirects
+        are kept for the whole run.
+
+        :param usernames: iterable of user names
+        """
+        titles = set()
+        for name in usernames:
+            title = pywikibot.User(self.site, name).title()
+            if title not in self.user_redirects:
+                titles.add(title)
+        for batch in batched(sorted(titles), USERS_LIMIT):
+            result = self.site.simple_request(
+                action='query', prop='info', titles=batch,
+                redirects=True).submit()['query']
+            for item in result.get('redirects', []):
+                self.user_redirects[item['from']] = item['to']
+            for title in batch:
+                self.user_redirects.setdefault(title, None)
+
+    def redirect_chain(self, username: str) -> list[str]:
+        """Return the user names a user page redirects to hop by hop.
+
+        The chain ends with a user page which is not a redirect, with a
+        redirect to another namespace like the user talk page, or with
+        the first user name which was already found, i.e. a loop.
+
+        :param username: the name of the user
+        """
+        if username in self.redirect_chains:
+            return self.redirect_chains[username]
+
+        user = pywikibot.User(self.site, username)
+        if user.title() not in self.user_redirects:
+            self.prefetch_redirects([username])
+        result = []
+        names = {user.username}
+        title = user.title()
+        while True:
+            title = self.user_redirects.get(title)
+            if title is None:
+                break
+            page = pywikibot.Page(self.site, title)
+            if page.namespace() != 2:
+                break
+            name = page.title(with_ns=False)
+            result.append(name)
+            if name in names:
+                break
+            names.add(name)
+        self.redirect_chains[username] = result
+        return result
+
+    def resolve_user(self, username: str):
+        """Return the account which votes with the given signature.
+
+        A renamed user is replaced by the new account and a redirected
+        user page by the user of its redirect target.
+
+        :param username: the user name of a signature
+        :rtype: pywikibot.User
+        :raise Error: the user pages form a redirect loop
+        """
+        user = pywikibot.User(self.site, username)
+        if not self.is_registered(user):
+            user = user.renamed_target()
+        names = self.redirect_chain(user.username)
+        if names:
+            if names[-1] in names[:-1] or names[-1] == user.username:
+                raise Error(f'Redirect loop for {user} found')
+            user = pywikibot.User(self.site, names[-1])
+        return user
+
+    def user_props(self, user):
+        """Return the user properties from the prefetched table.
+
+        :param user: the user to look up
+        :type user: pywikibot.User
+        :rtype: dict
+        """
+        if user.username not in self.userprops:
+            self.prefetch_users([user.username])
+        return self.userprops[user.username]
+
+    def is_registered(self, user) -> bool:
+        """Return whether the user is registered by its properties."""
+        return 'registration' in self.user_props(user)
+
+    def vote_context(self, page) -> VoteContext:
+        """Return the vote context of a page.
+
+        Pages from the vote generators carry their own context; for
+        other pages it is given by the command line options.
+        """
+        with suppress(AttributeError):
+            return page.vote_context
+        return self.context
+
+    def changed_lines(self, page, query: str | None) -> set[str] | None:
+        """Return lines added or changed since the last check of a page.
+
+        :param page: the vote page
+        :param query: the query of the cutoff time
+        :return: a set of lines or None if all lines must be checked
+        """
+        last = self.checked.get(page.title())
+        if self.opt.full or not last:
+            return None
+
+        revid, last_query = last
+        if last_query != query:
+            pywikibot.info('Cutoff time was changed; checking all votes.')
+            return None
+
+        try:
+            old_text = page.getOldVersion(revid)
+        except Error:  # revision was deleted
+            return None
+
+        pywikibot.info(f'Checking votes added since revision {revid}.')
+        return set(page.text.splitlines()) - set(old_text.splitlines())
+
+    def prune_expired(self, model) -> list:
+        """Remove expired votes of a re-election page.
+
+        The age of every vote is computed once and all expired votes
+        are marked for removal together with their follow-up lines,
+        which are dropped when the model text is rebuilt.
+
+        :param model: the parsed vote page
+        :type model: VotePage
+        :return: the expired votes
+        """
+        start = time.perf_counter()
+        limit = expiry_limit(pywikibot.Timestamp.now())
+        expired = []
+        for vote in model.votes:
+            timestamp = vote.timestamp(self.months)
+            if timestamp < limit:
+                delta = limit - timestamp
+                pywikibot.info(f'{vote.user} ({timestamp.totimestampformat()}'
+                               f') ist seit {delta.days} Tagen abgelaufen.')
+                model.remove(vote)
+                expired.append(vote)
+        pywikibot.info(f'{len(expired)} abgelaufene Stimmen in '
+                       f'{time.perf_counter() - start:.3f} s entfernt.')
+        return expired
+
+    def treat(self, page):
+        """Check the page or submit it to the pool of the parallel mode.
+
+        In watch mode errors of single pages are logged only and pages
+        checked in parallel are no longer kept when they are done. The
+        user properties and redirects are loaded again after
+        :attr:`users_expiry` seconds when no page is being checked.
+        """
+        if self.opt.watch:
+            self.pending = [future for future in self.pending
+                            if not future.done()]
+            if not self.pending and (time.monotonic() - self.users_loaded
+                                     > self.users_expiry):
+                self.reset_users()
+
+        if self.pool:
+            self.pending.append(self.pool.submit(
+                self.watch_page if self.opt.watch else self.check_page,
+                page))
+        elif not self.opt.watch:
+            super().treat(page)
+        else:
+            try:
+                super().treat(page)
+            except Exception:
+                pywikibot.exception()
+
+    def watch_page(self, page):
+        """Check a page in parallel watch mode and log its errors."""
+        try:
+            self.check_page(page)
+        except Exception:
+            pywikibot.exception()
 
     def treat_page(self):
         """Treat the current page."""
-        page = self.current_page
-        self.parts = None
-        self.info = None
+        self.check_page(self.current_page)
+
+    def check_page(self, page):
+        """Check the votes of a page and strike those of ineligible users.
+
+        All state of the check is kept locally; the tables of user
+        properties, redirects and eligibility results are shared. The
+        edits are serialized, i.e. pages may be checked by several
+        threads.
+
+        :param page: the vote page
+        """
+        if self.opt.prewarm:
+            self.prewarm(page)
+            return
+
         text = page.text
 
         if not text:
             pywikibot.info(f'Page {page} has no content, skipping.')
             return
 
-        global ww
+        context = self.vote_context(page)
+        ww, sg = context.ww, context.sg
         if not ww:
-            urlPath = getDateString(page, self.template)
+            urlPath = getDateString(page, context.template, context.url)
             if urlPath is None:
                 pywikibot.info('Could not retrieve urlPath for Timestamp')
                 return
+        cutoff_query = None if ww else urlPath[1]
+        changed = None if ww else self.changed_lines(page, cutoff_query)
+        complete = True
 
-        regex = re.compile(
-            r'^#(?!:).*?(?:\[http:.+?\])?[^#:]*?(?:<.+?>)?'
-            r'\[\[(?:[bB]enutzer(?:in)?|[uU]ser|BD|Spezial)'
-            r'(?P<talk>[_ ]Diskussion|[_ ]talk)?:(?:Beiträge/)?'
-            r'(?P<user>[^/#]+?) *'
-            fr'(?:/[^\\\]])?[\||\]].{{0,{TIMESTAMP_GAP_LIMIT}}}?'
-            r'(?P<hour>\d\d):(?P<min>\d\d), (?P<day>\d\d?)\. '
-            r'(?P<month>\w+\.?) (?P<year>\d\d\d\d) \(CES?T\)',
-            re.MULTILINE)
         i = 0
-        self.summary = i18n.translate(self.site, self.msg)
+        summary = i18n.translate(self.site, self.msg)
         delimiter = ', entferne'
         userlist = set()
         userpath = {}
-        global sg
         # Lösung suchen für:
         # Baird&#39;s Tapir
         # S1 ist umbenannt
@@ -285,187 +1121,113 @@ class CheckBot(ExistingPageBot, SingleSiteBot):
             'DrPsychJan': 'Sanisso',
         }
         seen = set()
+        votes = []
+        uservotes = {}
         comment = ''
-        pos = text.find('== Abstimmung ==')
-        if pos > 0:
+        model = VotePage(text)
+        if model.head:
             pywikibot.info('splitting text')
-            head = text[:pos]
-            text = text[pos:]
-        else:
-            head = ''
-        for sig in regex.findall(text):
-            username = sig[1]
+        expired = set(self.prune_expired(model)) if ww else set()
+        if expired:
+            comment = ', abgelaufene Stimmen entfernt.'
+        signatures = []
+        for vote in model.votes:
+            if changed is not None and vote.line not in changed \
+               or vote in expired:
+                continue
+            username = vote.user
+            if username in problems:
+                username = problems[username]
+            else:
+                username = username.replace('&nbsp;', ' ')  # Scherzkekse
+            signatures.append((username, vote))
+
+        usernames = [username for username, _ in signatures]
+        self.prefetch_redirects(usernames)
+        self.prefetch_users(chain(usernames, *(
+            self.redirect_chain(username) for username in usernames)))
+        accounts = {}  # signature user name -> voting account
+        for username, vote in signatures:
             if i == 10:
                 pywikibot.info('.', newline=False)
                 i = 0
             else:
                 i += 1
-            if username in problems:
-                username = problems[username]
-            else:
-                username = username.replace('&nbsp;', ' ')  # Scherzkekse
+            if username not in accounts:
+                accounts[username] = self.resolve_user(username)
+            user = accounts[username]
+            username = user.username
+            uservotes.setdefault(username, []).append(vote)
+            sigvotes = uservotes[username]
             if username in seen:
                 pywikibot.info(f'{username} already seen on this page')
                 continue
             seen.add(username)
-            user = pywikibot.User(self.site, username)
-            if not user.isRegistered():
-                user = user.renamed_target()
-                username = user.title(with_ns=False)
-            loop = True
-            while user.getUserPage().isRedirectPage():
-                username = user.getUserPage().getRedirectTarget().title(
-                    with_ns=False)
-                # target is talk page
-                if username == user.title(with_ns=False):
-                    loop = False
-                    break
-                if username in seen:
-                    pywikibot.info(f'{username} already seen on this page')
-                    break
-                seen.add(username)
-                user = pywikibot.User(self.site, username)
-            else:
-                loop = False
 
-            if loop:
-                raise Error(f'Redirect loop for {user} found')
-            if not user.isRegistered():
+            props = self.user_props(user)
+            if not self.is_registered(user):
                 raise Error(f'User {user} is not registered')
-            if not user.editCount():
+            if not props.get('editcount'):
                 raise Error(f'User {user} has no edits')
 
-            userpage = pywikibot.Page(self.site, username)
-
             if ww:
-                month = self.months[sig[5]]
-                dates = {'hour': sig[2],
-                         'min': sig[3],
-                         'day': sig[4],
+                month = self.months[vote.month]
+                dates = {'hour': vote.hour,
+                         'min': vote.minute,
+                         'day': vote.day,
                          'mon': month,
-                         'year': sig[6]}
+                         'year': vote.year}
                 if len(dates['day']) == 1:
                     dates['day'] = '0' + dates['day']
                 query = 'day=%(day)s&mon=%(mon)s&year=%(year)s&hour=%(hour)s&min=%(min)s' \
                         % dates
-                mwTimestamp = '%(year)s%(mon)s%(day)s%(hour)s%(min)s' \
-                              % dates
-                # ## Problem: was ist 31. August + 6 Monate? 28. Februar oder Anfang März
-                # iMonth = int(month)
-                # if iMonth > 6:
-                #     month = '0'+str(iMonth-6)
-                #     dates['year'] = str(int(dates['year']) + 1)
-                # else:
-                #     month = str(iMonth+6)
-                # dates['mon'] = month
-                # mwExpired = '%(year)s%(mon)s%(day)s%(hour)s%(min)s' \
-                #             % dates
-                # print mwExpired
-                sigDate = pywikibot.Timestamp.fromtimestampformat(
-                    mwTimestamp + '00')
-                curDate = pywikibot.Timestamp.now()
-                # expDate = pywikibot.Timestamp.fromtimestampformat(mwExpired)
-                # delta = curDate-expDate
-                # if delta.days > 0:
-                #     print username, mwExpired, 'ist seit', delta.days, 'Tagen abgelaufen bei genauer Zählung.'
-                # delta = curDate-sigDate
-                regUsername = re.escape(username)
-                day = min(curDate.day, 28 if curDate.month in (2, 8) else 30)  # Jan/Feb 1-3 Tage zu spät
-                if curDate.month > 6:
-                    oldDate = curDate.replace(month=curDate.month - 6,
-                                              day=day)
-                else:
-                    oldDate = curDate.replace(month=curDate.month + 6,
-                                              year=curDate.year - 1, day=day)
-                if sigDate < oldDate:
-                    delta = oldDate - sigDate
-                    pywikibot.info(f'{username} ({mwTimestamp}) ist seit '
-                                   f'{delta.days} Tagen abgelaufen.')
-                    # TODO: 1 Eintrag wird nicht erkannt
-                    old = text
-                    if text.count('\n#') == 1:
-                        text = re.sub(
-                            r'\r?\n#(?!:).*?(?:\[http:.+?\])?[^#:]*?(?:<.+?>)?\[\[(?:[Bb]enutzer(?:in)?:|[U|u]ser:|BD:|Spezial:Beiträge/)%s *(?:/[^/\]])?[\||\]][^\r\n]*(?:[\r]*\n)?'
-                            % regUsername,
-                            r'\n', text, count=1)
-                        if old == text:
-                            text = re.sub(
-                                r'\r?\n#(?!:).*?(?:<.+?>)?\[\[(?:[Bb]enutzer(?:in)?[ _]Diskussion:|[Uu]ser[ _]talk:|BD:|Spezial:Beiträge/)%s *(?:/[^/\]])?[\||\]][^\r\n]*(?:[\r]*\n)?'
-                                % regUsername,
-                                r'\n', text, count=1)
-                    else:
-                        text = re.sub(
-                            r'\r?\n#(?!:).*?(?:\[http:.+?\])?[^#:]*?(?:<.+?>)?\[\[(?:[Bb]enutzer(?:in)?:|[Uu]ser:|BD:|Spezial:Beiträge/)%s *(?:/[^/\]])?[\||\]][^\r\n]*(?:\r?\n#[#:]+.*?)*\r?\n#([^#:]+?)'
-                            % regUsername,
-                            r'\n#\1', text, count=1)
-                        if old == text:
-                            text = re.sub(
-                                r'\r?\n#(?!:).*?(?:\[http:.+?\])?[^#:]*?(?:<.+?>)?\[\[(?:[Bb]enutzer(?:in)?[ _]Diskussion|[Uu]ser[ _]talk):%s *[\||\]][^\r\n]*(?:\r?\n#[#:]+.*?)*(?:\r?\n)+#([^#:]+?)'
-                                % regUsername,
-                                r'\n#\1', text, count=1)
-                    comment = ', abgelaufene Stimmen entfernt.'
-                    continue  # Eintrag kann gelöscht werden
-
-                path = '%s/%s?mode=bot&user=%s&%s' \
-                       % (DOMAIN,
-                          SB_TOOL_NEW,
-                          userpage.title(as_url=True).replace('_', '+'),
-                          query)
             else:
-                path = '%s/%s?mode=bot&user=%s&%s' \
-                       % (DOMAIN,
-                          SB_TOOL_NEW,
-                          userpage.title(as_url=True).replace('_', '+'),
-                          urlPath[1].replace('user=', ''))
-
-            # check voting rights
-            try:
-                data = http.fetch(uri=path)
-            except KeyboardInterrupt:
-                return
-            except Exception:
-                pywikibot.info(f'ERROR retrieving {username}')
-                pywikibot.exception()
-                continue
+                query = urlPath[1].replace('user=', '')
 
-            rights = {}
-            values = {'Ja': True, 'Nein': False}
-            for line in data.text.strip().splitlines():
-                key, _, value = line.partition(': ')
-                key = key.replace('Stimmberechtigung', '').strip()
-                key = key.replace('Abstimmung', '').strip()
-                rights[key] = values.get(value, value)
+            path = self.tool_path(username, query)
+            votes.append((username, user, path, cutoff_key(query),
+                          sigvotes))
 
-            for err in ('Fehler', "Can't connect to the database"):
-                if err in rights:
-                    raise Error(f'User {username}: {rights[err]}')
+        # check voting rights
+        kind = 'sg' if sg else 'general'
+        local = self.opt.eligibility == 'local'
+        results = [None if self.opt.nocache
+                   else self.cache.get(user.username, cutoff, kind, local)
+                   for _, user, _, cutoff, _ in votes]
+        retrievers = iter(self.fetch_rights(
+            vote[2] for vote, result in zip(votes, results)
+            if result is None and not local))
+        for (username, user, path, cutoff, sigvotes), result in zip(
+                votes, results):
+            if result is None:
+                try:
+                    result = self.eligible(
+                        user, cutoff, kind,
+                        None if local else next(retrievers))
+                except KeyboardInterrupt:
+                    return
+                if result is None:
+                    complete = False
+                    continue
 
-            result = rights['Schiedsgericht'] if sg else rights['Allgemeine']
             if result is False or config.verbose_output:
                 pywikibot.info(f'\nBenutzer:{username} ist%s stimmberechtigt'
                                % ('' if result else ' nicht'))
 
-            if self.blockinfo:  # write blocking info
-                try:
-                    if user.isBlocked():
-                        self.getInfo(user)
-                        if self.parts['duration'] == 'inifinite':
-                            pywikibot.info(
-                                '\nUser:%(user)s is blocked til/for '
-                                '%(duration)s since %(time)s (%(comment)s)'
-                                % self.parts)
-                        else:
-                            pywikibot.info(
-                                '\nUser:%(user)s is blocked til/for '
-                                '%(duration)s since %(time)s'
-                                % self.parts)
-                except Exception:
-                    pywikibot.exception()
-                    pywikibot.info(f'HTTP-Error 403 with Benutzer:{username}.')
-                    raise
+            props = self.user_props(user)
+            if self.blockinfo and 'blockedby' in props:  # write blocking info
+                parts = self.getInfo(user)
+                if parts['duration'] in ('infinite', 'infinity',
+                                         'indefinite'):
+                    pywikibot.info('\nUser:%(user)s is blocked til/for '
+                                   '%(duration)s since %(time)s (%(comment)s)'
+                                   % parts)
+                else:
+                    pywikibot.info('\nUser:%(user)s is blocked til/for '
+                                   '%(duration)s since %(time)s' % parts)
 
             # 'Klar&amp;Frisch' macht Probleme
-            is_bot = 'bot' in user.groups()
+            is_bot = 'bot' in props.get('groups', [])
             if is_bot:
                 pywikibot.info(f'\nUser:{username} is a Bot')
 
@@ -474,69 +1236,232 @@ class CheckBot(ExistingPageBot, SingleSiteBot):
             if result is False or is_bot:
                 userlist.add(username)
                 userpath[username] = path.strip().replace('mode=bot&', '')
-                self.summary += f'{delimiter} [[Benutzer:{username}]]'
+                summary += f'{delimiter} [[Benutzer:{username}]]'
                 delimiter = ','
-                text = replaceExcept(
-                    text + '\n',  # für Ende-Erkennung
-                    r'\r?\n#([^#:].*?\[\[(?:User|Benutzer(?:in)?):%s[\||\]][^\r\n]*?)\r?\n'
-                    % username,
-                    r'\n#:<s>\1</s> <small>nicht stimmberechtigt --~~~~</small>\n', [])
-
-        text = head + text
-        if self.userPut(page, page.text, text,
-                        summary=self.summary + comment):
-            for username in userlist:
-                user = pywikibot.User(self.site, username)
-                talkpage = user.getUserTalkPage()
-                if talkpage.isRedirectPage():
-                    talkpage = talkpage.getRedirectTarget()
-                if talkpage.isTalkPage():
-                    if not talkpage.exists():
-                        talk = ''
-                    else:
-                        talk = talkpage.get()
-                    title = page.title(with_ns=False).split('/')[1]
-                    if '== Stimmberechtigung ==' not in talk:
-                        talk += ('\n\n== Stimmberechtigung ==\n\nDeine '
-                                 'Abstimmung bei [[%s|%s]] wurde gestrichen. '
-                                 'Du warst [%s nicht stimmberechtigt]. --~~~~'
-                                 % (page.title(), title, userpath[username]))
-                    else:
-                        sectionR = re.compile(
-                            r'\r?\n== *Stimmberechtigung *==\r?\n')
-                        match = sectionR.search(talk)
-                        if match:
-                            talk = (talk[:match.end()]
-                                    + '\nDeine Abstimmung bei [[%s|%s]] wurde '
-                                      'gestrichen. Du warst [%s nicht '
-                                      'stimmberechtigt]. --~~~~\n'
-                                    % (page.title(), title,
-                                       userpath[username])
-                                    + talk[match.end():])
-                    self.userPut(talkpage, talkpage.text, talk,
-                                 summary='[[WP:Bot]]: Mitteilung zu %s'
-                                 % page.title(as_link=True),
-                                 minorEdit=False)
+                for sigvote in sigvotes:
+                    model.strike(sigvote)
+
+        text = model.text
+        with self.lock:
+            saved = self.userPut(page, page.text, text,
+                                 summary=summary + comment)
+            if complete and (saved or text.rstrip() == page.text.rstrip()):
+                self.checked.set(page.title(), page.latest_revision_id,
+                                 cutoff_query)
+        if saved:
+            self.notify_voters(page, {name: userpath[name]
+                                      for name in userlist})
+
+    def talk_pages(self, usernames):
+        """Return the preloaded talk pages of all given users.
+
+        Redirected talk pages are resolved by ``prop=info`` queries with
+        50 pages each; the targets are loaded by one preloading request.
+
+        :param usernames: iterable of user names
+        :return: a dict mapping user names to their talk pages
+        :rtype: dict
+        """
+        titles = {name: pywikibot.User(self.site, name).getUserTalkPage()
+                  .title() for name in usernames}
+        redirects = {}
+        for batch in batched(sorted(set(titles.values())), USERS_LIMIT):
+            result = self.site.simple_request(
+                action='query', prop='info', titles=batch,
+                redirects=True).submit()['query']
+            for item in result.get('redirects', []):
+                redirects[item['from']] = item['to']
+
+        targets = {}
+        for name, title in titles.items():
+            seen = {title}
+            while title in redirects and redirects[title] not in seen:
+                title = redirects[title]
+                seen.add(title)
+            targets[name] = title
+
+        pages = {page.title(): page for page in self.site.preloadpages(
+            pywikibot.Page(self.site, title)
+            for title in sorted(set(targets.values())))}
+        return {name: pages[title] for name, title in targets.items()
+                if title in pages}
+
+    def notify_voters(self, page, paths):
+        """Notify users about their struck votes on their talk pages.
+
+        All talk pages are preloaded at once; pages checked in parallel
+        may do this concurrently. The edits are serialized, queued and
+        saved asynchronously by the put throttle of the framework.
+
+        :param page: the vote page
+        :param paths: a dict mapping user names to their tool urls
+        """
+        title = page.title(with_ns=False).split('/')[1]
+        for username, talkpage in self.talk_pages(paths).items():
+            if not talkpage.isTalkPage():
+                continue
+            talk = talkpage.text if talkpage.exists() else ''
+            with self.lock:
+                self.userPut(talkpage, talk,
+                             add_notice(talk, page.title(), title,
+                                        paths[username]),
+                             summary='[[WP:Bot]]: Mitteilung zu %s'
+                             % page.title(as_link=True),
+                             minorEdit=False, asynchronous=True)
+
+    def tool_path(self, username: str, query: str) -> str:
+        """Return the tool url to check the voting rights of a user.
+
+        :param username: the name of the user
+        :param query: the query part of the cutoff time
+        """
+        userpage = pywikibot.Page(self.site, username)
+        return '%s/%s?mode=bot&user=%s&%s' \
+               % (DOMAIN,
+                  SB_TOOL_NEW,
+                  userpage.title(as_url=True).replace('_', '+'),
+                  query)
+
+    def eligible(self, user, cutoff: str | None, kind: str,
+                 retriever=None) -> bool | None:
+        """Retrieve whether a user is eligible at the cutoff time.
+
+        The tool is asked by *retriever*. The local engine is used if
+        no retriever is given or, in fallback mode, if the tool fails.
+        The result is stored in the cache together with its source.
+
+        :param user: the user to check
+        :type user: pywikibot.User
+        :param cutoff: the cutoff key of the vote
+        :param kind: 'general' or 'sg' for arbcom elections
+        :param retriever: callable which returns the tool response
+        :return: the eligibility or None if it could not be retrieved
+        :raise Error: the tool reported an error and there is no local
+            engine
+        """
+        rights = None
+        if retriever:
+            try:
+                data = retriever()
+            except Exception:
+                pywikibot.info(f'ERROR retrieving {user.username}')
+                pywikibot.exception()
+                if not self.engine:
+                    return None
+            else:
+                rights = parse_rights(data.text)
+
+        for err in ('Fehler', "Can't connect to the database"):
+            if rights and err in rights:
+                if not self.engine:
+                    raise Error(f'User {user.username}: {rights[err]}')
+                pywikibot.warning(f'User {user.username}: {rights[err]}')
+                rights = None
+
+        if rights:
+            result = (rights['Schiedsgericht'] if kind == 'sg'
+                      else rights['Allgemeine'])
+            source = 'tool'
+        elif not cutoff:
+            pywikibot.info(f'No cutoff time for {user.username} found')
+            return None
+        else:
+            result = self.engine.eligible(
+                user.username, cutoff_time(cutoff), kind,
+                self.user_props(user).get('registration'))
+            source = 'local'
+        self.cache.set(user.username, cutoff, kind, result, source)
+        return result
+
+    def likely_voters(self) -> list[str]:
+        """Return the names of users who will probably vote.
+
+        These are the voters of all pages checked with a cutoff time
+        within the last year and the users who recently edited
+        articles. The number of recent changes inspected is given by
+        the ``prewarm`` option.
+        """
+        since = (datetime.now(TIMEZONE) - timedelta(days=365)).strftime(
+            '%Y%m%d%H%M')
+        names = {}
+        titles = self.checked.titles(since)
+        for page in self.site.preloadpages(
+                pywikibot.Page(self.site, title) for title in titles):
+            if page.exists():
+                names.update(dict.fromkeys(
+                    vote.user for vote in VotePage(page.text).votes))
+        names.update(dict.fromkeys(
+            change['user'] for change in self.site.recentchanges(
+                namespaces=0, changetype='edit', bot=False, anon=False,
+                total=self.opt.prewarm)))
+        return list(names)
+
+    def prewarm(self, page):
+        """Retrieve the voting rights of likely voters ahead of a vote.
+
+        Users who are eligible at a future cutoff time are stored in the
+        cache; they cannot lose their eligibility until then.
+
+        :param page: the page of an upcoming vote
+        """
+        context = self.vote_context(page)
+        if context.ww:
+            pywikibot.info(f'Page {page} has no common cutoff time, '
+                           'skipping.')
+            return
+        urlPath = getDateString(page, context.template, context.url)
+        cutoff = urlPath and cutoff_key(urlPath[1])
+        if not cutoff:
+            pywikibot.info('Could not retrieve urlPath for Timestamp')
+            return
+
+        if self.voters is None:
+            self.voters = self.likely_voters()
+            self.prefetch_users(self.voters)
+        kind = 'sg' if context.sg else 'general'
+        users = []
+        for name in self.voters:
+            user = pywikibot.User(self.site, name)
+            if self.is_registered(user) \
+               and self.user_props(user).get('editcount') \
+               and self.cache.get(user.username, cutoff, kind,
+                                  self.opt.eligibility == 'local') is None:
+                users.append(user)
+
+        query = urlPath[1].replace('user=', '')
+        if self.opt.eligibility == 'local':
+            retrievers = [None] * len(users)
+        else:
+            retrievers = self.fetch_rights(
+                self.tool_path(user.username, query) for user in users)
+        eligible = failed = 0
+        for user, retriever in zip(users, retrievers):
+            try:
+                result = self.eligible(user, cutoff, kind, retriever)
+            except Error as e:
+                pywikibot.error(f'{e}; skipping.')
+                failed += 1
+                continue
+            eligible += bool(result)
+        pywikibot.info(f'{eligible} of {len(users)} likely voters of {page} '
+                       f'are eligible; {len(self.voters) - len(users)} '
+                       f'skipped, {failed} failed')
 
     def getInfo(self, user):
         """Get info about a blocked user."""
-        if not self.info:
-            self.info = self.site.logpages(1, mode='block',  # noqa: B305
-                                           title=user.getUserPage().title(),
-                                           dump=True).next()
-            self.parts = {
-                'admin': self.info['user'],
-                'user': self.info['title'],
-                'usertalk': user.getUserTalkPage().title(),
-                'time': self.info['timestamp'],
-                'duration': self.info['block']['duration'],
-                'comment': self.info['comment'],
-            }
+        props = self.user_props(user)
+        return {
+            'admin': props['blockedby'],
+            'user': props['name'],
+            'usertalk': user.getUserTalkPage().title(),
+            'time': props['blockedtimestamp'],
+            'duration': props['blockexpiry'],
+            'comment': props['blockreason'],
+        }
 
     def skip_page(self, page):
         """Check whether the page should be skipped."""
-        global ww
-        if ww:
+        if self.vote_context(page).ww:
             restrictions = page.protection()
             with suppress(KeyError):
                 if 'sysop' in restrictions['edit']:
@@ -556,27 +1481,39 @@ def main(*args):
     # page to work on is specified by the arguments.
     pageTitleParts = []
     always = False
+    options = {}
     blockinfo = False
     template = False  # fetch date from template
-    global url, sg, ww, votepage
-    url = None
     sg = False
     ww = False
-    votepage = ''
 
     # Parse command line arguments
     local_args = pywikibot.handle_args(args)
     for arg in local_args:
         option, _, value = arg.partition(':')
-        votepage = value
-        if option == '-always':
+        if option in ('-parallel', '-workers'):
+            options[option[1:]] = int(value or 4)
+        elif option in ('-full', '-nocache'):
+            options[option[1:]] = True
+        elif option == '-eligibility':
+            if value not in ('', 'tool', 'local', 'fallback'):
+                pywikibot.error(f'Unknown eligibility source {value!r}')
+                return
+            options['eligibility'] = value or 'fallback'
+        elif option == '-always':
             always = True
         elif option == '-blockinfo':
             blockinfo = True
+        elif option == '-all':
+            gen = AllPageGenerator()
+        elif option == '-watch':
+            options['watch'] = True
+        elif option == '-prewarm':
+            options['prewarm'] = int(value or 500)
         elif option == '-admin':
-            gen = AdminPageGenerator()
+            gen = AdminPageGenerator(votepage=value)
         elif option == '-crats':
-            gen = CratsPageGenerator()
+            gen = CratsPageGenerator(votepage=value)
         elif option == '-oversight':
             gen = OversightPageGenerator()
         elif option == '-os':
@@ -587,7 +1524,7 @@ def main(*args):
             gen = VotingPageGenerator()
             template = True
         elif option == '-sg':
-            gen = SgPageGenerator()
+            gen = SgPageGenerator(value)
             sg = True
         elif option == '-ww':
             gen = WwPageGenerator(value)
@@ -611,11 +1548,21 @@ def main(*args):
 
     if not gen:
         gen = genFactory.getCombinedGenerator()
-    if gen:
+    if options.get('watch'):
+        gen = WatchPageGenerator(options.get('full', False))
+    elif options.get('prewarm'):
+        gen = pagegenerators.PreloadingGenerator(
+            gen or chain(SgPageGenerator(), VotingPageGenerator()))
+    elif gen:
+        if not ww and not options.get('full'):
+            gen = UncheckedPageGenerator(gen)
         # The preloading generator is responsible for downloading multiple
         # pages from the wiki simultaneously.
         gen = pagegenerators.PreloadingGenerator(gen)
-        bot = CheckBot(template, blockinfo, always=always, generator=gen)
+    if gen:
+        context = VoteContext(template=template, sg=sg, ww=ww)
+        bot = CheckBot(template, blockinfo, context, always=always,
+                       generator=gen, **options)
         bot.run()
     else:
         pywikibot.show_help()
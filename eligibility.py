@@ -0,0 +1,274 @@
+"""Voting eligibility on de-wiki computed from user contributions.
+
+The rules of ``Wikipedia:Stimmberechtigung`` are checked with the
+contributions of a user in the article namespace. A user is eligible
+if
+
+- the account was registered at least two months before the cutoff
+  time,
+- the user made at least 200 article edits before the cutoff time and
+- at least 50 of them within the twelve months before the cutoff time.
+
+The thresholds are kept in :data:`RULES` for general votes and arbcom
+elections. The number of article edits per day is stored in a local
+database which is updated incrementally; only days at the borders of
+a period are counted exactly by the API if the daily numbers do not
+decide the result.
+"""
+#
+# (C) xqt, 2025
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from calendar import monthrange
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import pywikibot
+from pywikibot import config
+
+TIMEZONE = ZoneInfo('Europe/Berlin')  # timezone of days and cutoff times
+DATABASE = 'contributions.sqlite'  # file name in the pywikibot data folder
+SLACK = 300  # seconds to query again due to replication lag
+
+RULES = {
+    'general': {
+        'registration': 2,  # months before the cutoff time
+        'edits': 200,  # article edits before the cutoff time
+        'recent': 50,  # article edits in the recent period
+        'period': 12,  # months of the recent period
+    },
+    # arbcom elections follow the general rules
+    'sg': {
+        'registration': 2,
+        'edits': 200,
+        'recent': 50,
+        'period': 12,
+    },
+}
+
+
+def months_before(moment: datetime, months: int) -> datetime:
+    """Return the same time the given number of months earlier.
+
+    The day is clamped to the length of the resulting month.
+
+    >>> months_before(datetime(2024, 5, 31, 12, 0), 3)
+    datetime.datetime(2024, 2, 29, 12, 0)
+    >>> months_before(datetime(2024, 1, 15), 12)
+    datetime.datetime(2023, 1, 15, 0, 0)
+
+    :param moment: the time to start from
+    :param months: the number of months
+    """
+    year, month = divmod(moment.year * 12 + moment.month - 1 - months, 12)
+    month += 1
+    day = min(moment.day, monthrange(year, month)[1])
+    return moment.replace(year=year, month=month, day=day)
+
+
+def parse_timestamp(timestamp: str) -> datetime:
+    """Return an aware datetime of an API timestamp."""
+    return pywikibot.Timestamp.fromISOformat(timestamp).replace(
+        tzinfo=timezone.utc)
+
+
+def day_key(moment: datetime) -> str:
+    """Return the local day of an aware datetime as ``YYYYMMDD`` string.
+
+    >>> day_key(parse_timestamp('2024-01-01T23:30:00Z'))
+    '20240102'
+    """
+    return moment.astimezone(TIMEZONE).strftime('%Y%m%d')
+
+
+def day_start(moment: datetime) -> datetime:
+    """Return the beginning of the local day of an aware datetime."""
+    return moment.astimezone(TIMEZONE).replace(hour=0, minute=0, second=0,
+                                               microsecond=0)
+
+
+class ContributionCache:
+
+    """Persistent summary of article edits per user and local day.
+
+    The summary of a user is extended by the contributions made since
+    it was last updated. The cache may be shared by several threads.
+    """
+
+    def __init__(self, site, filename: str | None = None):
+        """Initializer.
+
+        :param site: the site of the users
+        :param filename: the database file; use the pywikibot data
+            folder by default
+        """
+        if filename is None:
+            filename = config.datafilepath('data', DATABASE)
+        self.site = site
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS days ('
+                'user TEXT, day TEXT, edits INTEGER, '
+                'PRIMARY KEY (user, day))')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS users ('
+                'user TEXT PRIMARY KEY, updated REAL, revid INTEGER)')
+
+    def contributions(self, username: str, start: datetime | None = None,
+                      end: datetime | None = None):
+        """Yield article contributions from newest to oldest.
+
+        :param username: the name of the user
+        :param start: the newest time to list
+        :param end: the oldest time to list
+        """
+        self.requests += 1
+        yield from self.site.usercontribs(
+            user=username, namespaces=0,
+            start=start and start.astimezone(timezone.utc),
+            end=end and end.astimezone(timezone.utc))
+
+    def update(self, username: str, until: datetime) -> None:
+        """Summarize contributions not known yet.
+
+        Nothing is done if the summary was updated after *until*.
+
+        :param username: the name of the user
+        :param until: the time up to which the summary must be complete
+        """
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT updated, revid FROM users WHERE user = ?',
+                (username, )).fetchone()
+        if row and row[0] >= until.timestamp():
+            return
+
+        updated, last = row or (None, 0)
+        end = updated and datetime.fromtimestamp(updated - SLACK,
+                                                 timezone.utc)
+        now = time.time()
+        counts = Counter()
+        revid = last
+        for contrib in self.contributions(username, end=end):
+            if contrib['revid'] <= last:
+                continue
+            counts[day_key(parse_timestamp(contrib['timestamp']))] += 1
+            revid = max(revid, contrib['revid'])
+
+        with self.lock, self.connection:
+            self.connection.executemany(
+                'INSERT INTO days VALUES (?, ?, ?) '
+                'ON CONFLICT (user, day) DO UPDATE '
+                'SET edits = edits + excluded.edits',
+                ((username, day, edits) for day, edits in counts.items()))
+            self.connection.execute(
+                'INSERT OR REPLACE INTO users VALUES (?, ?, ?)',
+                (username, now, revid))
+
+    def bounds(self, username: str, start: datetime | None,
+               end: datetime) -> tuple[int, int]:
+        """Return the bounds of article edits from *start* until *end*.
+
+        The lower bound excludes the days of *start* and *end*, the
+        upper bound includes them.
+
+        :param username: the name of the user
+        :param start: the beginning or None for all edits before *end*
+        :param end: the end of the period which is not included
+        """
+        first = day_key(start) if start else ''
+        last = day_key(end)
+        with self.lock:
+            inner, = self.connection.execute(
+                'SELECT COALESCE(SUM(edits), 0) FROM days '
+                'WHERE user = ? AND day > ? AND day < ?',
+                (username, first, last)).fetchone()
+            border, = self.connection.execute(
+                'SELECT COALESCE(SUM(edits), 0) FROM days '
+                'WHERE user = ? AND day IN (?, ?)',
+                (username, first, last)).fetchone()
+        return inner, inner + border
+
+    def count(self, username: str, start: datetime | None,
+              end: datetime) -> int:
+        """Return the exact number of article edits from *start* until *end*.
+
+        The days between are taken from the summary; the days of
+        *start* and *end* are counted by the API.
+
+        :param username: the name of the user
+        :param start: the beginning or None for all edits before *end*
+        :param end: the end of the period which is not included
+        """
+        edits = self.bounds(username, start, end)[0]
+        borders = {day_start(end)}
+        if start:
+            borders.add(day_start(start))
+        for begin in borders:
+            for contrib in self.contributions(
+                    username, start=begin + timedelta(days=1), end=begin):
+                moment = parse_timestamp(contrib['timestamp'])
+                if day_key(moment) == day_key(begin) and moment < end \
+                   and (start is None or moment >= start):
+                    edits += 1
+        return edits
+
+    def close(self):
+        """Close the database."""
+        self.connection.close()
+
+
+class Eligibility:
+
+    """Decide the voting rights of users by their contributions."""
+
+    def __init__(self, site, filename: str | None = None):
+        """Initializer.
+
+        :param site: the site of the users
+        :param filename: the database file; use the pywikibot data
+            folder by default
+        """
+        self.cache = ContributionCache(site, filename)
+
+    def eligible(self, username: str, cutoff: datetime,
+                 kind: str = 'general',
+                 registration: str | None = None) -> bool:
+        """Return whether the user was eligible at the cutoff time.
+
+        :param username: the name of the user
+        :param cutoff: the aware cutoff time of the vote
+        :param kind: 'general' or 'sg' for arbcom elections
+        :param registration: the registration timestamp of the user;
+            accounts without registration date are old enough
+        """
+        rule = RULES[kind]
+        if registration and parse_timestamp(registration) > months_before(
+                cutoff, rule['registration']):
+            return False
+
+        self.cache.update(username, cutoff)
+        for start, needed in (
+                (None, rule['edits']),
+                (months_before(cutoff, rule['period']), rule['recent'])):
+            low, high = self.cache.bounds(username, start, cutoff)
+            if low >= needed:
+                continue
+            if high < needed \
+               or self.cache.count(username, start, cutoff) < needed:
+                return False
+        return True
+
+    def close(self):
+        """Close the database."""
+        self.cache.close()
@@ -0,0 +1,161 @@
+"""Latency and request metrics of long running bots.
+
+The duration of named stages is measured by :meth:`Metrics.stage` and
+events are counted by :meth:`Metrics.count`. The summaries with the
+50th, 95th and 99th percentiles of the recent durations are written
+periodically, either appended as JSON line or as Prometheus text file
+which may be collected by the textfile collector of the node exporter.
+"""
+#
+# (C) xqt, 2025
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import annotations
+
+import json
+import math
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+QUANTILES = (0.5, 0.95, 0.99)
+SAMPLES = 1000  # recent durations per stage for the quantiles
+
+
+def quantile(values, q: float) -> float:
+    """Return the quantile of values by the nearest rank method.
+
+    >>> quantile([3, 1, 2, 4], 0.5)
+    2
+    >>> quantile(range(1, 101), 0.99)
+    99
+    >>> quantile([], 0.5)
+    0.0
+
+    :param values: the values
+    :param q: the quantile between 0 and 1
+    """
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[max(math.ceil(q * len(values)) - 1, 0)]
+
+
+class Metrics:
+
+    """Collect stage durations and counters and write them periodically.
+
+    The metrics may be recorded by several threads.
+    """
+
+    def __init__(self, filename: str, prefix: str = 'bot',
+                 interval: float = 300, clock=time.time):
+        """Initializer.
+
+        :param filename: the file to write; a Prometheus text file if
+            it ends with ``.prom``, JSON lines otherwise
+        :param prefix: the prefix of the Prometheus metric names
+        :param interval: seconds between writes by :meth:`flush`
+        :param clock: the function which returns the current time
+        """
+        self.filename = filename
+        self.prefix = prefix
+        self.interval = interval
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.totals = Counter()
+        self.calls = Counter()
+        self.counters = Counter()
+        self.written = clock()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Measure the duration of a stage as context manager.
+
+        The duration is recorded even if the stage raises an exception.
+
+        :param name: the name of the stage
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float) -> None:
+        """Record the duration of a stage.
+
+        :param name: the name of the stage
+        :param seconds: the duration
+        """
+        with self.lock:
+            self.samples.setdefault(name, deque(maxlen=SAMPLES)).append(
+                seconds)
+            self.totals[name] += seconds
+            self.calls[name] += 1
+
+    def count(self, name: str, number: int = 1) -> None:
+        """Increase a counter.
+
+        :param name: the name of the counter
+        :param number: the increment
+        """
+        with self.lock:
+            self.counters[name] += number
+
+    def summary(self) -> dict:
+        """Return the summary of all stages and counters."""
+        with self.lock:
+            stages = {
+                name: {
+                    'count': self.calls[name],
+                    'sum': self.totals[name],
+                    **{f'p{round(q * 100)}': quantile(samples, q)
+                       for q in QUANTILES},
+                }
+                for name, samples in sorted(self.samples.items())
+            }
+            return {'time': self.clock(), 'stages': stages,
+                    'counters': dict(sorted(self.counters.items()))}
+
+    def prometheus(self, summary: dict) -> str:
+        """Return the summary in the Prometheus text format."""
+        stage = f'{self.prefix}_stage_seconds'
+        counter = f'{self.prefix}_events_total'
+        lines = [f'# TYPE {stage} summary']
+        for name, values in summary['stages'].items():
+            for q in QUANTILES:
+                lines.append(f'{stage}{{stage="{name}",quantile="{q}"}} '
+                             f"{values[f'p{round(q * 100)}']}")
+            lines.append(f'{stage}_sum{{stage="{name}"}} {values["sum"]}')
+            lines.append(f'{stage}_count{{stage="{name}"}} '
+                         f'{values["count"]}')
+        lines.append(f'# TYPE {counter} counter')
+        for name, value in summary['counters'].items():
+            lines.append(f'{counter}{{name="{name}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self) -> None:
+        """Write the summary to the file.
+
+        A Prometheus text file is replaced atomically.
+        """
+        summary = self.summary()
+        if self.filename.endswith('.prom'):
+            temp = self.filename + '.tmp'
+            with open(temp, 'w', encoding='utf-8') as f:
+                f.write(self.prometheus(summary))
+            os.replace(temp, self.filename)
+        else:
+            with open(self.filename, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(summary) + '\n')
+        self.written = self.clock()
+
+    def flush(self) -> None:
+        """Write the summary if the interval has elapsed."""
+        if self.clock() - self.written >= self.interval:
+            self.write()
@@ -0,0 +1,115 @@
+"""Tokenizer for user signatures in wikitext.
+
+Signatures are links to a user page, user talk page or contributions
+followed by a timestamp in the same line like::
+
+    [[Benutzer:Xqt|Xqt]] ([[BD:Xqt|D]]) 12:00, 5. Nov. 2023 (CET)
+
+The text is scanned once for user links by a pattern without nested
+lazy quantifiers. Every link is paired with the first timestamp within
+a given distance; only this window of bounded size is searched. Thus
+the scan takes linear time even for long lines and large pages.
+"""
+#
+# (C) xqt, 2025
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import annotations
+
+import re
+from collections.abc import Callable, Iterator
+
+LINK_R = re.compile(
+    r'\[\[(?P<ns>[Bb]enutzer(?:in)?|[Uu]ser|BD|Spezial|Special)'
+    r'(?P<talk>[ _](?:Diskussion|talk))?:'
+    r'(?P<special>Beiträge/|Contributions/)?'
+    r'(?P<user>[^|\[\]/#\n]+)'
+    r'(?:/[^\\\]\n])?(?P<delim>[|\]])')
+TIMESTAMP_R = re.compile(
+    r'(?P<hour>\d\d):(?P<min>\d\d), (?P<day>\d\d?)(?P<daydot>\.)? '
+    r'(?P<month>[^\W\d_]+\.?) (?P<year>\d{4}) '
+    r'\((?P<zone>CES?T|MES?Z|UTC)\)')
+STAMP_LENGTH = 40  # upper bound of the length of a timestamp
+
+
+class Signature:
+
+    """A user link together with the timestamp following it."""
+
+    def __init__(self, link, stamp, line: int):
+        """Initializer.
+
+        :param link: the match of the user link
+        :param stamp: the match of the timestamp
+        :param line: the offset of the line within the text
+        """
+        self.namespace = link['ns']
+        self.talk = bool(link['talk'])
+        self.special = link['special']
+        self.user = link['user'].rstrip(' ')
+        self.piped = link['delim'] == '|'
+        self.start = link.start()
+        self.hour = stamp['hour']
+        self.minute = stamp['min']
+        self.day = stamp['day']
+        self.daydot = bool(stamp['daydot'])
+        self.month = stamp['month']  # as written, maybe abbreviated
+        self.year = stamp['year']
+        self.zone = stamp['zone']
+        self.line = line
+
+    def __repr__(self) -> str:
+        """Return a representation of the signature."""
+        return (f'{type(self).__name__}({self.user!r}, '
+                f'{self.year} {self.month} {self.day} '
+                f'{self.hour}:{self.minute})')
+
+
+def tokenize(text: str, max_gap: int, min_gap: int = 0,
+             closed: bool = False,
+             accept: Callable[[Signature], bool] | None = None,
+             ) -> Iterator[Signature]:
+    """Yield the signatures of a text in the order of their links.
+
+    The distance of the timestamp is measured from the end of the user
+    part of the link, or from the closing brackets of a piped link if
+    *closed* is set; unpiped links are skipped then. Each link is paired
+    with the first timestamp in the same line within *min_gap* and
+    *max_gap* which is accepted.
+
+    The text is scanned lazily; stop iterating if the first signature
+    is sufficient.
+
+    :param text: the wikitext to scan
+    :param max_gap: the maximum distance of the timestamp
+    :param min_gap: the minimum distance of the timestamp
+    :param closed: measure from the closing brackets of piped links
+    :param accept: a predicate which rejects unwanted signatures
+    """
+    line = end = -1
+    for link in LINK_R.finditer(text):
+        if link.start() > end:
+            line = text.rfind('\n', 0, link.start()) + 1
+            end = text.find('\n', link.start())
+            if end < 0:
+                end = len(text)
+        anchor = link.end()
+        if closed:
+            if link['delim'] != '|':
+                continue
+            anchor = text.find(']]', anchor, end)
+            if anchor < 0:
+                continue
+            anchor += 2
+
+        limit = min(end, anchor + max_gap + STAMP_LENGTH)
+        pos = anchor + min_gap
+        while stamp := TIMESTAMP_R.search(text, pos, limit):
+            if stamp.start() - anchor > max_gap:
+                break
+            signature = Signature(link, stamp, line)
+            if accept is None or accept(signature):
+                yield signature
+                break
+            pos = stamp.start() + 1
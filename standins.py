@@ -0,0 +1,419 @@
+"""Local stand-ins of the wiki and of tools for tests and benchmarks.
+
+:class:`DrySite` is a site of de-wiki with preset site info which never
+sends requests by itself. :class:`ReplaySite` answers the requests of
+the VM bots from recorded data on a :class:`VirtualClock` and
+:class:`StimmberechtigungServer` is a local HTTP server answering like
+the stimmberechtigung tool.
+"""
+#
+# (C) xqt, 2025
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import annotations
+
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+
+import pywikibot
+from pywikibot.exceptions import EditConflictError, NoPageError
+from pywikibot.logentries import LogEntryFactory
+from pywikibot.page import BasePage, Revision
+from pywikibot.site import APISite
+
+from checkvotes import CheckBot
+
+NAMESPACES = (  # id, local name and canonical name of de-wiki namespaces
+    (-2, 'Medium', 'Media'),
+    (-1, 'Spezial', 'Special'),
+    (0, '', ''),
+    (1, 'Diskussion', 'Talk'),
+    (2, 'Benutzer', 'User'),
+    (3, 'Benutzer Diskussion', 'User talk'),
+    (4, 'Wikipedia', 'Project'),
+    (5, 'Wikipedia Diskussion', 'Project talk'),
+    (6, 'Datei', 'File'),
+    (7, 'Datei Diskussion', 'File talk'),
+    (8, 'MediaWiki', 'MediaWiki'),
+    (9, 'MediaWiki Diskussion', 'MediaWiki talk'),
+    (10, 'Vorlage', 'Template'),
+    (11, 'Vorlage Diskussion', 'Template talk'),
+    (12, 'Hilfe', 'Help'),
+    (13, 'Hilfe Diskussion', 'Help talk'),
+    (14, 'Kategorie', 'Category'),
+    (15, 'Kategorie Diskussion', 'Category talk'),
+)
+MONTHS = (
+    ('Januar', 'Jan.'), ('Februar', 'Feb.'), ('März', 'Mär.'),
+    ('April', 'Apr.'), ('Mai', 'Mai'), ('Juni', 'Jun.'), ('Juli', 'Jul.'),
+    ('August', 'Aug.'), ('September', 'Sep.'), ('Oktober', 'Okt.'),
+    ('November', 'Nov.'), ('Dezember', 'Dez.'),
+)
+REGISTRATION = '2010-01-01T00:00:00Z'  # of all synthetic users
+
+
+class DrySite(APISite):
+
+    """Site of de-wiki which works without network access.
+
+    The site info like namespaces and month names is preset and the
+    bot is never logged in. Methods sending requests must be replaced
+    by the caller, e.g. with :func:`unittest.mock.patch.object`.
+    """
+
+    def __init__(self, user: str = 'Xqbot'):
+        """Initializer.
+
+        :param user: the name of the bot account
+        """
+        super().__init__('de', 'wikipedia', user)
+        now = datetime.now()
+        general = {'case': 'first-letter', 'lang': 'de',
+                   'sitename': 'Wikipedia', 'timezone': 'Europe/Berlin',
+                   'timeoffset': 60, 'generator': 'MediaWiki 1.45.0'}
+        namespaces = {
+            str(ns): {'id': ns, 'name': name, 'canonical': canonical,
+                      'case': 'first-letter', 'subpages': ns > 0}
+            for ns, name, canonical in NAMESPACES}
+        self._siteinfo._cache['general'] = (general, now)
+        self._siteinfo._cache['namespaces'] = (namespaces, now)
+        self._siteinfo._cache['namespacealiases'] = ([], now)
+        self._months_names = list(MONTHS)
+
+    def login(self, *args, **kwargs) -> None:
+        """Do not log in."""
+
+
+class StimmberechtigungHandler(BaseHTTPRequestHandler):
+
+    """Answer requests like the stimmberechtigung tool in bot mode."""
+
+    def do_GET(self):  # noqa: N802
+        """Respond to a GET request."""
+        server = self.server
+        query = parse_qs(urlsplit(self.path).query)
+        user = query.get('user', [''])[0]
+        server.count(user)
+        if server.latency:
+            time.sleep(server.latency)
+
+        if server.fail():
+            self.send_error(500)
+            return
+
+        if not user:
+            lines = ['Fehler: Kein Benutzername angegeben']
+        else:
+            result = 'Nein' if user in server.ineligible else 'Ja'
+            lines = [f'Allgemeine Stimmberechtigung: {result}',
+                     f'Schiedsgericht Stimmberechtigung: {result}']
+        if query.get('mode') != ['bot']:
+            lines = [f'<p>{line}</p>' for line in lines]
+
+        body = '\n'.join(lines).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        """Do not log requests."""
+
+
+class StimmberechtigungServer(ThreadingHTTPServer):
+
+    """Local stand-in for the stimmberechtigung tool.
+
+    The server listens on a free localhost port and is started and
+    stopped as a context manager::
+
+        with StimmberechtigungServer(ineligible={'Foo'}) as server:
+            fetch(f'{server.url}/?mode=bot&user=Foo')
+
+    :param ineligible: names of users which are not eligible
+    :param latency: seconds to wait before every response
+    :param error_rate: fraction of requests answered with status 500
+    :param seed: seed of the random errors
+    """
+
+    daemon_threads = True
+
+    def __init__(self, ineligible=(), latency: float = 0.0,
+                 error_rate: float = 0.0, seed=None):
+        """Initializer."""
+        super().__init__(('127.0.0.1', 0), StimmberechtigungHandler)
+        self.ineligible = set(ineligible)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.requests = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        """The base url of the server."""
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def total(self) -> int:
+        """The number of requests served."""
+        return sum(self.requests.values())
+
+    def count(self, user: str) -> None:
+        """Count a request for the given user."""
+        with self.lock:
+            self.requests[user] = self.requests.get(user, 0) + 1
+
+    def fail(self) -> bool:
+        """Return whether the current request should fail."""
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+    def __enter__(self):
+        """Start serving in a background thread."""
+        self.thread = threading.Thread(target=self.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        """Stop serving and close the socket."""
+        self.shutdown()
+        self.thread.join()
+        self.server_close()
+
+
+def epoch(value) -> float:
+    """Return seconds since the epoch of a POSIX or ISO timestamp."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+
+def isoformat(seconds: float) -> str:
+    """Return the API timestamp of seconds since the epoch."""
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime(
+        '%Y-%m-%dT%H:%M:%SZ')
+
+
+class VirtualClock:
+
+    """Clock which only advances when told to."""
+
+    def __init__(self, now: float = 0.0):
+        """Initializer."""
+        self.now = now
+
+    def time(self) -> float:
+        """Return the current virtual time."""
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        """Let the given number of seconds pass."""
+        self.now += seconds
+
+    def set(self, moment: float) -> None:
+        """Advance to the given moment unless it has already passed."""
+        self.now = max(self.now, moment)
+
+
+class GeneratorResult(list):
+
+    """Result of a stand-in list generator with a request mapping."""
+
+    def __init__(self, items, **request):
+        """Initializer."""
+        super().__init__(items)
+        self.request = request
+
+
+class ReplaySite:
+
+    """Stand-in for the API of a site answered from recorded data.
+
+    The methods of a real site which send requests are replaced by the
+    methods of this class while :meth:`attach` is active. Blocks and
+    protections of the recorded events take effect at their timestamp;
+    the revision of the VM page is the newest one recorded or saved up
+    to the current virtual time.
+    """
+
+    def __init__(self, clock: VirtualClock, latency: float,
+                 vm_title: str, revisions: list[dict],
+                 existing: tuple[str, ...] = ()):
+        """Initializer.
+
+        :param clock: the virtual clock
+        :param latency: virtual seconds of every request
+        :param vm_title: the title of the VM page
+        :param revisions: the recorded revisions of the VM page
+        :param existing: titles of further pages which exist but are
+            empty like the opt-out lists
+        """
+        self.clock = clock
+        self.latency = latency
+        self.vm_title = vm_title
+        self.pages = {vm_title: sorted(
+            ((epoch(rev['timestamp']), rev['revid'], rev['text'])
+             for rev in revisions), key=lambda rev: rev[:2])}
+        for title in existing:
+            self.pages[title] = [(0.0, 1, '')]
+        self.next_revid = max(rev[1] for rev in self.pages[vm_title]) + 1
+        self.blocks = []  # (time, user, block data or None if unblocked)
+        self.logs = []  # (time, log event data)
+        self.requests = Counter()
+        self.edits = []  # (time, title, summary)
+        self.conflicts = 0
+        self.profiles = {}  # user data replacing the default profile
+
+    def add_event(self, entry: dict) -> None:
+        """Record the effects of a stream entry on the site."""
+        if entry['type'] != 'log':
+            return
+        moment = epoch(entry['timestamp'])
+        params = entry.get('log_params') or {}
+        if entry['log_type'] == 'block':
+            name = entry['title'].partition(':')[2]
+            data = None
+            if entry['log_action'] in ('block', 'reblock'):
+                data = {'user': name, 'by': entry['user'],
+                        'timestamp': isoformat(moment),
+                        'expiry': params.get('expiry', 'infinity'),
+                        'reason': entry.get('comment', ''),
+                        'partial': not params.get('sitewide', True),
+                        'restrictions': params.get('restrictions', [])}
+            self.blocks.append((moment, name, data))
+        elif entry['log_type'] == 'protect':
+            self.logs.append((moment, {
+                'type': 'protect', 'action': entry['log_action'],
+                'title': entry['title'], 'ns': entry.get('namespace', 0),
+                'user': entry['user'], 'timestamp': isoformat(moment),
+                'comment': entry.get('comment', ''), 'params': params,
+                'logid': entry.get('log_id', 0)}))
+
+    def request(self, name: str) -> None:
+        """Count a request and let its latency pass."""
+        self.requests[name] += 1
+        self.clock.advance(self.latency)
+
+    def current(self, title: str) -> tuple[float, int, str] | None:
+        """Return the current revision of a page."""
+        revisions = [rev for rev in self.pages.get(title, [])
+                     if rev[0] <= self.clock.now]
+        return revisions[-1] if revisions else None
+
+    def loadrevisions(self, page, *, content: bool = False, **kwargs):
+        """Load the current revision into the page."""
+        self.request('loadrevisions')
+        revision = self.current(page.title())
+        if revision is None:
+            raise NoPageError(page)
+        moment, revid, text = revision
+        page._pageid = 1
+        page._isredir = False
+        page._revid = revid
+        page._timestamp = pywikibot.Timestamp.fromISOformat(
+            isoformat(moment))
+        page._revisions[revid] = Revision(
+            revid=revid, timestamp=isoformat(moment),
+            slots={'main': {'*': text, 'contentmodel': 'wikitext'}})
+
+    def editpage(self, page, summary=None, **kwargs) -> bool:
+        """Store a new revision unless the page was changed meanwhile."""
+        self.request('editpage')
+        title = page.title()
+        revision = self.current(title)
+        if revision and getattr(page, '_revid', None) != revision[1]:
+            self.conflicts += 1
+            raise EditConflictError(page)
+        revid = self.next_revid
+        self.next_revid += 1
+        revisions = self.pages.setdefault(title, [])
+        revisions.append((self.clock.now, revid, page.text))
+        revisions.sort(key=lambda rev: rev[0])
+        self.edits.append((self.clock.now, title, summary))
+        page._revid = revid
+        return True
+
+    def blocks_list(self, users=None, ip_range=None, **kwargs):
+        """Return the active blocks of the given users or IP ranges."""
+        self.request('blocks')
+        active = {}
+        for moment, name, data in self.blocks:
+            if moment <= self.clock.now:
+                active[name] = data
+        if ip_range:
+            users = [name for name in active if '/' in name]
+        return GeneratorResult(
+            (active[name] for name in users or ()
+             if active.get(name)), bkprop=['user'])
+
+    def users(self, usernames, **kwargs):
+        """Return the profiles of users.
+
+        Users are registered and experienced unless another profile is
+        given in :attr:`profiles`.
+        """
+        self.request('users')
+        return [self.profiles.get(name, {
+            'name': name, 'userid': 1, 'editcount': 1000,
+            'groups': ['*', 'user', 'autoconfirmed']})
+            for name in usernames]
+
+    def pagelinks(self, page, **kwargs):
+        """Return no links."""
+        self.request('pagelinks')
+        return []
+
+    def logevents(self, logtype=None, end=None, total=None, **kwargs):
+        """Return the recorded log events from newest back to *end*."""
+        self.request('logevents')
+        start = pywikibot.Timestamp.fromtimestampformat(end).replace(
+            tzinfo=timezone.utc).timestamp() if end else 0
+        # the entry class is not validated against the logtypes of the
+        # site which would be requested from the wiki
+        logclass = LogEntryFactory.get_entry_class(logtype)
+        entries = [logclass(data, self.site)
+                   for moment, data in reversed(self.logs)
+                   if start <= moment <= self.clock.now
+                   and data['type'] == logtype]
+        return entries[:total]
+
+    def attach(self, site) -> ExitStack:
+        """Replace the request methods of the site by this stand-in."""
+        self.site = site
+        stack = ExitStack()
+        for name, method in (('loadrevisions', self.loadrevisions),
+                             ('editpage', self.editpage),
+                             ('blocks', self.blocks_list),
+                             ('users', self.users),
+                             ('pagelinks', self.pagelinks),
+                             ('logevents', self.logevents)):
+            stack.enter_context(mock.patch.object(site, name, method))
+        stack.enter_context(mock.patch.object(BasePage, 'botMayEdit',
+                                              return_value=True))
+        return stack
+
+
+class DryCheckBot(CheckBot):
+
+    """CheckBot which does not save and uses a temporary database."""
+
+    database = ':memory:'
+
+    def userPut(self, page, oldtext, newtext,  # noqa: N802
+                **kwargs) -> bool:
+        """Count the edits but do not save."""
+        self.counter['write'] += 1
+        return False
@@ -6,11 +6,29 @@
 #
 from __future__ import annotations
 
+import sqlite3
+import tempfile
+import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, closing
+from itertools import count
+from pathlib import Path
+from unittest import mock
 
+import pywikibot
+from pywikibot import pagegenerators
 from pywikibot.comms.http import fetch
+from pywikibot.exceptions import ServerError
+from pywikibot.page import BasePage
 
-from checkvotes import SB_TOOL, SB_TOOL_NEW
+import checkvotes
+from checkvotes import (SB_TOOL, SB_TOOL_NEW, CheckedRevisions,
+                        EligibilityCache, VoteContext, VotePage,
+                        WatchPageGenerator, add_notice, cutoff_key,
+                        expiry_limit, parse_rights)
+from standins import (REGISTRATION, DryCheckBot, DrySite,
+                      StimmberechtigungServer)
 
 
 class TestPathsMeta(type):
@@ -46,5 +64,624 @@ class TestPaths(unittest.TestCase, metaclass=TestPathsMeta):
     """Test remote paths."""
 
 
+class TestStandInTool(unittest.TestCase):
+
+    """Test the tool response parser with the local stand-in."""
+
+    def test_rights(self):
+        """Test eligible and ineligible users."""
+        with StimmberechtigungServer(ineligible={'Foo Bar'}) as server:
+            for user, result in (('Foo+Bar', False), ('Baz', True)):
+                data = fetch(f'{server.url}/?mode=bot&user={user}&day=1')
+                self.assertEqual(parse_rights(data.text),
+                                 {'Allgemeine': result,
+                                  'Schiedsgericht': result})
+            self.assertEqual(server.requests, {'Foo Bar': 1, 'Baz': 1})
+
+    def test_errors(self):
+        """Test error responses."""
+        with StimmberechtigungServer(error_rate=1.0) as server, \
+             self.assertRaises(ServerError):
+            fetch(f'{server.url}/?mode=bot&user=Foo')
+        with StimmberechtigungServer() as server:
+            data = fetch(f'{server.url}/?mode=bot')
+        self.assertIn('Fehler', parse_rights(data.text))
+
+
+class TestEligibilityCache(unittest.TestCase):
+
+    """Test EligibilityCache."""
+
+    def setUp(self):
+        """Open an in-memory cache."""
+        super().setUp()
+        self.cache = EligibilityCache(':memory:')
+
+    def tearDown(self):
+        """Close the cache."""
+        self.cache.close()
+        super().tearDown()
+
+    def test_cutoff_key(self):
+        """Test cutoff_key function."""
+        self.assertEqual(
+            cutoff_key('day=05&mon=11&year=2023&hour=0&min=00'),
+            '202311050000')
+        self.assertEqual(cutoff_key('&day=1&mon=2&year=2020&hour=3&min=4'),
+                         '202002010304')
+        self.assertIsNone(cutoff_key('day=1&mon=2&year=2020'))
+        self.assertIsNone(cutoff_key('day=x&mon=2&year=2020&hour=3&min=4'))
+
+    def test_past_cutoff(self):
+        """Test that results of past cutoff times are cached."""
+        self.assertIsNone(self.cache.get('Xqt', '202001010000', 'general'))
+        self.cache.set('Xqt', '202001010000', 'general', True)
+        self.cache.set('Xqt', '202001010000', 'sg', False)
+        self.assertTrue(self.cache.get('Xqt', '202001010000', 'general'))
+        self.assertFalse(self.cache.get('Xqt', '202001010000', 'sg'))
+        self.assertIsNone(self.cache.get('Xqt', '202001010001', 'general'))
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 2))
+
+    def test_future_cutoff(self):
+        """Test that only positive results of future cutoffs are cached."""
+        self.cache.set('Xqt', '299912312359', 'general', True)
+        self.cache.set('Xqt', '299912312359', 'sg', False)
+        self.cache.set('Xqt', None, 'general', True)
+        self.assertTrue(self.cache.get('Xqt', '299912312359', 'general'))
+        self.assertIsNone(self.cache.get('Xqt', '299912312359', 'sg'))
+        self.assertIsNone(self.cache.get('Xqt', None, 'general'))
+
+    def test_source(self):
+        """Test that local results never replace tool results."""
+        self.cache.set('Foo', '202001010000', 'general', False, 'local')
+        self.assertIsNone(self.cache.get('Foo', '202001010000', 'general'))
+        self.assertFalse(self.cache.get('Foo', '202001010000', 'general',
+                                        local=True))
+        self.cache.set('Foo', '202001010000', 'general', True)
+        self.cache.set('Foo', '202001010000', 'general', False, 'local')
+        self.assertTrue(self.cache.get('Foo', '202001010000', 'general'))
+
+    def test_migration(self):
+        """Test that results of an old database count as local."""
+        with tempfile.TemporaryDirectory() as folder:
+            filename = str(Path(folder, 'cache.sqlite'))
+            with closing(sqlite3.connect(filename)) as connection, \
+                 connection:
+                connection.execute(
+                    'CREATE TABLE eligibility (user TEXT, cutoff TEXT, '
+                    'kind TEXT, result INTEGER, used REAL, '
+                    'PRIMARY KEY (user, cutoff, kind))')
+                connection.execute(
+                    'INSERT INTO eligibility VALUES (?, ?, ?, ?, ?)',
+                    ('Foo', '202001010000', 'general', True, time.time()))
+            cache = EligibilityCache(filename)
+            self.assertIsNone(cache.get('Foo', '202001010000', 'general'))
+            self.assertTrue(cache.get('Foo', '202001010000', 'general',
+                                      local=True))
+            cache.close()
+
+    def test_evict(self):
+        """Test eviction of least recently used entries."""
+        self.cache.max_entries = 2
+        with mock.patch('time.time', side_effect=count(10 ** 9)):
+            for minute in range(3):
+                self.cache.set('Xqt', f'2020010100{minute:02}', 'general',
+                               True)
+            self.cache.get('Xqt', '202001010000', 'general')
+            self.cache.evict()
+        self.assertTrue(self.cache.get('Xqt', '202001010000', 'general'))
+        self.assertIsNone(self.cache.get('Xqt', '202001010001', 'general'))
+        self.assertTrue(self.cache.get('Xqt', '202001010002', 'general'))
+
+    def test_threads(self):
+        """Test that the cache can be shared by threads."""
+        users = [f'User {i}' for i in range(20)]
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(lambda user: self.cache.set(
+                user, '202001010000', 'general', True), users))
+            results = list(pool.map(lambda user: self.cache.get(
+                user, '202001010000', 'general'), users))
+        self.assertEqual(results, [True] * 20)
+        self.assertEqual(self.cache.hits, 20)
+
+
+class TestCheckedRevisions(unittest.TestCase):
+
+    """Test CheckedRevisions."""
+
+    def test_titles(self):
+        """Test titles of pages checked since a cutoff time."""
+        checked = CheckedRevisions(':memory:')
+        checked.set('Old', 1, 'user=&day=1&mon=1&year=2020&hour=0&min=0')
+        checked.set('New', 2, 'user=&day=1&mon=1&year=2024&hour=0&min=0')
+        checked.set('Ww', 3, None)
+        self.assertEqual(checked.titles('202301010000'), ['New'])
+        self.assertEqual(checked.get('Old'),
+                         (1, 'user=&day=1&mon=1&year=2020&hour=0&min=0'))
+        checked.close()
+
+
+class TestUncheckedPageGenerator(unittest.TestCase):
+
+    """Test skipping vote pages which are unchanged since their check."""
+
+    def setUp(self):
+        """Store the checked revisions in a temporary folder."""
+        super().setUp()
+        self.site = DrySite()
+        self.folder = tempfile.TemporaryDirectory()
+        self.stack = ExitStack()
+        for obj, name, value in (
+                (pywikibot, 'Site', mock.Mock(return_value=self.site)),
+                (checkvotes.config, 'datafilepath',
+                 lambda *path: str(Path(self.folder.name, path[-1]))),
+                (self.site, 'preloadpages',
+                 lambda pages, **kwargs: iter(pages))):
+            self.stack.enter_context(mock.patch.object(obj, name, value))
+        checked = CheckedRevisions()
+        for title, revid in (('Foo', 5), ('Bar', 4), ('Ww', 5)):
+            checked.set(title, revid, None)
+        checked.close()
+
+    def tearDown(self):
+        """Remove the temporary folder."""
+        self.stack.close()
+        self.folder.cleanup()
+        super().tearDown()
+
+    def page(self, title: str, revid: int, ww: bool = False):
+        """Return an existing page with the given latest revision id."""
+        page = pywikibot.Page(self.site, title)
+        page._pageid = 1
+        page._revid = revid
+        if ww:
+            page.vote_context = VoteContext(ww=True)
+        return page
+
+    def test_unchanged(self):
+        """Test that only unchanged pages are skipped."""
+        pages = [self.page('Foo', 5), self.page('Bar', 5),
+                 self.page('Baz', 5), self.page('Ww', 5, ww=True)]
+        self.assertEqual(
+            [page.title() for page in
+             checkvotes.UncheckedPageGenerator(pages)],
+            ['Bar', 'Baz', 'Ww'])
+
+    def test_full(self):
+        """Test that the -full option checks unchanged pages too."""
+        for args, skipped in ((), True), (('-full', ), False):
+            with self.subTest(args=args), \
+                 mock.patch.object(checkvotes, 'CheckBot') as bot, \
+                 mock.patch.object(checkvotes, 'UncheckedPageGenerator',
+                                   side_effect=iter) as unchecked:
+                checkvotes.main(*args, 'Foo')
+                self.assertEqual(unchecked.called, skipped)
+                bot.return_value.run.assert_called_once()
+
+
+class TestVotePage(unittest.TestCase):
+
+    """Test VotePage model."""
+
+    TEXT = """Intro [[Benutzer:Xqt|Xqt]] 11:00, 1. Nov. 2023 (CET)
+== Abstimmung ==
+=== Pro ===
+# [[Benutzer:Xqt|Xqt]] 12:00, 5. Nov. 2023 (CET)
+#: Frage [[Benutzer:Foo|Foo]] 12:01, 5. Nov. 2023 (CET)
+# Gut --[[Benutzer Diskussion:Bar|Bar]] 13:00, 6. Nov. 2023 (CET)
+=== Contra ===
+# --[[User:Baz|Baz]] ([[User talk:Baz|D]]) 09:15, 7. Mai 2024 (CEST)
+"""
+
+    def setUp(self):
+        """Parse the sample page."""
+        super().setUp()
+        self.model = VotePage(self.TEXT)
+
+    def test_parse(self):
+        """Test head, sections and votes."""
+        self.assertEqual(self.model.head, self.TEXT.split('==')[0])
+        self.assertEqual(self.model.sections,
+                         [(0, 'Abstimmung'), (1, 'Pro'), (5, 'Contra')])
+        self.assertEqual([(v.user, v.talk, v.section)
+                          for v in self.model.votes],
+                         [('Xqt', False, 'Pro'), ('Bar', True, 'Pro'),
+                          ('Baz', False, 'Contra')])
+        vote = self.model.votes[2]
+        self.assertEqual((vote.hour, vote.minute, vote.day, vote.month,
+                          vote.year), ('09', '15', '7', 'Mai', '2024'))
+        for vote in self.model.votes:
+            self.assertTrue(self.TEXT[vote.offset:].startswith(vote.line))
+
+    def test_expiry(self):
+        """Test vote timestamps and expiry limit."""
+        months = {'Nov.': '11', 'Mai': '05'}
+        timestamps = [vote.timestamp(months) for vote in self.model.votes]
+        self.assertEqual(timestamps[0], pywikibot.Timestamp(2023, 11, 5, 12))
+        self.assertEqual(timestamps[2],
+                         pywikibot.Timestamp(2024, 5, 7, 9, 15))
+        limit = expiry_limit(pywikibot.Timestamp(2024, 5, 6, 13, 0))
+        self.assertEqual(limit, pywikibot.Timestamp(2023, 11, 6, 13, 0))
+        self.assertEqual([ts < limit for ts in timestamps],
+                         [True, False, False])
+        self.assertEqual(expiry_limit(pywikibot.Timestamp(2024, 3, 31)),
+                         pywikibot.Timestamp(2023, 9, 30))
+
+    def test_unchanged(self):
+        """Test that the text is rebuilt unchanged."""
+        self.assertEqual(self.model.text, self.TEXT)
+
+    def test_strike(self):
+        """Test strike-through of votes."""
+        self.model.strike(self.model.votes[1])
+        lines = self.model.text.splitlines()
+        self.assertEqual(
+            lines[5],
+            '#:<s> Gut --[[Benutzer Diskussion:Bar|Bar]] 13:00, 6. Nov. 2023 '
+            '(CET)</s> <small>nicht stimmberechtigt --~~~~</small>')
+        self.assertEqual(len(lines), len(self.TEXT.splitlines()))
+
+    def test_remove(self):
+        """Test removal of votes with follow-up lines."""
+        self.model.remove(self.model.votes[0])
+        self.model.remove(self.model.votes[2])
+        self.assertEqual(self.model.text.splitlines()[2:],
+                         ['=== Pro ===',
+                          '# Gut --[[Benutzer Diskussion:Bar|Bar]] 13:00, '
+                          '6. Nov. 2023 (CET)',
+                          '=== Contra ==='])
+
+
+class TestCheckBot(unittest.TestCase):
+
+    """Test CheckBot with stand-ins of the site and the tool."""
+
+    QUERY = 'user=&day=1&mon=11&year=2024&hour=0&min=0'
+
+    def setUp(self):
+        """Start the stand-in tool and replace the site requests."""
+        super().setUp()
+        self.site = DrySite()
+        self.server = StimmberechtigungServer(ineligible={'Bar'})
+        self.redirects = []
+        self.queries = []
+        self.stack = ExitStack()
+        self.stack.enter_context(self.server)
+        for obj, name, value in (
+                (checkvotes, 'DOMAIN', self.server.url),
+                (self.site, 'users', self.users),
+                (self.site, 'simple_request', self.simple_request),
+                (BasePage, 'botMayEdit', mock.Mock(return_value=True))):
+            self.stack.enter_context(mock.patch.object(obj, name, value))
+
+    def tearDown(self):
+        """Stop the stand-in tool."""
+        self.stack.close()
+        super().tearDown()
+
+    @staticmethod
+    def users(names):
+        """Return the properties of registered users."""
+        return [{'name': name, 'registration': REGISTRATION,
+                 'editcount': 1000, 'groups': ['*', 'user']}
+                for name in names]
+
+    def simple_request(self, **kwargs):
+        """Return the user page redirects."""
+        self.queries.append(kwargs['titles'])
+        return mock.Mock(**{'submit.return_value': {
+            'query': {'redirects': self.redirects}}})
+
+    def vote_page(self, *votes: str):
+        """Return a vote page with the given vote lines."""
+        page = pywikibot.Page(self.site, 'Wikipedia:Adminkandidaturen/Foo')
+        page.text = '== Abstimmung ==\n' + '\n'.join(votes) + '\n'
+        page._revid = 1
+        page.vote_context = VoteContext(url=(SB_TOOL, self.QUERY))
+        return page
+
+    def check(self, *votes: str) -> str:
+        """Check a vote page with the given vote lines.
+
+        :return: the new page text
+        """
+        bot = DryCheckBot(False, False, site=self.site, full=True)
+        with mock.patch.object(bot, 'userPut', return_value=False) as put:
+            bot.setup()
+            bot.treat(self.vote_page(*votes))
+            bot.teardown()
+        return put.call_args[0][2]
+
+    def test_strike(self):
+        """Test that votes of ineligible users are struck."""
+        text = self.check(
+            '# [[Benutzer:Foo|Foo]] 12:00, 5. Nov. 2024 (CET)',
+            '# [[Benutzer:Bar|Bar]] 12:01, 5. Nov. 2024 (CET)')
+        self.assertEqual(text.splitlines()[1:], [
+            '# [[Benutzer:Foo|Foo]] 12:00, 5. Nov. 2024 (CET)',
+            '#:<s> [[Benutzer:Bar|Bar]] 12:01, 5. Nov. 2024 (CET)</s> '
+            '<small>nicht stimmberechtigt --~~~~</small>'])
+        self.assertEqual(self.server.requests, {'Foo': 1, 'Bar': 1})
+
+    def test_notify_unlocked(self):
+        """Test that voters are notified without holding the edit lock."""
+        bot = DryCheckBot(False, False, site=self.site, full=True)
+        locked = []
+        with mock.patch.object(bot, 'userPut', return_value=True), \
+             mock.patch.object(bot, 'notify_voters', side_effect=lambda *a:
+                               locked.append(bot.lock.locked())) as notify:
+            bot.setup()
+            bot.treat(self.vote_page(
+                '# [[Benutzer:Bar|Bar]] 12:01, 5. Nov. 2024 (CET)'))
+            bot.teardown()
+        self.assertEqual(notify.call_args[0][1],
+                         {'Bar': f'{self.server.url}/?user=Bar&'
+                                 f'{self.QUERY[5:]}'})
+        self.assertEqual(locked, [False])
+
+    def test_changed_lines(self):
+        """Test that only votes added since the last check are checked."""
+        old = '# [[Benutzer:Bar|Bar]] 12:00, 5. Nov. 2024 (CET)'
+        new = '# [[Benutzer:Foo|Foo]] 12:01, 5. Nov. 2024 (CET)'
+        for full, requests in ((False, {'Foo': 1}),
+                               (True, {'Foo': 1, 'Bar': 1})):
+            self.server.requests.clear()
+            bot = DryCheckBot(False, False, site=self.site, full=full)
+            bot.setup()
+            bot.checked.set('Wikipedia:Adminkandidaturen/Foo', 1,
+                            self.QUERY)
+            page = self.vote_page(old, new)
+            with self.subTest(full=full), \
+                 mock.patch.object(page, 'getOldVersion',
+                                   return_value=old + '\n'), \
+                 mock.patch.object(bot, 'userPut',
+                                   return_value=False) as put:
+                bot.treat(page)
+                bot.teardown()
+                self.assertEqual(self.server.requests, requests)
+                self.assertEqual(put.call_args[0][2].count(
+                    'nicht stimmberechtigt'), len(requests) - 1)
+
+    def test_blockinfo(self):
+        """Test that the reason of an indefinite block is shown."""
+        def users(names):
+            return [dict(user, blockedby='Admin', blockexpiry='infinite',
+                         blockedtimestamp='2024-11-01T00:00:00Z',
+                         blockreason='Vandalismus')
+                    for user in self.users(names)]
+
+        bot = DryCheckBot(False, True, site=self.site, full=True)
+        with mock.patch.object(self.site, 'users', users), \
+             mock.patch.object(bot, 'userPut', return_value=False), \
+             mock.patch.object(pywikibot, 'info') as info:
+            bot.setup()
+            bot.treat(self.vote_page(
+                '# [[Benutzer:Foo|Foo]] 12:00, 5. Nov. 2024 (CET)'))
+            bot.teardown()
+        info.assert_any_call('\nUser:Foo is blocked til/for infinite since '
+                             '2024-11-01T00:00:00Z (Vandalismus)')
+
+    def test_redirected_user(self):
+        """Test that both votes of a redirected user are struck."""
+        self.redirects = [{'from': 'Benutzer:Baz', 'to': 'Benutzer:Bar'}]
+        text = self.check(
+            '# [[Benutzer:Baz|Baz]] 12:00, 5. Nov. 2024 (CET)',
+            '# [[Benutzer:Bar|Bar]] 12:01, 5. Nov. 2024 (CET)')
+        self.assertEqual(text.count('nicht stimmberechtigt'), 2)
+        self.assertEqual(self.server.requests, {'Bar': 1})
+
+    def test_redirect_loop(self):
+        """Test that user pages redirecting in a loop are an error."""
+        self.redirects = [{'from': 'Benutzer:Foo', 'to': 'Benutzer:Baz'},
+                          {'from': 'Benutzer:Baz', 'to': 'Benutzer:Foo'}]
+        bot = DryCheckBot(False, False, site=self.site)
+        self.assertEqual(bot.redirect_chain('Foo'), ['Baz', 'Foo'])
+        with self.assertRaisesRegex(checkvotes.Error,
+                                    r'^Redirect loop for .*Foo\]\] found$'):
+            bot.resolve_user('Foo')
+
+    def test_redirects_memoized(self):
+        """Test that the redirects are retrieved once per run."""
+        self.redirects = [{'from': 'Benutzer:Baz', 'to': 'Benutzer:Bar'}]
+        bot = DryCheckBot(False, False, site=self.site)
+        for _ in range(2):
+            self.assertEqual(bot.resolve_user('Baz').username, 'Bar')
+            self.assertEqual(bot.resolve_user('Foo').username, 'Foo')
+        self.assertEqual(self.queries,
+                         [('Benutzer:Baz', ), ('Benutzer:Foo', )])
+        bot.reset_users()
+        bot.resolve_user('Baz')
+        self.assertEqual(len(self.queries), 3)
+
+    def test_prewarm_error(self):
+        """Test that a tool error of one user does not stop pre-warming."""
+        bot = DryCheckBot(False, False, site=self.site, prewarm=1)
+        bot.setup()
+        bot.voters = ['Foo', 'Bar']
+        responses = [mock.Mock(text='Fehler: Datenbank nicht erreichbar'),
+                     mock.Mock(text='Allgemeine Stimmberechtigung: Ja\n'
+                                    'Schiedsgericht Stimmberechtigung: Ja')]
+        with mock.patch.object(bot, 'fetch_rights', return_value=[
+                lambda data=data: data for data in responses]):
+            bot.treat(self.vote_page())
+        self.assertIsNone(bot.cache.get('Foo', '202411010000', 'general'))
+        self.assertTrue(bot.cache.get('Bar', '202411010000', 'general'))
+        bot.teardown()
+
+    def test_watch_errors(self):
+        """Test that unexpected errors of a page are logged in watch mode."""
+        page = self.vote_page(
+            '# [[Benutzer:Foo|Foo]] 12:00, 5. Nov. 2024 (CET)')
+        for parallel in (0, 2):
+            with self.subTest(parallel=parallel), \
+                 mock.patch.object(self.site, 'users',
+                                   side_effect=KeyError('name')), \
+                 mock.patch.object(pywikibot, 'exception') as exception:
+                bot = DryCheckBot(False, False, site=self.site, full=True,
+                                  watch=True, parallel=parallel)
+                bot.setup()
+                bot.treat(page)
+                bot.teardown()
+                exception.assert_called_once()
+
+    def test_users_expiry(self):
+        """Test that user properties expire in watch mode."""
+        bot = DryCheckBot(False, False, site=self.site, full=True,
+                          watch=True)
+        bot.setup()
+        page = self.vote_page(
+            '# [[Benutzer:Foo|Foo]] 12:00, 5. Nov. 2024 (CET)')
+        with mock.patch.object(bot, 'userPut', return_value=False):
+            bot.treat(page)
+            self.assertIn('Foo', bot.userprops)
+            with mock.patch.object(bot, 'check_page'):
+                bot.treat(page)
+                self.assertIn('Foo', bot.userprops)
+                bot.users_loaded -= bot.users_expiry + 1
+                bot.treat(page)
+        self.assertEqual(bot.userprops, {})
+        bot.teardown()
+
+
+class TestWatchPageGenerator(unittest.TestCase):
+
+    """Test WatchPageGenerator."""
+
+    def test_refresh(self):
+        """Test that votes removed from the index are no longer watched."""
+        site = DrySite()
+
+        def pages(*names):
+            result = []
+            for name in names:
+                page = pywikibot.Page(site, 'Wikipedia:Meinungsbilder/'
+                                      + name)
+                page.vote_context = VoteContext(template=True)
+                result.append(page)
+            return result
+
+        listener = mock.MagicMock()
+        listener.__iter__.return_value = iter(
+            {'bot': False, 'user': 'Foo', 'title': title}
+            for title in ('Wikipedia:Meinungsbilder/A',
+                          'Wikipedia:Kandidaturen',
+                          'Wikipedia:Meinungsbilder/A',
+                          'Wikipedia:Meinungsbilder/C',
+                          'Wikipedia:Meinungsbilder/B'))
+        with mock.patch.object(pywikibot, 'Site', return_value=site), \
+             mock.patch.object(checkvotes, 'AllPageGenerator',
+                               side_effect=[pages('A', 'B'),
+                                            pages('B', 'C')]), \
+             mock.patch.object(checkvotes, 'site_rc_listener',
+                               return_value=listener), \
+             mock.patch.object(pagegenerators, 'PreloadingGenerator', iter):
+            titles = [page.title(with_ns=False).rpartition('/')[2]
+                      for page in WatchPageGenerator(full=True)]
+        self.assertEqual(titles, ['A', 'B', 'A', 'C', 'C', 'B'])
+
+
+class TestAllPageGenerator(unittest.TestCase):
+
+    """Test the generator of all open votes."""
+
+    TOOL = '[//tools.wmflabs.org/stimmberechtigung/?user=&day={} Tool]'
+    PAGES = {
+        'Vorlage:Beteiligen': '[[Wikipedia:Meinungsbilder/Mb|Mb]] '
+                              '[[Wikipedia:Benutzersperrung/Bsv|Bsv]]',
+        'Wikipedia:Kandidaturen': '{{Wikipedia:Adminkandidaturen/Intro}}'
+                                  '{{Wikipedia:Adminkandidaturen/Ak}}'
+                                  '{{Wikipedia:Bürokratenkandidaturen/Bk}}',
+        'Wikipedia:Oversightkandidaturen': '[[/Intro/]] [[/Os/]]',
+        'Wikipedia:Checkuser/Wahl/November 2025':
+            TOOL.format(1) + TOOL.format(2) + '\n# [[/Cu/]]',
+        'Wikipedia:Schiedsgericht/Wahl/November 2025':
+            TOOL.format(3) + TOOL.format(4) + '\n# [[/Sg/]]',
+        'Wikipedia:Adminwiederwahl': '{{Adminwiederwahl|Ww}}',
+    }
+
+    def generate(self, pages: dict) -> dict:
+        """Return the vote contexts of all pages by their titles."""
+        site = DrySite()
+
+        def get(page, *args, **kwargs):
+            try:
+                return pages[page.title()]
+            except KeyError:
+                raise pywikibot.exceptions.NoPageError(page) from None
+
+        with mock.patch.object(pywikibot, 'Site', return_value=site), \
+             mock.patch.object(pywikibot.Page, 'get', get), \
+             mock.patch.object(pywikibot.Timestamp, 'now',
+                               return_value=pywikibot.Timestamp(2025, 11, 2)):
+            return {page.title(): page.vote_context
+                    for page in checkvotes.AllPageGenerator()}
+
+    def test_contexts(self):
+        """Test the vote context of every generator."""
+        contexts = self.generate(self.PAGES)
+        self.assertEqual(list(contexts), [
+            'Wikipedia:Meinungsbilder/Mb', 'Wikipedia:Benutzersperrung/Bsv',
+            'Wikipedia:Adminkandidaturen/Ak',
+            'Wikipedia:Bürokratenkandidaturen/Bk',
+            'Wikipedia:Oversightkandidaturen/Os',
+            'Wikipedia:Checkuser/Wahl/November 2025/Cu',
+            'Wikipedia:Schiedsgericht/Wahl/November 2025/Sg',
+            'Wikipedia:Adminwiederwahl/Ww'])
+        # the date of votes with a box template is read from it
+        self.assertEqual(
+            [title for title, context in contexts.items()
+             if context.template],
+            ['Wikipedia:Meinungsbilder/Mb', 'Wikipedia:Benutzersperrung/Bsv'])
+        self.assertEqual(
+            [title for title, context in contexts.items() if context.sg],
+            ['Wikipedia:Schiedsgericht/Wahl/November 2025/Sg'])
+        self.assertEqual(
+            [title for title, context in contexts.items() if context.ww],
+            ['Wikipedia:Adminwiederwahl/Ww'])
+        self.assertEqual(
+            contexts['Wikipedia:Checkuser/Wahl/November 2025/Cu'].url,
+            ('stimmberechtigung/', 'user=&day=2'))
+        self.assertEqual(
+            contexts['Wikipedia:Schiedsgericht/Wahl/November 2025/Sg'].url,
+            ('stimmberechtigung/', 'user=&day=4'))
+        self.assertIsNone(contexts['Wikipedia:Adminkandidaturen/Ak'].url)
+
+    def test_skip(self):
+        """Test that a missing index page or tool url is skipped."""
+        pages = dict(self.PAGES)
+        del pages['Wikipedia:Oversightkandidaturen']
+        pages['Wikipedia:Checkuser/Wahl/November 2025'] = '# [[/Cu/]]'
+        with mock.patch.object(pywikibot, 'error') as error:
+            contexts = self.generate(pages)
+        error.assert_called_once()
+        self.assertNotIn('Wikipedia:Oversightkandidaturen/Os', contexts)
+        self.assertNotIn('Wikipedia:Checkuser/Wahl/November 2025/Cu',
+                         contexts)
+        self.assertIn('Wikipedia:Schiedsgericht/Wahl/November 2025/Sg',
+                      contexts)
+        self.assertIn('Wikipedia:Adminwiederwahl/Ww', contexts)
+
+
+class TestNotice(unittest.TestCase):
+
+    """Test notices on talk pages."""
+
+    NOTICE = ('Deine Abstimmung bei [[WP:SG/Wahl|Wahl]] wurde gestrichen. '
+              'Du warst [https://tool nicht stimmberechtigt]. --~~~~')
+
+    def test_new_section(self):
+        """Test notice with a new section."""
+        self.assertEqual(
+            add_notice('Hallo', 'WP:SG/Wahl', 'Wahl', 'https://tool'),
+            'Hallo\n\n== Stimmberechtigung ==\n\n' + self.NOTICE)
+
+    def test_existing_section(self):
+        """Test notice added to an existing section."""
+        talk = 'Hallo\n== Stimmberechtigung ==\nAlt'
+        self.assertEqual(
+            add_notice(talk, 'WP:SG/Wahl', 'Wahl', 'https://tool'),
+            'Hallo\n== Stimmberechtigung ==\n\n' + self.NOTICE + '\nAlt')
+
+
 if __name__ == '__main__':
     unittest.main()
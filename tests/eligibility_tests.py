@@ -0,0 +1,113 @@
+"""Test eligibility module."""
+#
+# (C) xqt, 2025
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import annotations
+
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from eligibility import TIMEZONE, Eligibility
+
+
+class ContribsSite:
+
+    """Site which lists contributions of a single user."""
+
+    def __init__(self):
+        """Initializer."""
+        self.contribs = []
+
+    def add(self, moment: datetime, number: int = 1):
+        """Add contributions at the given time."""
+        for _ in range(number):
+            timestamp = moment.astimezone(timezone.utc)
+            self.contribs.append({
+                'revid': len(self.contribs) + 1,
+                'timestamp': timestamp.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            })
+
+    def usercontribs(self, user, namespaces, start=None, end=None):
+        """List contributions from *start* back to *end*."""
+        for contrib in reversed(self.contribs):
+            moment = datetime.strptime(
+                contrib['timestamp'],
+                '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc)
+            if (start is None or moment <= start) \
+               and (end is None or moment >= end):
+                yield contrib
+
+
+class TestEligibility(unittest.TestCase):
+
+    """Test Eligibility."""
+
+    REGISTRATION = '2020-01-01T00:00:00Z'
+    CUTOFF = datetime(2024, 6, 1, 12, 0, tzinfo=TIMEZONE)
+
+    def setUp(self):
+        """Create an engine with an in-memory database."""
+        super().setUp()
+        self.site = ContribsSite()
+        self.engine = Eligibility(self.site, ':memory:')
+
+    def tearDown(self):
+        """Close the database."""
+        self.engine.close()
+        super().tearDown()
+
+    def eligible(self, registration=REGISTRATION):
+        """Return whether the user is eligible at the cutoff time."""
+        return self.engine.eligible('Foo', self.CUTOFF,
+                                    registration=registration)
+
+    def test_eligible(self):
+        """Test eligible and ineligible users."""
+        self.site.add(datetime(2021, 1, 1, tzinfo=TIMEZONE), 150)
+        self.site.add(datetime(2024, 3, 1, tzinfo=TIMEZONE), 50)
+        self.assertTrue(self.eligible())
+        # the recent edits are older than twelve months
+        self.assertFalse(self.engine.eligible(
+            'Foo', datetime(2025, 3, 2, tzinfo=TIMEZONE),
+            registration=self.REGISTRATION))
+        self.assertTrue(self.engine.eligible(
+            'Foo', datetime(2025, 3, 1, tzinfo=TIMEZONE),
+            registration=self.REGISTRATION))
+
+    def test_registration(self):
+        """Test that new accounts are not eligible."""
+        self.site.add(datetime(2024, 3, 1, tzinfo=TIMEZONE), 300)
+        self.assertFalse(self.eligible('2024-04-15T00:00:00Z'))
+        self.assertEqual(self.engine.cache.requests, 0)
+        self.assertTrue(self.eligible(None))
+
+    def test_incremental(self):
+        """Test that only new contributions are retrieved."""
+        self.site.add(datetime(2024, 3, 1, tzinfo=TIMEZONE), 200)
+        self.assertTrue(self.eligible())
+        self.assertTrue(self.eligible())
+        self.assertEqual(self.engine.cache.requests, 1)
+
+        self.site.add(datetime.now(timezone.utc) - timedelta(seconds=10), 5)
+        self.engine.cache.update('Foo', datetime.now(timezone.utc))
+        self.assertEqual(
+            self.engine.cache.bounds('Foo', None,
+                                     datetime.now(timezone.utc)),
+            (200, 205))
+
+    def test_cutoff_day(self):
+        """Test edits on the day of the cutoff time."""
+        self.site.add(datetime(2024, 3, 1, tzinfo=TIMEZONE), 199)
+        self.site.add(self.CUTOFF + timedelta(hours=1))
+        self.assertFalse(self.eligible())
+        self.site.add(self.CUTOFF - timedelta(hours=1))
+        self.engine.cache.update('Foo', datetime.now(timezone.utc))
+        requests = self.engine.cache.requests
+        self.assertTrue(self.eligible())
+        self.assertEqual(self.engine.cache.requests, requests + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+"""Test metrics module."""
+#
+# (C) xqt, 2025
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import annotations
+
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from metrics import Metrics
+
+
+class TestMetrics(unittest.TestCase):
+
+    """Test Metrics."""
+
+    def setUp(self):
+        """Create metrics with a fake clock in a temporary folder."""
+        super().setUp()
+        self.folder = tempfile.TemporaryDirectory()
+        self.now = 1000.0
+        self.filename = str(Path(self.folder.name, 'bot.jsonl'))
+        self.metrics = Metrics(self.filename, interval=60,
+                               clock=lambda: self.now)
+
+    def tearDown(self):
+        """Remove the temporary folder."""
+        self.folder.cleanup()
+        super().tearDown()
+
+    def test_summary(self):
+        """Test quantiles and counters."""
+        for seconds in range(1, 101):
+            self.metrics.record('parse', seconds / 100)
+        with self.assertRaises(ValueError), self.metrics.stage('put'):
+            raise ValueError
+        self.metrics.count('event.block', 3)
+        summary = self.metrics.summary()
+        self.assertEqual(summary['stages']['parse']['count'], 100)
+        self.assertEqual(summary['stages']['parse']['p50'], 0.5)
+        self.assertEqual(summary['stages']['parse']['p95'], 0.95)
+        self.assertEqual(summary['stages']['parse']['p99'], 0.99)
+        self.assertEqual(summary['stages']['put']['count'], 1)
+        self.assertEqual(summary['counters'], {'event.block': 3})
+
+    def test_flush(self):
+        """Test that JSON lines are written after the interval."""
+        self.metrics.record('parse', 0.25)
+        self.metrics.flush()
+        self.assertFalse(Path(self.filename).exists())
+        self.now += 60
+        self.metrics.flush()
+        self.now += 60
+        self.metrics.flush()
+        lines = Path(self.filename).read_text(encoding='utf-8').splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(json.loads(lines[0])['stages']['parse']['p99'],
+                         0.25)
+
+    def test_prometheus(self):
+        """Test the Prometheus text file."""
+        filename = str(Path(self.folder.name, 'bot.prom'))
+        metrics = Metrics(filename, prefix='vmbot')
+        metrics.record('api.put', 2.0)
+        metrics.count('closed')
+        metrics.write()
+        text = Path(filename).read_text(encoding='utf-8')
+        self.assertIn('vmbot_stage_seconds{stage="api.put",quantile="0.95"}'
+                      ' 2.0\n', text)
+        self.assertIn('vmbot_stage_seconds_count{stage="api.put"} 1\n', text)
+        self.assertIn('vmbot_events_total{name="closed"} 1\n', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+"""Test signatures module."""
+#
+# (C) xqt, 2025
+#
+# Distributed under the terms of the MIT license.
+#
+from __future__ import annotations
+
+import unittest
+
+from signatures import tokenize
+
+
+class TestTokenizer(unittest.TestCase):
+
+    """Test signature tokenizer."""
+
+    TEXT = ('# Pro --[[Benutzer:Xqt|Xqt]] ([[BD:Xqt|D]]) '
+            '12:00, 5. Nov. 2023 (CET)\n'
+            '#: [[User talk:Foo Bar |Foo]] 09:00, 5. Nov. 2023 (CET)\n'
+            '# [[Spezial:Beiträge/1.2.3.4]] 13:45, 6. Mai 2024 (CEST)\n')
+
+    def test_tokenize(self):
+        """Test signatures with their attributes."""
+        second = self.TEXT.index('#:')
+        third = self.TEXT.index('# [[Spezial')
+        signatures = list(tokenize(self.TEXT, max_gap=155))
+        self.assertEqual([(sig.user, sig.talk, sig.line)
+                          for sig in signatures],
+                         [('Xqt', False, 0), ('Xqt', False, 0),
+                          ('Foo Bar', True, second),
+                          ('1.2.3.4', False, third)])
+        sig = signatures[0]
+        self.assertEqual((sig.year, sig.month, sig.day, sig.hour, sig.minute,
+                          sig.zone), ('2023', 'Nov.', '5', '12', '00', 'CET'))
+        self.assertEqual(signatures[3].special, 'Beiträge/')
+
+    def test_gap(self):
+        """Test the distance of the timestamp."""
+        text = '[[User:Foo|Foo]]' + ' ' * 20 + '12:00, 5. Nov. 2023 (CET)'
+        self.assertLength(tokenize(text, max_gap=30), 1)
+        self.assertLength(tokenize(text, max_gap=20), 0)
+        self.assertLength(tokenize(text, max_gap=20, closed=True), 1)
+        self.assertLength(tokenize(text, max_gap=30, min_gap=21,
+                                   closed=True), 0)
+
+    def test_line(self):
+        """Test that timestamps of other lines are ignored."""
+        text = '[[User:Foo|Foo]]\n12:00, 5. Nov. 2023 (CET)'
+        self.assertLength(tokenize(text, max_gap=155), 0)
+
+    def test_accept(self):
+        """Test that rejected signatures are skipped."""
+        signatures = tokenize(self.TEXT, 155,
+                              accept=lambda sig: sig.namespace != 'BD')
+        self.assertEqual([sig.user for sig in signatures],
+                         ['Xqt', 'Foo Bar', '1.2.3.4'])
+
+    def test_long_line(self):
+        """Test a long line with many links and no timestamp."""
+        text = '# ' + '[[Benutzer:Foo|Foo]] ' * 20000
+        self.assertLength(tokenize(text, max_gap=155), 0)
+
+    def assertLength(self, iterable, length):  # noqa: N802
+        """Assert the number of items of an iterable."""
+        self.assertEqual(len(list(iterable)), length)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,10 +6,21 @@
 #
 from __future__ import annotations
 
+import queue
 import re
+import tempfile
 import unittest
+from contextlib import ExitStack
+from pathlib import Path
+from unittest import mock
 
-from vandalism import getAccuser, isIn
+import pywikibot
+from pywikibot import config
+
+import vandalism
+from standins import DrySite, GeneratorResult, ReplaySite, VirtualClock, epoch
+from vandalism import (VM_PAGES, OptOutList, RangeBlocks, SeenReceivers,
+                       VmPage, VmSection, getAccuser, isIn, vmBot)
 
 
 class TestVandalismMethods(unittest.TestCase):
@@ -83,6 +94,436 @@ class TestVandalismMethods(unittest.TestCase):
             '== [[Benutzer:2003:d3:83c0:cb00:45f1:1850:1e89:1e22]] ==',
             re.escape('2003:D3:83C0:CB00:45F1:1850:1E89:1E22')))
 
+    def test_vm_section(self):
+        """Test VmSection attributes."""
+        body = ('Spam. --[[Benutzer:Xqt|Xqt]] ([[BD:Xqt|D]]) '
+                '11:46, 15. Nov. 2010 (CET)\n')
+        section = VmSection('== [[Benutzer:Foo Bar]] ==\n', body)
+        self.assertFalse(section.done)
+        self.assertEqual(section.link, 'Benutzer:Foo Bar')
+        self.assertEqual(section.defendant, 'Foo Bar')
+        self.assertEqual((section.accuser, section.timestamp),
+                         ('Xqt', '2010 Nov 15 11:46'))
+        section = VmSection('== [[Benutzer:Foo Bar]] (erl.) ==\n', body)
+        self.assertTrue(section.done)
+        section = VmSection('== [[Artikel]] ==\n', '')
+        self.assertEqual(section.defendant, '')
+        self.assertEqual(section.accuser, '')
+
+    def test_new_defendants(self):
+        """Test the users of sections added since the last revision."""
+        site = DrySite()
+
+        def vm_page(revid, *heads):
+            text = ''.join(f'{head}\nSpam.\n' for head in heads)
+            return VmPage(mock.Mock(latest_revision_id=revid, text=text,
+                                    site=site))
+
+        old = vm_page(1, '== [[Benutzer:Foo]] ==')
+        new = vm_page(2, '== [[Benutzer:Foo]] ==', '== [[Benutzer:Bar]] ==',
+                      '== [[Benutzer:192.0.2.1]] ==',
+                      '== [[Benutzer:Baz]] (erl.) ==', '== [[Artikel]] ==')
+        bot = mock.Mock(site=site, parsed_page=old,
+                        **{'vm_page.return_value': new})
+        self.assertEqual(vmBot.new_defendants(bot), {'Bar', '192.0.2.1'})
+        bot.parsed_page = new
+        self.assertEqual(vmBot.new_defendants(bot), set())
+
+
+class TestSeenReceivers(unittest.TestCase):
+
+    """Test SeenReceivers."""
+
+    def test_store(self):
+        """Test bounded entries which are kept in a file."""
+        with tempfile.TemporaryDirectory() as folder:
+            filename = str(Path(folder, 'seen.data'))
+            seen = SeenReceivers(filename, limit=2)
+            self.assertFalse(seen.loaded)
+            seen.add(('Foo', '2025 Jan 1 10:00'))
+            seen.add(('Bar', '2025 Jan 1 11:00'))
+            seen.add(('Foo', '2025 Jan 1 10:00'))  # the newest one now
+            seen.add(('Baz', '2025 Jan 1 12:00'))
+            self.assertNotIn(('Bar', '2025 Jan 1 11:00'), seen)
+            self.assertEqual(len(seen), 2)
+
+            seen = SeenReceivers(filename, limit=2)
+            self.assertTrue(seen.loaded)
+            self.assertIn(('Foo', '2025 Jan 1 10:00'), seen)
+            self.assertIn(('Baz', '2025 Jan 1 12:00'), seen)
+
+    def test_corrupt(self):
+        """Test that a corrupt or truncated file is ignored."""
+        with tempfile.TemporaryDirectory() as folder:
+            filename = Path(folder, 'seen.data')
+            seen = SeenReceivers(str(filename))
+            seen.add(('Foo', '2025 Jan 1 10:00'))
+            data = filename.read_bytes()
+            self.assertEqual(list(Path(folder).iterdir()), [filename])
+            for content in (data[:len(data) // 2], b'garbage'):
+                filename.write_bytes(content)
+                with self.subTest(content=content), \
+                     mock.patch('pywikibot.warning') as warning:
+                    seen = SeenReceivers(str(filename))
+                    self.assertFalse(seen.loaded)
+                    self.assertEqual(len(seen), 0)
+                    warning.assert_called_once()
+
+
+class TestOptOutList(unittest.TestCase):
+
+    """Test OptOutList."""
+
+    REDIRECTS = {
+        'Benutzer:Bar': 'Benutzer:Baz',
+        'Benutzer:Loop': 'Benutzer:Pool',
+        'Benutzer:Pool': 'Benutzer:Loop',
+        'Benutzer:Moved': 'Wikipedia:Foo',
+    }
+
+    def setUp(self):
+        """Replace the site requests."""
+        super().setUp()
+        self.site = DrySite()
+        self.queried = []
+        self.folder = tempfile.TemporaryDirectory()
+        self.filename = str(Path(self.folder.name, 'optout.data'))
+
+    def tearDown(self):
+        """Remove the temporary folder."""
+        self.folder.cleanup()
+        super().tearDown()
+
+    def simple_request(self, titles, **kwargs):
+        """Return the redirect chains of the given titles like the API."""
+        self.queried.append(titles)
+        redirects = {}
+        for title in titles:
+            while title in self.REDIRECTS and title not in redirects:
+                redirects[title] = self.REDIRECTS[title]
+                title = redirects[title]
+        return mock.Mock(**{'submit.return_value': {'query': {
+            'redirects': [{'from': source, 'to': target}
+                          for source, target in redirects.items()]}}})
+
+    def refresh(self, revid: int, *titles: str) -> bool:
+        """Refresh the list of a page revision with the given links."""
+        links = [pywikibot.Page(self.site, title) for title in titles]
+        with mock.patch.object(self.site, 'simple_request',
+                               self.simple_request), \
+             mock.patch.object(pywikibot.Page, 'latest_revision_id',
+                               revid), \
+             mock.patch.object(pywikibot.Page, 'linkedPages',
+                               return_value=links):
+            optout = OptOutList(self.site, 'Benutzer:Xqbot/Opt-out',
+                                self.filename)
+            return optout.refresh(), optout
+
+    def test_refresh(self):
+        """Test that new links are resolved by a single query."""
+        changed, optout = self.refresh(
+            1, 'Benutzer:Foo', 'Benutzer:Bar', 'Benutzer:Loop',
+            'Benutzer:Moved', 'Benutzer:Euku/Doku', 'Benutzer Diskussion:Qux')
+        self.assertTrue(changed)
+        self.assertEqual(optout.users, {'Foo', 'Baz', 'Qux'})
+        self.assertEqual(len(self.queried), 1)
+
+        changed, optout = self.refresh(1)
+        self.assertFalse(changed)
+        self.assertEqual(optout.users, {'Foo', 'Baz', 'Qux'})
+
+        changed, optout = self.refresh(2, 'Benutzer:Bar', 'Benutzer:Quux')
+        self.assertTrue(changed)
+        self.assertEqual(optout.users, {'Baz', 'Quux'})
+        self.assertEqual(self.queried[1:], [('Benutzer:Quux', )])
+
+
+class TestRangeBlocks(unittest.TestCase):
+
+    """Test RangeBlocks."""
+
+    def setUp(self):
+        """Create an index of nested and disjoint ranges."""
+        super().setUp()
+        self.index = RangeBlocks()
+        for iprange, expiry in (('10.0.0.0/8', 'infinity'),
+                                ('10.1.0.0/16', '2000-01-01T00:00:00Z'),
+                                ('10.1.2.0/24', 'infinity'),
+                                ('10.2.0.0/16', 'infinity'),
+                                ('2001:db8::/32', 'infinity')):
+            self.index.add({'user': iprange, 'expiry': expiry})
+
+    def find(self, address):
+        """Return the covering range of an address or None."""
+        block = self.index.find(address)
+        return block and block['user']
+
+    def test_find(self):
+        """Test the smallest active range covering an address."""
+        self.assertEqual(self.find('10.1.2.3'), '10.1.2.0/24')
+        self.assertEqual(self.find('10.1.3.3'), '10.0.0.0/8')  # expired
+        self.assertEqual(self.find('10.2.9.9'), '10.2.0.0/16')
+        self.assertEqual(self.find('10.3.0.1'), '10.0.0.0/8')
+        self.assertIsNone(self.find('9.255.255.255'))
+        self.assertEqual(self.find('2001:DB8:0:0:0:0:0:1'), '2001:db8::/32')
+        self.assertIsNone(self.find('2001:db9::1'))
+        self.assertIsNone(self.find('Xqt'))
+
+    def test_remove(self):
+        """Test that removed ranges are not found."""
+        self.index.remove('10.0.0.0/8')
+        self.assertIsNone(self.find('10.3.0.1'))
+        self.assertEqual(self.find('10.1.2.3'), '10.1.2.0/24')
+        self.assertEqual(len(self.index), 4)
+
+
+class TestReplaySite(unittest.TestCase):
+
+    """Test the stand-in site of the replay harness."""
+
+    def test_blocks(self):
+        """Test that blocks take effect at their timestamp."""
+        clock = VirtualClock()
+        site = ReplaySite(clock, 0.5, 'VM', [
+            {'revid': 1, 'timestamp': 0, 'text': ''},
+            {'revid': 2, 'timestamp': 100, 'text': 'new'},
+        ])
+        for timestamp, action in ((10, 'block'), (20, 'unblock')):
+            site.add_event({'type': 'log', 'log_type': 'block',
+                            'log_action': action, 'title': 'Benutzer:Foo',
+                            'user': 'Admin', 'timestamp': timestamp})
+        clock.set(15)
+        self.assertEqual([block['user']
+                          for block in site.blocks_list(['Foo', 'Bar'])],
+                         ['Foo'])
+        self.assertEqual(clock.time(), 15.5)
+        clock.set(20)
+        self.assertEqual(list(site.blocks_list(['Foo'])), [])
+        self.assertEqual(site.current('VM')[1], 1)
+        clock.set(100)
+        self.assertEqual(site.current('VM')[1], 2)
+        self.assertEqual(site.requests['blocks'], 2)
+
+
+class VmBotTestCase(unittest.TestCase):
+
+    """Base class of vmBot tests with the replay stand-in site."""
+
+    VM = VM_PAGES['wikipedia:de']['VM'][0]
+    SIGNATURE = '--[[Benutzer:Xqt|Xqt]] 11:46, 15. Nov. 2025 (CET)'
+    START = '2025-11-15T11:00:00Z'
+    DEFENDANTS = ('Baz', 'Foo', 'Bar', '10.1.2.3', 'Qux')
+
+    def setUp(self):
+        """Create a bot working on a stand-in site."""
+        super().setUp()
+        text = 'Intro\n' + ''.join(
+            f'\n== [[Benutzer:{name}]] ==\nSpam. {self.SIGNATURE}\n'
+            for name in self.DEFENDANTS)
+        self.clock = VirtualClock(epoch(self.START))
+        self.stand_in = ReplaySite(self.clock, 0.0, self.VM, [
+            {'revid': 1, 'timestamp': self.START, 'text': text}])
+        self.site = DrySite()
+        self.folder = tempfile.TemporaryDirectory()
+        stack = ExitStack()
+        stack.enter_context(self.stand_in.attach(self.site))
+        stack.enter_context(mock.patch.object(
+            config, 'datafilepath',
+            lambda *path: str(Path(self.folder.name, path[-1]))))
+        stack.enter_context(mock.patch.object(config, 'mylang', 'de'))
+        stack.enter_context(mock.patch.object(vandalism, 'time',
+                                              self.clock.time))
+        self.addCleanup(self.folder.cleanup)
+        self.addCleanup(stack.close)
+        self.bot = vmBot(site=self.site)
+
+    def block(self, name: str, seconds: int = 60, **params):
+        """Block a user at the given seconds after the start."""
+        self.stand_in.add_event({
+            'type': 'log', 'log_type': 'block', 'log_action': 'block',
+            'title': 'Benutzer:' + name, 'user': 'Admin',
+            'timestamp': epoch(self.START) + seconds,
+            'comment': 'Vandalismus', 'log_params': params})
+
+    def saved(self) -> tuple[str, str]:
+        """Return the text and summary of the last edit of VM."""
+        self.assertEqual([title for _, title, _ in self.stand_in.edits],
+                         [self.VM])
+        return (self.stand_in.current(self.VM)[2],
+                self.stand_in.edits[-1][2])
+
+
+class TestMarkBlocked(VmBotTestCase):
+
+    """Test closing the sections of blocked users by vmBot."""
+
+    def test_mark_blocked(self):
+        """Test the closed sections and the edit summary."""
+        self.block('Foo')
+        self.block('Bar', sitewide=False,
+                   restrictions={'namespaces': [0, 4]})
+        self.clock.advance(120)
+        self.bot.markBlockedusers(full=True)
+        text, summary = self.saved()
+        self.assertIn('== [[Benutzer:Foo]] (erl.) ==', text)
+        self.assertIn('== [[Benutzer:Bar]] (erl.) ==', text)
+        self.assertIn('== [[Benutzer:Baz]] ==', text)
+        self.assertIn('Gemeldeter=Benutzer:Foo|Admin=Admin|Zeit=unbegrenzt|'
+                      'Begründung=Vandalismus|subst=subst:|Teilsperre=}}',
+                      text)
+        self.assertIn('Teilsperre=für die Namensräume 0, 4}}', text)
+        self.assertEqual(
+            summary, 'Bot: Abschnitte erledigt: [[User:Foo|Foo]], '
+            '[[User:Bar|Bar]]; 3 Abschnitte scheinen noch offen zu sein, '
+            'der älteste zu [[Benutzer:Baz]]')
+        self.assertEqual(self.stand_in.requests['blocks'], 1)
+
+    def test_scoped(self):
+        """Test that only the sections of the given users are checked."""
+        self.block('Foo')
+        self.block('Bar')
+        self.clock.advance(120)
+        with mock.patch.object(self.bot, 'blocks',
+                               wraps=self.bot.blocks) as blocks:
+            self.bot.markBlockedusers({'Foo', 'Quux'})
+        blocks.assert_called_once_with(['Foo'])
+        text, summary = self.saved()
+        self.assertIn('== [[Benutzer:Foo]] (erl.) ==', text)
+        self.assertIn('== [[Benutzer:Bar]] ==', text)
+        self.assertEqual(
+            summary, 'Bot: Abschnitt erledigt: [[User:Foo|Foo]]; '
+            '4 Abschnitte scheinen noch offen zu sein, der älteste zu '
+            '[[Benutzer:Baz]]')
+
+    def test_mark_sections(self):
+        """Test the scoped checks between the full checks."""
+        self.block('Foo')
+        self.block('Bar')
+        self.clock.advance(120)
+        self.bot.last_sweep = self.clock.time()
+        self.bot.mark_sections(set())
+        self.assertEqual(self.stand_in.requests['blocks'], 0)
+        self.bot.mark_sections({'Foo'})
+        text, _ = self.saved()
+        self.assertIn('== [[Benutzer:Bar]] ==', text)
+        self.clock.advance(self.bot.opt.sweep)
+        self.stand_in.edits.clear()
+        self.bot.mark_sections({'Foo'})
+        text, _ = self.saved()
+        self.assertIn('== [[Benutzer:Bar]] (erl.) ==', text)
+        self.assertEqual(self.bot.last_sweep, self.clock.time())
+
+    def test_sweep_range(self):
+        """Test a range block of the window when a full check is due."""
+        self.block('Foo')
+        self.block('10.1.0.0/16')
+        self.clock.advance(120)
+        self.bot.mark_sections({'Foo', '10.1.0.0/16'})
+        text, summary = self.saved()
+        self.assertIn('== [[Benutzer:Foo]] (erl.) ==', text)
+        self.assertIn('== [[Benutzer:10.1.2.3]] (erl.) ==', text)
+        self.assertIn('Gemeldeter=Benutzer:10.1.2.3|', text)
+        self.assertEqual(self.bot.range_blocks.find('10.1.9.9')['user'],
+                         '10.1.0.0/16')
+        self.assertEqual(self.bot.last_sweep, self.clock.time())
+
+    def test_sitewide(self):
+        """Test that a sitewide block is preferred to a partial one."""
+        partial = {'user': 'Foo', 'partial': True}
+        sitewide = {'user': 'Foo', 'partial': False}
+        for blocks in ([partial, sitewide], [sitewide, partial]):
+            with self.subTest(blocks=blocks), \
+                 mock.patch.object(self.site, 'blocks', return_value=(
+                     GeneratorResult(blocks, bkprop=['user']))):
+                self.assertIs(self.bot.blocks(['Foo'])['Foo'], sitewide)
+
+
+class TestEvents(VmBotTestCase):
+
+    """Test that events of a short window are handled together."""
+
+    def queue(self, *events):
+        """Return a stand-in of the event queue.
+
+        :param events: tuples of the seconds after the start when the
+            event arrives, its kind and its title
+        """
+        pending = list(events)
+
+        def get(timeout=None):
+            moment = (epoch(self.START) + pending[0][0] if pending
+                      else float('inf'))
+            if timeout is not None and moment > self.clock.time() + timeout:
+                self.clock.advance(timeout)
+                raise queue.Empty
+            self.clock.set(moment)
+            return pending.pop(0)[1:]
+
+        return mock.Mock(**{'get.side_effect': get})
+
+    def test_burst(self):
+        """Test that a burst of events is merged into one pass."""
+        self.block('Foo', 10)
+        self.block('10.1.0.0/16', 12)
+        events = self.queue((10, 'block', 'Foo'), (11, 'edit', self.VM),
+                            (12, 'block', '10.1.0.0/16'),
+                            (13, 'optout', 'Benutzer:Xqbot/Opt-out'),
+                            (14, 'edit', self.VM), (30, 'block', 'Bar'))
+        self.bot.last_sweep = epoch(self.START)
+        with mock.patch.object(self.bot, 'read_lists') as read_lists, \
+             mock.patch.object(self.bot, 'new_defendants',
+                               return_value={'Qux'}) as new_defendants:
+            titles = self.bot.wait_for_events(events)
+            self.assertEqual(titles, {'Foo', '10.1.0.0/16', 'Qux'})
+            self.assertEqual(self.clock.time(), epoch(self.START) + 15)
+            read_lists.assert_called_once_with()
+            new_defendants.assert_called_once_with()
+
+            self.bot.update(titles)
+            text, _ = self.saved()
+            self.assertIn('== [[Benutzer:Foo]] (erl.) ==', text)
+            self.assertIn('== [[Benutzer:10.1.2.3]] (erl.) ==', text)
+            self.assertEqual(self.stand_in.requests['blocks'], 1)
+
+            self.assertEqual(self.bot.wait_for_events(events), {'Bar'})
+        self.assertEqual(self.bot.metrics.counters,
+                         {'event.block': 3, 'event.edit': 2,
+                          'event.optout': 1, 'closed': 2})
+
+
+class TestContactDefendants(VmBotTestCase):
+
+    """Test notifying the defendants of VM sections."""
+
+    DEFENDANTS = ('Foo', 'Newbie', 'Robot', '192.0.2.1', 'Ghost', 'Bar')
+
+    def test_profiles(self):
+        """Test that defendants are filtered by batched profiles."""
+        self.stand_in.profiles = {
+            'Newbie': {'name': 'Newbie', 'userid': 2, 'editcount': 3,
+                       'groups': ['*', 'user']},
+            'Robot': {'name': 'Robot', 'userid': 3, 'editcount': 1000,
+                      'groups': ['*', 'user', 'autoconfirmed', 'bot']},
+            'Ghost': {'name': 'Ghost', 'missing': True},
+        }
+        self.bot.start = False
+        with mock.patch.object(self.bot, 'notify') as notify, \
+             mock.patch.object(vandalism, 'USERS_LIMIT', 2):
+            self.bot.contact_defendants()
+        self.assertEqual([call[0][0] for call in notify.call_args_list],
+                         ['Foo', 'Bar'])
+        self.assertEqual(self.stand_in.requests['users'], 3)
+        timestamp = '2025 Nov 15 11:46'
+        self.assertIn(('Newbie', timestamp), self.bot.alreadySeenReceiver)
+        self.assertNotIn(('Robot', timestamp), self.bot.alreadySeenReceiver)
+        self.assertIn(('Foo', timestamp), self.bot.alreadySeenReceiver)
+
+        self.stand_in.requests.clear()
+        with mock.patch.object(self.bot, 'notify') as notify:
+            self.bot.contact_defendants()
+        notify.assert_not_called()
+        self.assertEqual(self.stand_in.requests['users'], 1)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -3,7 +3,25 @@
 @note: Pywikibot framework is needed.
 
 These command line parameters can be used to specify how to work:
-...
+
+-projectpage:X    The key of the project page in VM_PAGES (default: VM)
+
+-sweep:N          Seconds between full checks of all open sections of the
+                  project page (default: 600). In between only the
+                  sections of users who were blocked or newly reported
+                  are checked.
+
+-window:N         Seconds to collect further events after an event;
+                  all of them are processed by a single update of the
+                  project page (default: 5)
+
+-workers:N        Number of talk pages to be notified concurrently
+                  (default: 4)
+
+-metrics:X        Format of the metrics file in the pywikibot data folder,
+                  either jsonl (default) or prom for a Prometheus text
+                  file. The durations of the stages and API requests are
+                  written every five minutes.
 
 """
 #
@@ -12,19 +30,32 @@ These command line parameters can be used to specify how to work:
 #
 from __future__ import annotations
 
+import os
+import pickle
+import queue
 import re
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
+from ipaddress import ip_address, ip_network
 from time import time
 
 import pywikibot
-from pywikibot import Timestamp, textlib
+from pywikibot import Timestamp, config, textlib
+from pywikibot.backports import batched
 from pywikibot.bot import SingleSiteBot
 from pywikibot.comms.eventstreams import site_rc_listener
 from pywikibot.textlib import extract_sections, get_regexes
 
+from metrics import Metrics
+from signatures import tokenize
+
 vmHeadlineUserRegEx = (r'(?:==\ *\[+(?:[Bb]enutzer(?:in)?:\W?|[Uu]ser:|'
                        r'Spezial\:Beiträge\/|Special:Contributions\/)'
                        r'(?P<username>[^]\|=]+?)\ *\]+).*==\ *')
+USERS_LIMIT = 50  # users per list=blocks or list=users request
 VM_ERL_R = r'\( *((nicht +)?erl(\.?|edigt)|gesperrt|in Bearbeitung) *\)'
 VM_PAGES = {
     'wikipedia:de': {
@@ -47,35 +78,73 @@ def isIn(text: str, regex):  # noqa: N802
     return re.search(regex, text, re.IGNORECASE)
 
 
+def block_key(username: str) -> str:
+    """Return the user name as used by the blocks list.
+
+    IPv6 addresses are expanded without leading zeros and upper-cased
+    like MediaWiki does.
+
+    >>> block_key('2001:db8:0:0:0:0:0:1')
+    '2001:DB8:0:0:0:0:0:1'
+    >>> block_key('2001:db8::1')
+    '2001:DB8:0:0:0:0:0:1'
+    >>> block_key('2001:0db8:0000::0001')
+    '2001:DB8:0:0:0:0:0:1'
+    >>> block_key('192.0.2.1')
+    '192.0.2.1'
+    >>> block_key('Xqt')
+    'Xqt'
+    """
+    try:
+        ip = ip_address(username)
+    except ValueError:
+        return username
+    if ip.version == 4:
+        return str(ip)
+    return ':'.join(f'{int(group, 16):X}' for group in ip.exploded.split(':'))
+
+
+def dump(data, filename: str) -> None:
+    """Pickle data to a file.
+
+    The data is written to a temporary file first which replaces the
+    file, i.e. the file is never left half written.
+    """
+    temp = filename + '.tmp'
+    with open(temp, 'wb') as f:
+        pickle.dump(data, f)
+    os.replace(temp, filename)
+
+
 def search(text: str, regex):
     """Find regex in text."""
     m = re.search(regex, text)
     return m.groups()[0] if m else ''
 
 
+def is_accuser_signature(signature) -> bool:
+    """Return whether a signature may be the one of an accuser."""
+    if signature.namespace == 'BD' \
+       or not re.fullmatch('[a-zA-Zä]{3,10}', signature.month.rstrip('.')):
+        return False
+    if signature.namespace in ('Spezial', 'Special'):
+        return signature.special == ('Beiträge/'
+                                     if signature.namespace == 'Spezial'
+                                     else 'Contributions/')
+    return signature.special is None
+
+
 def getAccuser(rawText: str):  # noqa: N802, N803
     """Return a username and a timestamp."""
-    sigRegEx = (
-        r'\[\[(?:[Bb]enutzer(?:in)?(?:[ _]Diskussion)?\:|'
-        r'[Uu]ser(?:[ _]talk)?\:|Spezial\:Beiträge\/|'
-        r'Special:Contributions\/)(?P<username>[^|\]]+)\|.*?\]\].{1,30}')
-    sigRegEx += (
-        r'(?P<hh>[0-9]{2})\:(?P<mm>[0-9]{2}),\ (?P<dd>[0-9]{1,2})\.?\ '
-        r'(?P<MM>[a-zA-Zä]{3,10})\.?\ '
-        r'(?P<yyyy>[0-9]{4})\ \((?:CE[S]?T|ME[S]?Z|UTC)\)'
-    )
-    p1 = re.compile(sigRegEx)
     # we assume: the first timestamp was made by the accuser
-    match1 = p1.search(rawText)
-    if match1 is None:
-        return '', ''
-    username = match1.group('username')
-    hh1 = match1.group('hh')
-    mm1 = match1.group('mm')
-    dd1 = match1.group('dd')
-    MM1 = match1.group('MM')
-    yy1 = match1.group('yyyy')
-    return username, ' '.join((yy1, MM1, dd1, f'{hh1}:{mm1}'))
+    for signature in tokenize(rawText, max_gap=30, min_gap=1, closed=True,
+                              accept=is_accuser_signature):
+        return signature.user, ' '.join((signature.year,
+                                         signature.month.rstrip('.'),
+                                         signature.day,
+                                         f'{signature.hour}:'
+                                         f'{signature.minute}'))
+    return '', ''
 
 
 class vmEntry:  # noqa: N801
@@ -92,59 +161,329 @@ class vmEntry:  # noqa: N801
         self.involved = {defendant, accuser}
 
 
+class SeenReceivers:
+
+    """Ordered and bounded set of notified defendants kept in a file.
+
+    The oldest entries are removed if the size limit is exceeded. The
+    set is written to the file after each change.
+    """
+
+    def __init__(self, filename: str, limit: int = 500):
+        """Initializer.
+
+        :param filename: the file to load and store the entries
+        :param limit: the maximum number of entries
+        """
+        self.filename = filename
+        self.limit = limit
+        self.entries = OrderedDict()
+        self.loaded = False
+        try:
+            with open(filename, 'rb') as f:
+                self.entries = pickle.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, EOFError, pickle.UnpicklingError) as e:
+            pywikibot.warning(f'Could not read {filename}: {e}; starting '
+                              'with an empty list of seen receivers')
+        else:
+            self.loaded = True
+
+    def __contains__(self, item) -> bool:
+        """Return whether the item was already seen."""
+        return item in self.entries
+
+    def __len__(self) -> int:
+        """Return the number of entries."""
+        return len(self.entries)
+
+    def add(self, item) -> None:
+        """Add an item as the newest entry and store the set."""
+        self.entries[item] = None
+        self.entries.move_to_end(item)
+        while len(self.entries) > self.limit:
+            old, _ = self.entries.popitem(last=False)
+            pywikibot.info(f'remove {old[0]} out of the list of seen '
+                           'Receiver')
+        dump(self.entries, self.filename)
+
+
+class RangeBlocks:
+
+    """Index of active IP range blocks.
+
+    The ranges of each IP version are sorted by their first address.
+    CIDR ranges are either nested or disjoint; the smallest range which
+    covers an address is the last range starting before it or one of
+    the ranges enclosing that one. Thus a lookup takes O(log n) steps
+    and a few more for nested ranges.
+    """
+
+    def __init__(self):
+        """Initializer."""
+        self.blocks = {}
+        self._index = None
+
+    def __len__(self) -> int:
+        """Return the number of range blocks."""
+        return len(self.blocks)
+
+    def add(self, block: dict) -> None:
+        """Add or replace a range block.
+
+        :param block: the block data from ``list=blocks``
+        """
+        self.blocks[ip_network(block['user'], strict=False)] = block
+        self._index = None
+
+    def remove(self, iprange: str) -> None:
+        """Remove a range block.
+
+        :param iprange: the blocked range
+        """
+        if self.blocks.pop(ip_network(iprange, strict=False), None):
+            self._index = None
+
+    def _build(self) -> dict:
+        """Sort the ranges and link each one to its enclosing range."""
+        index = {4: ([], []), 6: ([], [])}
+        for network in sorted(self.blocks,
+                              key=lambda n: (n.version, n.network_address,
+                                             -n.num_addresses)):
+            starts, entries = index[network.version]
+            parent = len(entries) - 1
+            while parent >= 0 and not network.subnet_of(entries[parent][0]):
+                parent = entries[parent][1]
+            starts.append(int(network.network_address))
+            entries.append((network, parent))
+        return index
+
+    def find(self, address: str) -> dict | None:
+        """Return the active range block which covers an IP address.
+
+        :param address: the IP address
+        :return: the block data of the smallest covering range or None
+        """
+        try:
+            ip = ip_address(address)
+        except ValueError:
+            return None
+        if self._index is None:
+            self._index = self._build()
+        starts, entries = self._index[ip.version]
+        now = time()
+        i = bisect_right(starts, int(ip)) - 1
+        while i >= 0:
+            network, parent = entries[i]
+            block = self.blocks[network]
+            expiry = block.get('expiry', 'infinity')
+            if ip in network and (
+                    expiry in ('infinite', 'infinity', 'indefinite')
+                    or Timestamp.fromISOformat(expiry).posix_timestamp()
+                    > now):
+                return block
+            i = parent
+        return None
+
+
+class OptOutList:
+
+    """Users linked on an opt-out page kept in a file.
+
+    The links of the page are stored with the user they refer to. If the
+    page was changed, only new links are resolved by batched queries.
+    """
+
+    def __init__(self, site, title: str, filename: str):
+        """Initializer.
+
+        :param site: the site of the page
+        :param title: the title of the opt-out page
+        :param filename: the file to load and store the links
+        """
+        self.site = site
+        self.title = title
+        self.filename = filename
+        self.revid, self.links = None, {}
+        try:
+            with open(filename, 'rb') as f:
+                self.revid, self.links = pickle.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, EOFError, pickle.UnpicklingError) as e:
+            pywikibot.warning(f'Could not read {filename}: {e}')
+        self.users = {user for user in self.links.values() if user}
+
+    def __contains__(self, username: str) -> bool:
+        """Return whether the user has opted out."""
+        return username in self.users
+
+    def __len__(self) -> int:
+        """Return the number of users."""
+        return len(self.users)
+
+    def refresh(self) -> bool:
+        """Update the links if the page has changed.
+
+        :return: whether the page has changed
+        """
+        page = pywikibot.Page(self.site, self.title)
+        revid = page.latest_revision_id
+        if revid == self.revid:
+            return False
+
+        titles = [linked.title()
+                  for linked in page.linkedPages(namespaces=[2, 3])]
+        users = self.resolve(title for title in titles
+                             if title not in self.links)
+        links = {title: self.links[title] if title in self.links
+                 else users[title] for title in titles}
+
+        self.revid, self.links = revid, links
+        self.users = {user for user in links.values() if user}
+        dump((self.revid, self.links), self.filename)
+        return True
+
+    def resolve(self, titles) -> dict[str, str | None]:
+        """Return the users the given pages refer to.
+
+        Redirects are resolved by ``prop=info`` queries with 50 pages
+        each. Subpages, redirect loops and redirects to other namespaces
+        refer to no user.
+
+        :param titles: titles of user or user talk pages
+        :return: the user name or None keyed by title
+        """
+        titles = set(titles)
+        redirects = {}
+        for batch in batched(sorted(titles), USERS_LIMIT):
+            result = self.site.simple_request(
+                action='query', prop='info', titles=batch,
+                redirects=True).submit()['query']
+            for item in result.get('redirects', []):
+                redirects[item['from']] = item['to']
+
+        users = {}
+        for title in titles:
+            target = title
+            seen = {target}
+            while target in redirects:
+                target = redirects[target]
+                if target in seen:  # redirect loop
+                    break
+                seen.add(target)
+            else:
+                page = pywikibot.Page(self.site, target)
+                # ignore subpages e.g. Euku's documentation
+                if page.namespace() in (2, 3) and not page.depth:
+                    users[title] = page.title(with_ns=False,
+                                              with_section=False)
+                    continue
+            users[title] = None
+        return users
+
+
+class VmSection:
+
+    """A section of the vandalism page with its parsed attributes."""
+
+    def __init__(self, head: str, body: str):
+        """Initializer.
+
+        :param head: the headline of the section
+        :param body: the text of the section below the headline
+        """
+        self.head = head
+        self.body = body
+        self.done = bool(isIn(head, VM_ERL_R))  # erledigt
+        m = get_regexes('link')[0].search(head)
+        self.link = m and m.group().strip('[]')  # the linked title
+        self.defendant = search(head, vmHeadlineUserRegEx).strip()
+        self.accuser, self.timestamp = getAccuser(body)
+
+
+class VmPage:
+
+    """The vandalism page of a single revision split into sections."""
+
+    def __init__(self, page):
+        """Initializer.
+
+        :param page: the vandalism page
+        :type page: pywikibot.Page
+        """
+        self.page = page
+        self.revid = page.latest_revision_id
+        self.text = page.text
+        sections = extract_sections(self.text, page.site)
+        self.intro = sections.header
+        self.sections = [VmSection(head, body)
+                         for head, body in sections.sections]
+
+
 class vmBot(SingleSiteBot):  # noqa: N801
 
     """VM Bot Class."""
 
     total = 50
-    optOutMaxAge = 60 * 60 * 6  # noqa: N815
     useredits = 10  # min edits for experienced users
+    metrics_interval = 300  # seconds between writes of the metrics
 
     def __init__(self, **kwargs):
         """Only accept options defined in availableOptions."""
         self.available_options.update({
-            'projectpage': 'VM'
+            'projectpage': 'VM',
+            'sweep': 600,  # seconds between full checks of the VM page
+            'window': 5,  # seconds to coalesce events
+            'workers': 4,  # concurrent talk page notifications
+            'metrics': 'jsonl',  # or 'prom'
         })
         super().__init__(**kwargs)
-        self.optOutListAge = self.optOutMaxAge + 1  # initial
-        self.optOutListReceiver = set()
-        self.optOutListAccuser = set()
-        self.alreadySeenReceiver = []
-        self.start = True  # bootmode
+        self.prefix = 'Benutzer:Xqbot/'
+        self.optOutListReceiver = OptOutList(
+            self.site, self.prefix + optOutListReceiverName,
+            config.datafilepath('data', f'vm-{self.site.code}-receivers.data'))
+        self.optOutListAccuser = OptOutList(
+            self.site, self.prefix + optOutListAccuserName,
+            config.datafilepath('data', f'vm-{self.site.code}-accusers.data'))
+        self.alreadySeenReceiver = SeenReceivers(
+            config.datafilepath('data', f'vm-{self.site.code}-'
+                                f'{self.opt.projectpage}.data'))
+        # bootmode unless the receivers are known from a former run
+        self.start = not self.alreadySeenReceiver.loaded
+        self.last_sweep = 0.0
+        self.parsed_page = None
+        self.executor = None
+        self.range_blocks = RangeBlocks()
+        self.metrics = Metrics(
+            config.datafilepath('data', f'vm-{self.site.code}-metrics.'
+                                f'{self.opt.metrics}'),
+            prefix='vmbot', interval=self.metrics_interval)
         sitename = self.site.sitename
         self.nexttimestamp = '20250120012345'
-        self.prefix = 'Benutzer:Xqbot/'
         self.vmPageName = VM_PAGES[sitename][self.opt.projectpage][0]
         self.vmHeadNote = VM_PAGES[sitename][self.opt.projectpage][1]
         pywikibot.info('Project page is ' + self.vmPageName)
 
-    def divide_into_slices(self, text: str) -> tuple[str, list, list]:
-        """Analyze text.
+    def vm_page(self) -> VmPage | None:
+        """Return the parsed project page.
 
-        Analyze the whole text to get the intro, the headlines and the
-        corresponding bodies.
+        The page is parsed again only if its revision has changed.
         """
-        sections = extract_sections(text, self.site)
-        vmHeads = []
-        vmBodies = []
-        for head, body in sections.sections:
-            vmHeads.append(head)
-            vmBodies.append(body)
-        return sections.header, vmHeads, vmBodies
-
-    def optOutUsersToCheck(self, page_name: str) -> set:  # noqa: N802
-        """Read opt-in list."""
-        result = set()
-        ignore_page = pywikibot.Page(self.site, page_name)
-        for page in ignore_page.linkedPages(namespaces=[2, 3],
-                                            follow_redirects=True):
-            if page.depth != 0:  # ignore subpages e.g. Euku's documentation
-                continue
-
-            title = page.title(with_ns=False,
-                               with_section=False)
-            result.add(title)
-        return result
+        page = pywikibot.Page(self.site, self.vmPageName)
+        try:
+            with self.metrics.stage('api.revision'):
+                revid = page.latest_revision_id
+            if self.parsed_page is None or self.parsed_page.revid != revid:
+                with self.metrics.stage('api.text'):
+                    page.get()
+                with self.metrics.stage('parse'):
+                    self.parsed_page = VmPage(page)
+        except pywikibot.exceptions.NoPageError:
+            pywikibot.info('could not open or write to project page')
+            return None
+        return self.parsed_page
 
     def translate(self, string: str) -> str:
         """Translate expiry time string into german."""
@@ -251,7 +590,8 @@ class vmBot(SingleSiteBot):  # noqa: N801
             pages = restrictions['pages']
             string = 'die Seite{} [[{}]]'.format(
                 'n' if len(pages) > 1 else '',
-                ']], [['.join(p['page_title'] for p in pages))
+                ']], [['.join(p.get('page_title') or p['title']
+                              for p in pages))
             where.append(string)
         if 'namespaces' in restrictions:
             namespaces = restrictions['namespaces']
@@ -261,46 +601,126 @@ class vmBot(SingleSiteBot):  # noqa: N801
             where.append(string)
         return result + ' und '.join(where)
 
-    def markBlockedusers(self, logtype, actions):  # noqa: N802, N803
-        """
-        Write a message to project page.
+    def blocks(self, usernames) -> dict[str, dict]:
+        """Retrieve the active blocks of users.
+
+        The users are queried by ``list=blocks`` in chunks of 50.
 
-        blockedUsers is a tuple of
-        (title, byadmin, timestamp, blocklength, reason, restrictions)
+        :param usernames: the user names without namespace
+        :return: the newest sitewide block or, if there is none, the
+            newest partial block of every blocked user keyed by
+            :func:`block_key` of the user name
+        """
+        blocks = {}
+        for chunk in batched(sorted(set(map(block_key, usernames))),
+                             USERS_LIMIT):
+            gen = self.site.blocks(users=chunk)
+            gen.request['bkprop'] = gen.request['bkprop'] + ['restrictions']
+            with self.metrics.stage('api.blocks'):
+                chunk_blocks = list(gen)
+            for block in chunk_blocks:
+                key = block_key(block['user'])
+                if key not in blocks or (blocks[key].get('partial')
+                                         and not block.get('partial')):
+                    blocks[key] = block
+        return blocks
+
+    def load_range_blocks(self) -> None:
+        """Retrieve all active IP range blocks into the index."""
+        with self.metrics.stage('api.ranges'):
+            gen = self.site.blocks(ip_range=True)
+            gen.request['bkprop'] = gen.request['bkprop'] + ['restrictions']
+            for block in gen:
+                self.range_blocks.add(block)
+        pywikibot.info(f'{len(self.range_blocks)} IP range blocks found')
+
+    def profiles(self, usernames) -> dict[str, dict]:
+        """Retrieve registration, groups and edit count of users.
+
+        The users are queried by ``list=users`` in chunks of 50.
+
+        :param usernames: the user names without namespace
+        :return: the user data keyed by user name; unregistered users
+            have no ``userid``
+        """
+        profiles = {}
+        for chunk in batched(sorted(set(usernames)), USERS_LIMIT):
+            with self.metrics.stage('api.users'):
+                profiles.update((data['name'], data)
+                                for data in self.site.users(chunk))
+        return profiles
+
+    def block_duration(self, block: dict) -> str:
+        """Return the duration string of a block from ``list=blocks``."""
+        expiry = block.get('expiry', '')
+        if expiry in ('infinite', 'infinity', 'indefinite'):
+            return self.translate(expiry)
+        return self.calc_blocklength(
+            Timestamp.fromISOformat(block['timestamp']),
+            expiry and Timestamp.fromISOformat(expiry))
+
+    def markBlockedusers(self, titles=(),  # noqa: N802
+                         full: bool = False) -> None:
+        """Close the sections of blocked users on the project page.
+
+        The blocks are retrieved by :meth:`blocks`. The sections of
+        blocked users are marked as done and a line with the block
+        details is appended to them; the edit summary tells the
+        number of sections which are still open.
+
+        :param titles: the user names without namespace which were
+            blocked; only their open sections are checked. Other open
+            sections are counted without checking their block status.
+            IP addresses are always looked up in the index of range
+            blocks; blocked ranges of *titles* are added to it.
+        :param full: check all open sections, not only those of
+            *titles*
         """
         userOnVMpageFound = 0
         headlinesWithOpenStatus = 0
         oldestHeadlineWithOpenStatus = None
         editSummary = ''
 
-        vmPage = pywikibot.Page(pywikibot.Site(), self.vmPageName)
-        try:
-            old_text = vmPage.text
-            rev_id = vmPage.latest_revision_id
-        except pywikibot.exceptions.NoPageError:
-            pywikibot.info('could not open or write to project page')
+        vm = self.vm_page()
+        if vm is None:
             return
 
-        # read the VM page
-        intro, vmHeads, vmBodies = self.divide_into_slices(old_text)
+        # copy the VM page
+        vmHeads = [section.head for section in vm.sections]
+        vmBodies = [section.body for section in vm.sections]
 
         # check which users were reported on VM
-        user_regex = get_regexes('link')[0]
-        for i, header in enumerate(vmHeads):
-            if isIn(header, VM_ERL_R):  # erledigt
+        sections = []
+        for i, section in enumerate(vm.sections):
+            if section.done or not section.link:
                 continue
 
-            m = user_regex.search(header)
-            username = m and m.group().strip('[]')
-            if not username:  # not found
-                continue
-
-            page = pywikibot.Page(self.site, username)
+            page = pywikibot.Page(self.site, section.link)
             if page.namespace() != 2:  # not a user, maybe an article
                 continue
 
-            blocked_user = pywikibot.User(page)
-            if not blocked_user.is_blocked(True):
+            sections.append((i, section.head, pywikibot.User(page)))
+
+        usernames = [user.title(with_ns=False) for _, _, user in sections]
+        keys = {block_key(title) for title in titles}
+        if not full:
+            usernames = [name for name in usernames
+                         if block_key(name) in keys]
+        # retrieve new range blocks too
+        usernames += [title for title in titles if '/' in title]
+        blocks = self.blocks(usernames)
+        for block in blocks.values():
+            if '/' in block['user']:
+                self.range_blocks.add(block)
+
+        for i, header, blocked_user in sections:
+            name = blocked_user.title(with_ns=False)
+            block = None
+            if full or block_key(name) in keys:
+                block = blocks.get(block_key(name))
+            if block is None and blocked_user.isAnonymous():
+                block = self.range_blocks.find(name)
+            if block is None:
                 # we count how many sections are still not cleared
                 headlinesWithOpenStatus += 1
                 if not oldestHeadlineWithOpenStatus:
@@ -310,23 +730,12 @@ class vmBot(SingleSiteBot):  # noqa: N801
 
             # TODO: check for globak locked users
 
-            # load logevent entry
-            for le in self.site.logevents(logtype=logtype, page=blocked_user):
-                if le.action() not in actions:
-                    continue
-
-                title = le.data['title']
-                byadmin = le.user()
-                blocklength = self.translate(le.params.get('duration', ''))
-                reason = le.comment() or '<keine angegeben>'
-                rest_string = self.restrictions_format(
-                    le.params.get('restrictions'))
-                break
-            else:
-                # TODO: check for IP range
-                username = 'Benutzer:' + ':'.join(
-                    username.split(':')[:4]) + ':0:0:0:0/64'
-                continue
+            title = blocked_user.title()
+            byadmin = block['by']
+            blocklength = self.block_duration(block)
+            reason = block['reason'] or '<keine angegeben>'
+            rest_string = self.restrictions_format(
+                block.get('restrictions'))
 
             userOnVMpageFound += 1
             param = {'name': blocked_user.title(with_ns=False)}
@@ -371,25 +780,27 @@ class vmBot(SingleSiteBot):  # noqa: N801
                                 f'scheinen noch offen zu sein, der älteste zu '
                                 f'{oldestHeadlineWithOpenStatus}')
 
-            newRawText = intro
+            newRawText = vm.intro
             for i, header in enumerate(vmHeads):
                 newRawText += header + vmBodies[i]
 
             # compare them
-            pywikibot.showDiff(old_text, newRawText)
+            pywikibot.showDiff(vm.text, newRawText)
             editSummary = editSummary[2:]  # remove ', ' at the begining
             pywikibot.info('markiere: ' + editSummary)
 
             # sanity check
-            if vmPage.latest_revision.revid != rev_id:
+            if vm.page.latest_revision.revid != vm.revid:
                 raise pywikibot.exceptions.EditConflictError(
                     'Revision ID changed')
 
-            vmPage.put(newRawText,
-                       'Bot: Abschnitt{} erledigt: {}'
-                       .format(('', 'e')[bool(userOnVMpageFound - 1)],
-                               editSummary + openSections),
-                       watch='unwatch', minor=True, force=True)
+            with self.metrics.stage('api.put'):
+                vm.page.put(newRawText,
+                            'Bot: Abschnitt{} erledigt: {}'
+                            .format(('', 'e')[bool(userOnVMpageFound - 1)],
+                                    editSummary + openSections),
+                            watch='unwatch', minor=True, force=True)
+            self.metrics.count('closed', userOnVMpageFound)
         else:
             pywikibot.info(f'auf {self.opt.projectpage} ist nichts zu tun')
 
@@ -399,22 +810,19 @@ class vmBot(SingleSiteBot):  # noqa: N801
         http://de.pywikibot.org/w/index.php?title=Benutzer_Diskussion:Euku&oldid=85204681#Kann_SpBot_die_auf_VM_gemeldeten_Benutzer_benachrichtigen.3F
         bootmode: mo messages are written on the first run, just
         'alreadySeenReceiver' is filled with the current defendants. Otherwise
-        the bot will always write a messge at startup
+        the bot will always write a messge at startup. The receivers are
+        kept in a file; there is no bootmode if it was found at startup.
         """
-        vmPage = pywikibot.Page(self.site, self.vmPageName)
-        try:
-            rawVMText = vmPage.text
-        except pywikibot.exceptions.NoPageError:
-            pywikibot.info('could not open or write to project page')
+        vm = self.vm_page()
+        if vm is None:
             return
 
-        # read the VM page
-        intro, vmHeads, vmBodies = self.divide_into_slices(rawVMText)
-
-        for i, header in enumerate(vmHeads):
+        # filter the sections without requests
+        candidates = []
+        for section in vm.sections:
             # there are several thing to check...
             # is this a user account or an article?
-            defendant = search(header, vmHeadlineUserRegEx).strip()
+            defendant = section.defendant
             if not defendant:
                 continue
 
@@ -430,12 +838,16 @@ class vmBot(SingleSiteBot):  # noqa: N801
             # normalize defendant str
             defendant = user.title(with_ns=False, with_section=False)
 
-            # skip bots and unregistered users like IPs
-            if not user.isRegistered() or 'bot' in user.groups():
+            # already cleared headline?
+            if section.done:
+                continue
+
+            # is this an old section? maybe the user already got a message
+            if (defendant, section.timestamp) in self.alreadySeenReceiver:
                 continue
 
-            # already cleared headline?
-            if isIn(header, VM_ERL_R):
+            # skip unregistered users like IPs
+            if user.isAnonymous():
                 continue
 
             # check if this user has opted out
@@ -444,16 +856,25 @@ class vmBot(SingleSiteBot):  # noqa: N801
                 continue
 
             # get timestamp and accuser
-            accuser, timestamp = getAccuser(vmBodies[i])
-            pywikibot.info(f'defendant: {defendant}, accuser: {accuser}, '
-                           f'time: {timestamp}')
-            if accuser == '':
+            pywikibot.info(f'defendant: {defendant}, accuser: '
+                           f'{section.accuser}, time: {section.timestamp}')
+            if section.accuser == '':
                 pywikibot.info(
                     f'Melder nicht gefunden bei {defendant}, weiter...')
                 continue
 
-            # is this an old section? maybe the user already got a message
-            if (defendant, timestamp) in self.alreadySeenReceiver:
+            candidates.append((section, defendant))
+
+        profiles = self.profiles(defendant for _, defendant in candidates)
+        futures = []
+        for section, defendant in candidates:
+            header = section.head
+            accuser, timestamp = section.accuser, section.timestamp
+            profile = profiles.get(defendant, {})
+            groups = profile.get('groups', [])
+
+            # skip bots and unregistered users
+            if 'userid' not in profile or 'bot' in groups:
                 continue
 
             # check if the accuser has opted-out
@@ -461,13 +882,13 @@ class vmBot(SingleSiteBot):  # noqa: N801
                 pywikibot.info(
                     accuser
                     + ' will selber benachrichtigen (Opt-out), weiter...')
-                self.alreadySeenReceiver.append((defendant, timestamp))
+                self.alreadySeenReceiver.add((defendant, timestamp))
                 continue
 
             # check if the user is experienced
-            if user.editCount() < self.useredits \
-               or 'autoconfirmed' not in user.groups():
-                self.alreadySeenReceiver.append((defendant, timestamp))
+            if profile.get('editcount', 0) < self.useredits \
+               or 'autoconfirmed' not in groups:
+                self.alreadySeenReceiver.add((defendant, timestamp))
                 continue
 
             pywikibot.info('Gemeldeten zum Anschreiben gefunden: ' + defendant)
@@ -476,27 +897,16 @@ class vmBot(SingleSiteBot):  # noqa: N801
             if bootmode:
                 pywikibot.info(
                     'Überspringe das Anschreiben, weil es der erste Lauf ist.')
-                self.alreadySeenReceiver.append((defendant, timestamp))
+                self.alreadySeenReceiver.add((defendant, timestamp))
                 continue
 
-            userTalk = user.getUserTalkPage()
-            try:
-                userTalkRawText = userTalk.text
-            except pywikibot.exceptions.NoPageError:
-                userTalkRawText = ''
-
             sectionHeadClear = textlib.replaceExcept(header,
                                                      r'==+\ *\[?\[?', '', [])
             sectionHeadClear = textlib.replaceExcept(sectionHeadClear,
                                                      r'\]\].*', '', []).strip()
 
             # memo that this user has already been contacted
-            self.alreadySeenReceiver.append((defendant, timestamp))
-            while len(self.alreadySeenReceiver) > 50:
-                # clean up the list
-                pywikibot.info('remove {} out of the list of seen Receiver'
-                               .format(self.alreadySeenReceiver[0][0]))
-                self.alreadySeenReceiver.remove(self.alreadySeenReceiver[0])
+            self.alreadySeenReceiver.add((defendant, timestamp))
 
             # is the accuser an IP?
             if (isIn(accuser,
@@ -515,79 +925,258 @@ class vmBot(SingleSiteBot):  # noqa: N801
             addText = ('\n{{subst:%s%s|Melder=%s|Abschnitt=%s%s}}'
                        % (self.prefix, vmMessageTemplate, accuserLink,
                           sectionHeadClear, Seite))
-            newUserTalkRawText = userTalkRawText + addText
-            pywikibot.info('schreibe: ' + addText)
-            pywikibot.showDiff(userTalkRawText, newUserTalkRawText)
-            userTalk.put(newUserTalkRawText,
-                         'Bot: Benachrichtigung zu [[{}:{}#{}]]'
-                         .format(self.site.family.name.title(),
-                                 self.opt.projectpage,
-                                 sectionHeadClear),
-                         watch='unwatch', minor=False)
+            summary = ('Bot: Benachrichtigung zu [[{}:{}#{}]]'
+                       .format(self.site.family.name.title(),
+                               self.opt.projectpage, sectionHeadClear))
+            if self.executor:
+                futures.append(self.executor.submit(
+                    self.notify, defendant, addText, summary))
+            else:
+                self.notify(defendant, addText, summary)
+
+        # wait for the notifications and raise their first error
+        for future in futures:
+            future.result()
+
+    def notify(self, username: str, text: str, summary: str) -> None:
+        """Append a message to the talk page of a user.
+
+        :param username: the name of the user to be notified
+        :param text: the message
+        :param summary: the edit summary
+        """
+        userTalk = pywikibot.User(self.site, username).getUserTalkPage()
+        try:
+            with self.metrics.stage('api.text'):
+                userTalkRawText = userTalk.text
+        except pywikibot.exceptions.NoPageError:
+            userTalkRawText = ''
+
+        newUserTalkRawText = userTalkRawText + text
+        pywikibot.info('schreibe: ' + text)
+        pywikibot.showDiff(userTalkRawText, newUserTalkRawText)
+        with self.metrics.stage('api.put'):
+            userTalk.put(newUserTalkRawText, summary, watch='unwatch',
+                         minor=False)
+        self.metrics.count('notified')
 
     def read_lists(self):
-        """Read opt-out-lists."""
-        if self.optOutListAge > self.optOutMaxAge:
-            pywikibot.info('Lese Opt-Out-Listen...')
-            self.optOutListReceiver = self.optOutUsersToCheck(
-                self.prefix + optOutListReceiverName)
-            self.optOutListAccuser = self.optOutUsersToCheck(
-                self.prefix + optOutListAccuserName)
+        """Read opt-out-lists if they have changed."""
+        pywikibot.info('Lese Opt-Out-Listen...')
+        with self.metrics.stage('read_lists'):
+            changed = [optout.refresh()
+                       for optout in (self.optOutListReceiver,
+                                      self.optOutListAccuser)]
+        if any(changed):
             pywikibot.info(
                 f'optOutListReceiver: {len(self.optOutListReceiver)}\n'
                 f'optOutListAccuser: {len(self.optOutListAccuser)}\n'
             )
-            # leere Liste - immer lesen
-            if not self.optOutListReceiver:
-                self.optOutListAge = self.optOutMaxAge + 1
-            else:
-                self.optOutListAge = 0
 
-    def run(self):
-        """Run the bot."""
+    def new_defendants(self) -> set[str]:
+        """Return the users reported since the last parsed revision.
+
+        These are the registered users or IPs of open sections which
+        were added to the project page since it was parsed last.
+
+        :return: the user names without namespace
+        """
+        old = self.parsed_page
+        vm = self.vm_page()
+        if vm is None or old is None or vm is old:
+            return set()
+        heads = {section.head for section in old.sections}
+        users = set()
+        for section in vm.sections:
+            if section.head in heads or section.done or not section.link:
+                continue
+            page = pywikibot.Page(self.site, section.link)
+            if page.namespace() == 2:
+                users.add(page.title(with_ns=False))
+        return users
+
+    def mark_sections(self, titles: set[str]) -> None:
+        """Close the sections of blocked users.
+
+        All open sections are checked if the last full check is older
+        than the sweep interval; otherwise only the sections of the
+        given users. Blocked ranges among the given users are indexed
+        in both cases.
+
+        :param titles: the user names without namespace which were
+            blocked or reported since the last check
+        """
+        full = time() - self.last_sweep >= self.opt.sweep
+        if full or titles:
+            stage = 'mark_blocked.full' if full else 'mark_blocked.scoped'
+            with self.metrics.stage(stage):
+                self.markBlockedusers(titles, full=full)
+        if full:
+            self.last_sweep = time()
+
+    def classify_event(self, entry: dict) -> tuple[str, str] | None:
+        """Return the kind and the title of a relevant stream entry.
+
+        The kinds are ``'block'``, ``'unblock'``, ``'edit'`` or
+        ``'optout'``; the title is the user name without namespace for
+        blocks. Only unblocks of IP ranges are relevant.
+
+        :param entry: an entry of the recent changes stream
+        :return: None if the entry is not relevant
+        """
+        if entry['type'] == 'log' and \
+           entry['log_type'] == 'block' and \
+           entry['log_action'] in ('block', 'reblock'):
+            pywikibot.info('\nFound a new blocking event '
+                           'by user "{}" for user "{}"'
+                           .format(entry['user'], entry['title']))
+            return 'block', pywikibot.Page(
+                self.site, entry['title']).title(with_ns=False)
+        if entry['type'] == 'log' and \
+           entry['log_type'] == 'block' and \
+           entry['log_action'] == 'unblock' and '/' in entry['title']:
+            return 'unblock', pywikibot.Page(
+                self.site, entry['title']).title(with_ns=False)
+        if entry['type'] == 'edit' and \
+           not entry['bot'] and \
+           entry['title'] == self.vmPageName:
+            pywikibot.info('\nFound a new edit by user "{}"'
+                           .format(entry['user']))
+            return 'edit', entry['title']
+        if entry['type'] == 'edit' and entry['title'] in (
+                self.optOutListReceiver.title, self.optOutListAccuser.title):
+            pywikibot.info('\nFound a new edit of "{}"'
+                           .format(entry['title']))
+            return 'optout', entry['title']
+        return None
+
+    def listen(self, events: queue.Queue) -> None:
+        """Read the recent changes stream and queue relevant events.
+
+        The events are tuples returned by :meth:`classify_event`. An
+        ``'error'`` event with the exception is queued if the stream
+        fails.
+
+        :param events: the queue for the events
+        """
         rc_listener = site_rc_listener(self.site)
         rc_listener.register_filter(type=('log', 'edit'))
-        while True:
-            pywikibot.info(Timestamp.now().strftime('>> %H:%M:%S: '))
-            self.read_lists()
-            try:
-                self.markBlockedusers('block', ['block', 'reblock'])
-                self.contact_defendants(bootmode=self.start)
-            except pywikibot.exceptions.EditConflictError:
-                pywikibot.info('Edit conflict found, try again.')
-                continue  # try again and skip waittime
-            except pywikibot.exceptions.PageSaveRelatedError:
-                pywikibot.info('Page not saved, try again.')
-                continue  # try again and skip waittime
-
-            # wait for new block entry
-            pywikibot.info()
-            now = time()
-            pywikibot.stopme()
+        try:
             for i, entry in enumerate(rc_listener):
                 if i % 25 == 0:
                     print('\r', ' ' * 50,  # noqa: T001, T201
                           '\rWaiting for events', end='')
-                if entry['type'] == 'log' and \
-                   entry['log_type'] == 'block' and \
-                   entry['log_action'] in ('block', 'reblock'):
-                    pywikibot.info('\nFound a new blocking event '
-                                   'by user "{}" for user "{}"'
-                                   .format(entry['user'], entry['title']))
-                    break
-                if entry['type'] == 'edit' and \
-                   not entry['bot'] and \
-                   entry['title'] == self.vmPageName:
-                    pywikibot.info('\nFound a new edit by user "{}"'
-                                   .format(entry['user']))
-                    break
-                if not entry['bot']:
+                event = self.classify_event(entry)
+                if event:
+                    events.put(event)
+                elif not entry['bot']:
                     print('.', end='', flush=True)  # noqa: T001, T201
+        except Exception as e:
+            events.put(('error', e))
+
+    def wait_for_events(self, events: queue.Queue) -> set[str]:
+        """Wait for events and handle those of a short window.
 
-            pywikibot.info('\n')
-            self.optOutListAge += time() - now
-            self.start = False
-            self.total = 15  # 10 is too low, see 20190226
+        The window starts with the first event and lasts
+        ``self.opt.window`` seconds.
+
+        :param events: the queue filled by :meth:`listen`
+        :return: the user names returned by :meth:`handle_events`
+        """
+        pywikibot.info()
+        pywikibot.stopme()
+        collected = []
+        with self.metrics.stage('wait'):
+            event = events.get()
+        deadline = time() + self.opt.window
+        while True:
+            if event[0] == 'error':
+                raise event[1]
+            collected.append(event)
+            try:
+                event = events.get(timeout=max(deadline - time(), 0))
+            except queue.Empty:
+                break
+
+        pywikibot.info('\n')
+        return self.handle_events(collected)
+
+    def handle_events(self, events) -> set[str]:
+        """Apply events and return the users whose sections are checked.
+
+        Unblocked IP ranges are removed from the index and the opt-out
+        lists are read if one of them was changed. If the project page
+        was edited, the users of the sections added since it was parsed
+        last are returned too; they may already be blocked.
+
+        :param events: tuples of kind and title as returned by
+            :meth:`classify_event`
+        :return: the user names without namespace which were blocked or
+            reported
+        """
+        titles = set()
+        optout = edited = False
+        for kind, value in events:
+            self.metrics.count(f'event.{kind}')
+            if kind == 'block':
+                titles.add(value)
+            elif kind == 'unblock':
+                self.range_blocks.remove(value)
+            elif kind == 'optout':
+                optout = True
+            elif kind == 'edit':
+                edited = True
+
+        if optout:
+            self.read_lists()
+        if edited:
+            titles |= self.new_defendants()
+        return titles
+
+    def update(self, titles: set[str]) -> None:
+        """Close the sections of blocked users and notify defendants.
+
+        :param titles: the user names returned by :meth:`handle_events`
+        """
+        self.mark_sections(titles)
+        with self.metrics.stage('contact_defendants'):
+            self.contact_defendants(bootmode=self.start)
+        self.start = False
+
+    def run(self):
+        """Run the bot.
+
+        The recent changes stream is read by a separate thread. Events
+        which arrive while the project page is processed or within the
+        window after the first one are processed together.
+        """
+        events = queue.Queue()
+        threading.Thread(target=self.listen, args=(events, ),
+                         daemon=True).start()
+        self.read_lists()
+        self.load_range_blocks()
+        titles = set()
+        with ThreadPoolExecutor(max_workers=self.opt.workers) as executor:
+            self.executor = executor
+            while True:
+                pywikibot.info(Timestamp.now().strftime('>> %H:%M:%S: '))
+                try:
+                    self.update(titles)
+                except pywikibot.exceptions.EditConflictError:
+                    pywikibot.info('Edit conflict found, try again.')
+                    self.metrics.count('edit_conflict')
+                    continue  # try again and skip waittime
+                except pywikibot.exceptions.PageSaveRelatedError:
+                    pywikibot.info('Page not saved, try again.')
+                    self.metrics.count('save_error')
+                    continue  # try again and skip waittime
+                finally:
+                    self.metrics.flush()
+
+                self.total = 15  # 10 is too low, see 20190226
+
+                # wait for new block entries
+                titles = self.wait_for_events(events)
 
 
 def main(*args):
@@ -606,7 +1195,9 @@ def main(*args):
         if not opt.startswith('-'):
             continue
         opt = opt[1:]
-        if value:
+        if opt in ('sweep', 'window', 'workers'):
+            options[opt] = int(value)
+        elif value:
             options[opt] = value
         else:
             options[opt] = True
@@ -3,7 +3,13 @@
 @note: Pywikibot framework is needed.
 
 These command line parameters can be used to specify how to work:
-...
+
+-projectpage:X    The key of the project page in VM_PAGES (default: VM)
+
+-metrics:X        Format of the metrics file in the pywikibot data folder,
+                  either jsonl (default) or prom for a Prometheus text
+                  file. The durations of the stages are written every
+                  five minutes.
 
 """
 #
@@ -13,13 +19,16 @@ from __future__ import annotations
 
 import re
 from datetime import timedelta
+from time import time
 
 import pywikibot
-from pywikibot import Timestamp, textlib
+from pywikibot import Timestamp, config, textlib
 from pywikibot.bot import SingleSiteBot
 from pywikibot.comms.eventstreams import site_rc_listener
 from pywikibot.textlib import extract_sections
 
+from metrics import Metrics
+
 vmHeadlineRegEx = (r'(==\ *?(?:(?:Artikel|Seite)[: ])?\[*?\:?'
                    r'%s(?:\|[^]]+)?\ *\]*?)\ *?==\ *')
 VM_ERL_R = r'\( *((nicht +)?erl(\.?|edigt)|gesperrt|in Bearbeitung) *\)'
@@ -44,13 +53,19 @@ class vmBot(SingleSiteBot):  # noqa: N801
     """VM Bot Class."""
 
     total = 50
+    metrics_interval = 300  # seconds between writes of the metrics
 
     def __init__(self, **kwargs):
         """Only accept options defined in availableOptions."""
         self.available_options.update({
-            'projectpage': 'VM'
+            'projectpage': 'VM',
+            'metrics': 'jsonl',  # or 'prom'
         })
         super().__init__(**kwargs)
+        self.metrics = Metrics(
+            config.datafilepath('data', f'vm-articles-{self.site.code}-'
+                                f'metrics.{self.opt.metrics}'),
+            prefix='vmbot_articles', interval=self.metrics_interval)
         sitename = self.site.sitename
         self.nexttimestamp = '20250120012345'
         self.prefix = 'Benutzer:Xqbot/'
@@ -135,16 +150,18 @@ class vmBot(SingleSiteBot):  # noqa: N801
         userOnVMpageFound = 0
         editSummary = ''
 
-        vmPage = pywikibot.Page(pywikibot.Site(), self.vmPageName)
+        vmPage = pywikibot.Page(self.site, self.vmPageName)
         try:
-            old_text = vmPage.text
-            rev_id = vmPage.latest_revision_id
+            with self.metrics.stage('api.text'):
+                old_text = vmPage.text
+                rev_id = vmPage.latest_revision_id
         except pywikibot.exceptions.NoPageError:
             pywikibot.info('could not open or write to project page')
             return
 
         # read the VM page
-        intro, vmHeads, vmBodies = self.divide_into_slices(old_text)
+        with self.metrics.stage('parse'):
+            intro, vmHeads, vmBodies = self.divide_into_slices(old_text)
 
         # add info messages
         for el in blockedUsers:
@@ -228,14 +245,45 @@ class vmBot(SingleSiteBot):  # noqa: N801
                 raise pywikibot.exceptions.EditConflictError(
                     'Revision ID changed')
 
-            vmPage.put(newRawText,
-                       'Bot: Abschnitt{} erledigt: {}'
-                       .format(('', 'e')[bool(userOnVMpageFound - 1)],
-                               editSummary + openSections),
-                       watch='unwatch', minor=True, force=True)
+            with self.metrics.stage('api.put'):
+                vmPage.put(newRawText,
+                           'Bot: Abschnitt{} erledigt: {}'
+                           .format(('', 'e')[bool(userOnVMpageFound - 1)],
+                                   editSummary + openSections),
+                           watch='unwatch', minor=True, force=True)
+            self.metrics.count('closed', userOnVMpageFound)
         else:
             pywikibot.info(f'auf {self.opt.projectpage} ist nichts zu tun')
 
+    def classify_event(self, entry: dict) -> str | None:
+        """Return the kind of a relevant stream entry.
+
+        :param entry: an entry of the recent changes stream
+        :return: ``'protect'``, ``'edit'`` or None if the entry is not
+            relevant
+        """
+        if entry['type'] == 'log' and \
+           entry['log_type'] == 'protect' and \
+           entry['log_action'] == 'protect':
+            pywikibot.info('\nFound a new protect event '
+                           'by user "{}" for page "{}"'
+                           .format(entry['user'], entry['title']))
+            return 'protect'
+        if entry['type'] == 'edit' and \
+           not entry['bot'] and \
+           entry['title'] == self.vmPageName:
+            pywikibot.info('\nFound a new edit by user "{}"'
+                           .format(entry['user']))
+            return 'edit'
+        return None
+
+    def update(self) -> None:
+        """Close the sections of pages protected since the last update."""
+        with self.metrics.stage('load_events'):
+            events = self.load_events('protect', ['protect'])
+        with self.metrics.stage('mark_protected'):
+            self.markBlockedusers(events)
+
     def run(self):
         """Run the bot."""
         rc_listener = site_rc_listener(self.site)
@@ -243,33 +291,30 @@ class vmBot(SingleSiteBot):  # noqa: N801
         while True:
             pywikibot.info(Timestamp.now().strftime('>> %H:%M:%S: '))
             try:
-                self.markBlockedusers(self.load_events('protect', ['protect']))
+                self.update()
             except pywikibot.exceptions.EditConflictError:
                 pywikibot.info('Edit conflict found, try again.')
+                self.metrics.count('edit_conflict')
                 continue  # try again and skip waittime
             except pywikibot.exceptions.PageSaveRelatedError:
                 pywikibot.info('Page not saved, try again.')
+                self.metrics.count('save_error')
                 continue  # try again and skip waittime
+            finally:
+                self.metrics.flush()
 
             # wait for new block entry
             pywikibot.info()
             pywikibot.stopme()
+            start = time()
             for i, entry in enumerate(rc_listener):
                 if i % 25 == 0:
                     print('\r', ' ' * 50,  # noqa: T001, T201
                           '\rWaiting for events', end='')
-                if entry['type'] == 'log' and \
-                   entry['log_type'] == 'protect' and \
-                   entry['log_action'] == 'protect':
-                    pywikibot.info('\nFound a new protect event '
-                                   'by user "{}" for page "{}"'
-                                   .format(entry['user'], entry['title']))
-                    break
-                if entry['type'] == 'edit' and \
-                   not entry['bot'] and \
-                   entry['title'] == self.vmPageName:
-                    pywikibot.info('\nFound a new edit by user "{}"'
-                                   .format(entry['user']))
+                kind = self.classify_event(entry)
+                if kind:
+                    self.metrics.record('wait', time() - start)
+                    self.metrics.count(f'event.{kind}')
                     break
                 if not entry['bot']:
                     print('.', end='', flush=True)  # noqa: T001, T201